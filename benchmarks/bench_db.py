@@ -0,0 +1,99 @@
+"""
+Бенчмарк слоя доступа к SQLite (database/db.py)
+
+Сравнивает операций в секунду для существующих функций БД:
+  • прежний режим — новое соединение sqlite3.connect на каждый вызов,
+    журнал по умолчанию (DELETE), synchronous=FULL;
+  • текущий — соединение потока (_connect): WAL, synchronous=NORMAL,
+    mmap, кеш страниц и подготовленных запросов.
+
+Каждый режим работает со своей временной БД с одинаковыми данными.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_db.py [--seconds 1.0] [--users 2000]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database.db as db  # noqa: E402
+
+POOLED_CONNECT = db._connect
+
+
+def legacy_connect() -> sqlite3.Connection:
+    return sqlite3.connect(db.DATABASE_NAME)
+
+
+def use(path: str, connect):
+    db.close_connection()
+    db.DATABASE_NAME = path
+    db._connect = connect
+
+
+def seed(users: int):
+    db.init_db()
+    for uid in range(1, users + 1):
+        db.save_user(uid, f"user{uid}", "Имя", "", profile_url=f"/users/{uid}",
+                     profile_id=str(uid), site_nickname=f"nick{uid}", is_linked=uid % 2 == 0)
+    for uid in range(1, users + 1, 10):
+        db.add_to_blacklist(uid, f"user{uid}", "Имя", "тест")
+
+
+def ops_per_sec(fn, seconds: float, users: int) -> float:
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(50):
+            fn(calls % users + 1)
+            calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+CASES = [
+    ('is_blacklisted', lambda uid: db.is_blacklisted(uid)),
+    ('get_user_role', lambda uid: db.get_user_role(uid)),
+    ('is_staff', lambda uid: db.is_staff(uid)),
+    ('is_user_linked', lambda uid: db.is_user_linked(uid)),
+    ('get_linked_user', lambda uid: db.get_linked_user(uid)),
+    ('log_operator_action', lambda uid: db.log_operator_action(1, 'message_sent', uid)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=1.0, help='длительность замера одной функции')
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    tmp = tempfile.mkdtemp()
+    modes = {
+        'connect на вызов': (os.path.join(tmp, 'legacy.db'), legacy_connect),
+        'соединение потока': (os.path.join(tmp, 'pooled.db'), POOLED_CONNECT),
+    }
+    results = {}
+    for mode, (path, connect) in modes.items():
+        use(path, connect)
+        seed(args.users)
+        results[mode] = {name: ops_per_sec(fn, args.seconds, args.users) for name, fn in CASES}
+    db.close_connection()
+
+    legacy, pooled = results.values()
+    print(f"{'функция':<20} | {'connect, оп/с':>13} | {'поток, оп/с':>11} | {'ускорение':>9}")
+    print("-" * 63)
+    for name, _ in CASES:
+        print(f"{name:<20} | {legacy[name]:>13.0f} | {pooled[name]:>11.0f} | {pooled[name] / legacy[name]:>8.1f}×")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Бенчмарк загрузки файла цен (database/db.py)
+
+Сравнивает строк в секунду:
+  • построчно — clear_all_card_prices + save_card_price на каждую строку
+    (commit на строку, как handle_prices_file до массовой загрузки);
+  • массово — replace_card_prices: executemany в промежуточную таблицу
+    и замена card_prices одной транзакцией.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_price_import.py [--rows 20000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database.db as db  # noqa: E402
+
+
+def make_prices(rows: int):
+    return [
+        (str(card_id), f"https://mangabuff.ru/cards/{card_id}/users", float(card_id % 997))
+        for card_id in range(1, rows + 1)
+    ]
+
+
+def row_by_row(prices):
+    db.clear_all_card_prices()
+    for _, card_url, price in prices:
+        db.save_card_price(card_url, price)
+
+
+def bulk(prices):
+    db.replace_card_prices(prices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    db.close_connection()
+    db.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'prices.db')
+    db.init_db()
+    prices = make_prices(args.rows)
+
+    results = {}
+    for name, fn in (('построчно', row_by_row), ('массово', bulk)):
+        started = time.perf_counter()
+        fn(prices)
+        elapsed = time.perf_counter() - started
+        ok = db.get_card_prices_count() == len(prices) and db.get_card_price('42') == 42.0
+        results[name] = (elapsed, ok)
+    db.close_connection()
+
+    print(f"{'загрузка':<10} | {'с':>7} | {'строк/с':>9} | цены")
+    print("-" * 40)
+    for name, (elapsed, ok) in results.items():
+        print(f"{name:<10} | {elapsed:>7.2f} | {len(prices) / elapsed:>9.0f} | {'✅' if ok else '❌'}")
+    slow, fast = results['построчно'][0], results['массово'][0]
+    print("-" * 40)
+    print(f"Ускорение {slow / fast:.1f}×")
+    return 0 if all(ok for _, ok in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Бенчмарк поиска цен для списка карт (utils/price_index.py)
+
+Сравнивает время получения цен для набора карт (как совпадения
+хотелок с картами общага):
+  • get_card_price из БД на каждую карту;
+  • PriceIndex.get_card_prices — один поиск по массивам в памяти;
+и проверяет, что ответы совпадают.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_price_index.py [--prices 50000] [--lookup 500]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database.db as db  # noqa: E402
+from utils.price_index import PriceIndex  # noqa: E402
+
+
+def timed_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prices', type=int, default=50000, help='цен в БД')
+    parser.add_argument('--lookup', type=int, default=500, help='карт в одном запросе')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    db.close_connection()
+    db.DATABASE_NAME = os.path.join(tempfile.mkdtemp(), 'prices.db')
+    db.init_db()
+    # Цены у каждой второй карты: половина запросов — промахи
+    db.replace_card_prices(
+        (str(card_id), f"https://mangabuff.ru/cards/{card_id}/users", float(card_id % 997))
+        for card_id in range(1, args.prices * 2, 2)
+    )
+
+    index = PriceIndex()
+    build_ms = timed_us(index.build, 3) / 1000
+    card_ids = [str(random.randint(1, args.prices * 2)) for _ in range(args.lookup)]
+
+    def from_db():
+        return {card_id: price for card_id in card_ids
+                if (price := db.get_card_price(card_id)) is not None}
+
+    ok = from_db() == index.get_card_prices(card_ids)
+    db_us = timed_us(from_db, args.repeat)
+    index_us = timed_us(lambda: index.get_card_prices(card_ids), args.repeat)
+    db.close_connection()
+
+    print(f"Цен: {args.prices}, построение индекса {build_ms:.1f} мс")
+    print(f"{'поиск ' + str(args.lookup) + ' карт':<22} | {'мкс':>9}")
+    print("-" * 34)
+    print(f"{'get_card_price × N':<22} | {db_us:>9.0f}")
+    print(f"{'индекс, один запрос':<22} | {index_us:>9.0f}")
+    print("-" * 34)
+    print(f"Ускорение {db_us / index_us:.1f}×")
+    print("✅ Ответы совпадают" if ok else "❌ Расхождение цен")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Бенчмарк сравнения карты с шаблонами рангов
+
+Сравнивает прежний поэлементный цикл (ранг → вариант → зона, float64)
+с векторным RankDetectorImproved._rank_table и с распознаванием
+от грубого к точному (_evaluate) на растущем наборе шаблонов: к реальным
+рамкам из ranks/ добавляются зашумлённые варианты. Проверяет, что
+ранжирование, лучший вариант и MSE по зонам совпадают, а _evaluate
+выбирает тот же шаблон, что и полное сравнение.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_rank_match.py [--repeat 200]
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.rank_detector import RankDetectorImproved, ZONES, ZONE_WEIGHTS  # noqa: E402
+
+
+def reference_rank_table(detector: RankDetectorImproved, zones: Dict[str, np.ndarray]) -> Tuple[Dict, Dict]:
+    """Прежняя реализация _run (циклы по рангам, вариантам и зонам)"""
+    card_zones = {z: a.astype(float) for z, a in zones.items()}
+
+    rank_scores, rank_details = {}, {}
+    for rank, templates_list in detector.templates.items():
+        variant_scores = []
+        for variant_idx, template in enumerate(templates_list):
+            zone_mse = {}
+            for zone_name in ZONES.keys():
+                diff = card_zones[zone_name] - template[zone_name]
+                zone_mse[zone_name] = float(np.mean(diff ** 2))
+            weighted = sum(zone_mse[z] * ZONE_WEIGHTS[z] for z in ZONES.keys())
+            variant_scores.append({'mse': weighted, 'zones': zone_mse, 'variant': variant_idx + 1})
+        best = min(variant_scores, key=lambda x: x['mse'])
+        rank_scores[rank] = best['mse']
+        rank_details[rank] = best
+    return rank_scores, rank_details
+
+
+def grow_templates(detector: RankDetectorImproved, per_rank: int, rng: np.random.Generator):
+    """Дополняет каждый ранг зашумлёнными вариантами до per_rank штук"""
+    for rank, variants in detector.templates.items():
+        base = variants[0]
+        while len(variants) < per_rank:
+            variants.append({
+                zone: np.clip(arr + rng.normal(0, 12, arr.shape), 0, 255).round()
+                for zone, arr in base.items()
+            })
+    detector._pack_templates()
+
+
+def make_cards(detector: RankDetectorImproved, count: int, rng: np.random.Generator):
+    """Зоны карт: шаблоны разных рангов с шумом (uint8, как после декодирования)"""
+    cards = []
+    ranks = list(detector.templates)
+    for i in range(count):
+        template = detector.templates[ranks[i % len(ranks)]][0]
+        cards.append({
+            zone: np.clip(arr + rng.normal(0, 20, arr.shape), 0, 255).astype(np.uint8)
+            for zone, arr in template.items()
+        })
+    return cards
+
+
+def check_equal(detector: RankDetectorImproved, cards) -> float:
+    """Максимальное расхождение MSE; падает, если различаются ранги/варианты"""
+    worst = 0.0
+    for card in cards:
+        ref_scores, ref_details = reference_rank_table(detector, card)
+        new_scores, new_details = detector._rank_table(card)
+        assert list(ref_scores) == list(new_scores)
+        assert min(ref_scores, key=ref_scores.get) == min(new_scores, key=new_scores.get)
+        for rank in ref_scores:
+            assert ref_details[rank]['variant'] == new_details[rank]['variant'], rank
+            worst = max(worst, abs(ref_scores[rank] - new_scores[rank]))
+            for zone in ZONES:
+                worst = max(worst, abs(ref_details[rank]['zones'][zone] - new_details[rank]['zones'][zone]))
+    return worst
+
+
+def check_coarse_to_fine(detector: RankDetectorImproved, cards) -> float:
+    """Среднее число точно сравненных шаблонов; падает, если выбор отличается"""
+    refined = 0
+    for card in cards:
+        scores, details = detector._rank_table(card)
+        best = min(scores, key=scores.get)
+        result = detector._evaluate(card)
+        assert result.candidate == best, (result.candidate, best)
+        assert result.variant == details[best]['variant']
+        assert abs(result.mse - scores[best]) < 1e-6
+        second = min((v for r, v in scores.items() if r != best), default=None)
+        if second is not None:
+            assert result.margin <= second - scores[best] + 1e-6
+        refined += result.refined
+    return refined / len(cards)
+
+
+def timed(fn, cards, repeat: int) -> float:
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(cards[i % len(cards)])
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='сравнений на размер набора')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='вариантов на ранг')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    detector = RankDetectorImproved()
+    if not detector.is_ready:
+        print("❌ Шаблоны в ranks/ не найдены")
+        return 1
+
+    logging.disable(logging.INFO)
+    print(
+        f"{'шаблонов':>9} | {'цикл, мс':>9} | {'вектор, мс':>10} | {'ускорение':>9} | "
+        f"{'max ΔMSE':>9} | {'грубо→точно, мс':>15} | {'точно':>6}"
+    )
+    print("-" * 94)
+    for per_rank in args.sizes:
+        grow_templates(detector, per_rank, rng)
+        cards = make_cards(detector, 16, rng)
+        delta = check_equal(detector, cards)
+        loop_ms = timed(lambda c: reference_rank_table(detector, c), cards, args.repeat)
+        vec_ms = timed(detector._rank_table, cards, args.repeat)
+        refined = check_coarse_to_fine(detector, cards)
+        c2f_ms = timed(detector._evaluate, cards, args.repeat)
+        total = len(detector._packed_ranks)
+        print(
+            f"{total:>9} | {loop_ms:>9.3f} | {vec_ms:>10.3f} | {loop_ms / vec_ms:>8.1f}× | "
+            f"{delta:>9.2e} | {c2f_ms:>15.3f} | {refined:>6.1f}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Бенчмарк загрузки шаблонов RankDetectorImproved
+
+На копии ranks/ во временной папке измеряет время загрузки шаблонов:
+  • из PNG (пакета нет — декодирование, resize, вырезка зон, запись пакета);
+  • из пакета .templates.npz;
+  • из пакета после смены mtime файлов (сверка хешей содержимого);
+и проверяет, что упакованные шаблоны во всех случаях одинаковые,
+а горячая перезагрузка подхватывает новый вариант шаблона.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_rank_startup.py [--repeat 20]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.rank_detector import RankDetectorImproved, RANKS_DIR, ZONES  # noqa: E402
+
+
+def load(ranks_dir: Path) -> RankDetectorImproved:
+    detector = RankDetectorImproved(ranks_dir)
+    detector._ensure_loaded()
+    return detector
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def same_templates(a: RankDetectorImproved, b: RankDetectorImproved) -> bool:
+    return (
+        a._packed_ranks == b._packed_ranks
+        and a._packed_variants == b._packed_variants
+        and a.templates_signature == b.templates_signature
+        and all(np.array_equal(a._packed[z], b._packed[z]) for z in ZONES)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ranks_dir = Path(tmp) / 'ranks'
+        ranks_dir.mkdir()
+        for fpath in sorted(RANKS_DIR.glob('frame-*.png')):
+            shutil.copy(fpath, ranks_dir / fpath.name)
+        bundle = ranks_dir / '.templates.npz'
+
+        def from_png():
+            bundle.unlink(missing_ok=True)
+            return load(ranks_dir)
+
+        def touched():
+            for fpath in ranks_dir.glob('frame-*.png'):
+                os.utime(fpath)
+            return load(ranks_dir)
+
+        reference = from_png()
+        if not reference.is_ready:
+            print("❌ Шаблоны в ranks/ не найдены")
+            return 1
+
+        ok = same_templates(reference, load(ranks_dir)) and same_templates(reference, touched())
+        png_ms = timed(from_png, args.repeat)
+        bundle_ms = timed(lambda: load(ranks_dir), args.repeat)
+        touched_ms = timed(touched, args.repeat)
+
+        print(f"{'загрузка':<28} | {'мс':>8}")
+        print("-" * 40)
+        print(f"{'из PNG + запись пакета':<28} | {png_ms:>8.2f}")
+        print(f"{'из пакета':<28} | {bundle_ms:>8.2f}")
+        print(f"{'из пакета, mtime изменён':<28} | {touched_ms:>8.2f}")
+        print("-" * 40)
+        print(f"Пакет: {bundle.stat().st_size / 1024:.1f} КБ, ускорение {png_ms / bundle_ms:.1f}×")
+
+        # Горячая перезагрузка: новый вариант шаблона в работающем детекторе
+        detector = load(ranks_dir)
+        before = len(detector._packed_ranks)
+        source = sorted(ranks_dir.glob('frame-*.png'))[0]
+        shutil.copy(source, ranks_dir / f"{source.stem}-v9.png")
+        reloaded = detector.reload_if_changed(force=True)
+        after = len(detector._packed_ranks)
+        ok = ok and reloaded and after == before + 1
+        print(f"Горячая перезагрузка: шаблонов {before} → {after}")
+
+    print("✅ Шаблоны из пакета совпадают с PNG" if ok else "❌ Расхождение шаблонов")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
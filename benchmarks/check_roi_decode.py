@@ -0,0 +1,113 @@
+"""
+Проверка ROI-декодирования в RankDetectorImproved
+
+Для набора карт (шаблоны из ranks/, пересохранённые в PNG/JPEG разных
+размеров) сравнивает полный путь (_decode_zones_full) с декодированием
+только зон (_decode_zones_roi):
+  • ранг и лучший вариант должны совпадать;
+  • MSE по каждой зоне — в пределах допуска, заданного долей
+    MSE_THRESHOLD (для JPEG draft-режим декодирует с уменьшением,
+    поэтому пиксели немного отличаются);
+  • время декодирования и размер декодированного изображения.
+
+Запуск из корня репозитория:
+    python benchmarks/check_roi_decode.py [--tolerance 0.02] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.rank_detector import RankDetectorImproved, RANKS_DIR, ZONES, MSE_THRESHOLD  # noqa: E402
+
+# (масштаб относительно 288×432, формат, качество JPEG)
+VARIANTS = [
+    (1, 'PNG', None),
+    (2, 'PNG', None),
+    (1, 'JPEG', 95),
+    (2, 'JPEG', 90),
+    (4, 'JPEG', 85),
+]
+
+
+def encode(path: Path, scale: int, fmt: str, quality) -> bytes:
+    img = Image.open(path).convert('RGB')
+    img = img.resize((img.width * scale, img.height * scale), Image.LANCZOS)
+    buf = BytesIO()
+    img.save(buf, fmt, **({'quality': quality} if quality else {}))
+    return buf.getvalue()
+
+
+def decoded_size(raw: bytes, roi: bool) -> int:
+    img = Image.open(BytesIO(raw))
+    if roi and img.format == 'JPEG':
+        img.draft('RGB', (288, 432))
+    return img.width * img.height
+
+
+def timed(fn, raw: bytes, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(raw)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help='допустимое расхождение MSE зоны, доля MSE_THRESHOLD')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    detector = RankDetectorImproved()
+    if not detector.is_ready:
+        print("❌ Шаблоны в ranks/ не найдены")
+        return 1
+
+    failures = 0
+    print(f"{'карта':<22} | {'ранг':>4} | {'max ΔMSE':>8} | {'полный, мс':>10} | {'ROI, мс':>8} | {'пикселей':>17}")
+    print("-" * 85)
+    for path in sorted(RANKS_DIR.glob('frame-*.png')):
+        for scale, fmt, quality in VARIANTS:
+            raw = encode(path, scale, fmt, quality)
+            full_scores, full_details = detector._rank_table(detector._decode_zones_full(raw))
+            roi_scores, roi_details = detector._rank_table(detector._decode_zones_roi(raw))
+
+            full_best = min(full_scores, key=full_scores.get)
+            roi_best = min(roi_scores, key=roi_scores.get)
+            worst = 0.0
+            for rank in full_details:
+                for zone in ZONES:
+                    a = full_details[rank]['zones'][zone]
+                    b = roi_details[rank]['zones'][zone]
+                    worst = max(worst, abs(a - b))
+
+            ok = (
+                full_best == roi_best
+                and full_details[full_best]['variant'] == roi_details[roi_best]['variant']
+                and worst <= args.tolerance * MSE_THRESHOLD
+            )
+            failures += not ok
+
+            full_ms = timed(detector._decode_zones_full, raw, args.repeat)
+            roi_ms = timed(detector._decode_zones_roi, raw, args.repeat)
+            label = f"{path.stem} {fmt}×{scale}"
+            pixels = f"{decoded_size(raw, False)}→{decoded_size(raw, True)}"
+            print(
+                f"{label:<22} | {roi_best:>4} | {worst:>8.1f} | {full_ms:>10.2f} | "
+                f"{roi_ms:>8.2f} | {pixels:>17} {'' if ok else '❌'}"
+            )
+
+    print("-" * 85)
+    print(f"Допуск ΔMSE зоны: {args.tolerance * MSE_THRESHOLD:.0f}")
+    print("✅ ROI-путь совпадает с полным" if not failures else f"❌ Расхождений: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Оценка RankDetectorImproved на размеченном наборе карт
+
+Набор — папка с подпапками по рангам, имя подпапки — правильный ранг,
+'unknown' — карты, для которых ранга нет (детектор должен вернуть '?'):
+
+    corpus/
+      E/  123.jpg  456.png ...
+      D/  ...
+      unknown/ ...
+
+Без --corpus набор генерируется из шаблонов ranks/ (разные размеры,
+JPEG-качество, шум, яркость) плюс карты без рамки (unknown).
+
+Отчёт:
+  • точность в целом и по рангам, матрица ошибок (правильный → ответ);
+  • ROC по порогу MSE: при каждом пороге доля принятых верных ответов
+    (TPR) и принятых неверных (FPR), AUC, отметка текущего MSE_THRESHOLD;
+  • задержка распознавания одной картинки (декодирование + сравнение)
+    p50/p99 и пик памяти (tracemalloc) на картинку.
+
+Так изменения ZONES, ZONE_WEIGHTS, MSE_THRESHOLD и оптимизации детектора
+проверяются без живого сайта.
+
+Запуск из корня репозитория:
+    python benchmarks/rank_detector_eval.py [--corpus DIR] [--repeat 5] [--json out.json]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from io import BytesIO
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.rank_detector import RankDetectorImproved, RANKS_DIR, MSE_THRESHOLD  # noqa: E402
+
+UNKNOWN = 'unknown'
+IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.webp'}
+
+Sample = Tuple[str, str, bytes]   # (правильный ранг или '?', имя, байты)
+
+
+# ══════════════════════════════════════════════════════════════
+# НАБОР КАРТ
+# ══════════════════════════════════════════════════════════════
+
+def load_corpus(corpus: Path) -> List[Sample]:
+    samples = []
+    for label_dir in sorted(p for p in corpus.iterdir() if p.is_dir()):
+        label = '?' if label_dir.name.lower() == UNKNOWN else label_dir.name.upper()
+        for path in sorted(label_dir.iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                samples.append((label, f"{label_dir.name}/{path.name}", path.read_bytes()))
+    return samples
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = BytesIO()
+    img.save(buf, fmt, **({'quality': quality} if fmt == 'JPEG' else {}))
+    return buf.getvalue()
+
+
+def synthetic_corpus(per_template: int, rng: np.random.Generator) -> List[Sample]:
+    """Карты из шаблонов ranks/ с искажениями и карты без рамки"""
+    samples = []
+    templates = sorted(RANKS_DIR.glob('frame-*.png'))
+    for path in templates:
+        label = path.stem.replace('frame-', '').split('-')[0].upper()
+        base = Image.open(path).convert('RGB')
+        for i in range(per_template):
+            scale = rng.choice([1.0, 1.5, 2.0, 3.0])
+            img = base.resize((int(base.width * scale), int(base.height * scale)), Image.LANCZOS)
+            img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.85, 1.15))
+            arr = np.asarray(img, dtype=np.float32) + rng.normal(0, rng.uniform(0, 12), (img.height, img.width, 3))
+            img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+            fmt = 'PNG' if i % 3 == 0 else 'JPEG'
+            samples.append((label, f"{path.stem}#{i}.{fmt.lower()}", _encode(img, fmt, int(rng.integers(60, 96)))))
+
+    # Без рамки: шум и однотонные карты того же размера
+    for i in range(per_template * max(1, len(templates)) // 3):
+        if i % 2:
+            arr = rng.integers(0, 256, (432, 288, 3), dtype=np.uint8)
+        else:
+            arr = np.full((432, 288, 3), rng.integers(0, 256, 3), dtype=np.uint8)
+        samples.append(('?', f"{UNKNOWN}#{i}.png", _encode(Image.fromarray(arr), 'PNG', 0)))
+    return samples
+
+
+# ══════════════════════════════════════════════════════════════
+# ИЗМЕРЕНИЯ
+# ══════════════════════════════════════════════════════════════
+
+def run(detector: RankDetectorImproved, samples: List[Sample], repeat: int):
+    """Результат, задержки (мс) и пик памяти (КБ) по каждой картинке"""
+    results, latencies, peaks = [], [], []
+    for _, _, raw in samples:
+        tracemalloc.start()
+        result = detector.detect_details_from_bytes(raw)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            detector.detect_details_from_bytes(raw)
+        latencies.append((time.perf_counter() - started) / repeat * 1000)
+        results.append(result)
+    return results, np.array(latencies), np.array(peaks)
+
+
+def roc(samples: List[Sample], results) -> Tuple[List[Tuple[float, float, float]], float]:
+    """
+    Кривая по порогу MSE: [(порог, TPR, FPR)] и AUC.
+
+    Ответ при пороге T — лучший кандидат, если его MSE ≤ T, иначе '?'.
+    Положительные — карты, где кандидат совпадает с разметкой;
+    отрицательные — остальные (в т.ч. все карты без ранга).
+    """
+    scored = [
+        (r.mse, r.candidate == label) for (label, _, _), r in zip(samples, results) if r is not None
+    ]
+    positives = sum(1 for _, ok in scored if ok)
+    negatives = len(scored) - positives
+    points = [(0.0, 0.0, 0.0)]
+    tp = fp = 0
+    for mse, ok in sorted(scored):
+        tp += ok
+        fp += not ok
+        points.append((mse, tp / positives if positives else 0.0, fp / negatives if negatives else 0.0))
+    fprs = [p[2] for p in points]
+    tprs = [p[1] for p in points]
+    # np.trapezoid появился в numpy 2.0, в 1.26 он называется np.trapz
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+    auc = float(trapezoid(tprs, fprs)) if negatives else 1.0
+    return points, auc
+
+
+def at_threshold(points, threshold: float) -> Tuple[float, float]:
+    tpr = fpr = 0.0
+    for mse, t, f in points:
+        if mse > threshold:
+            break
+        tpr, fpr = t, f
+    return tpr, fpr
+
+
+# ══════════════════════════════════════════════════════════════
+# ОТЧЁТ
+# ══════════════════════════════════════════════════════════════
+
+def report(samples: List[Sample], results, latencies, peaks) -> dict:
+    labels = sorted({label for label, _, _ in samples} | {r.rank for r in results if r})
+    answers = [r.rank if r else 'ошибка' for r in results]
+    correct = sum(a == label for (label, _, _), a in zip(samples, answers))
+
+    print(f"Картинок: {len(samples)}, верно: {correct} ({correct / len(samples):.1%})")
+    per_label = {}
+    for label in labels:
+        total = sum(1 for s in samples if s[0] == label)
+        if total:
+            ok = sum(1 for (lbl, _, _), a in zip(samples, answers) if lbl == label and a == label)
+            per_label[label] = ok / total
+            print(f"  {label:>3}: {ok}/{total} ({ok / total:.1%})")
+
+    # Матрица ошибок
+    confusion = Counter((label, a) for (label, _, _), a in zip(samples, answers))
+    columns = labels + (['ошибка'] if 'ошибка' in answers else [])
+    print("\nМатрица ошибок (строка — разметка, столбец — ответ):")
+    print("      " + "".join(f"{c:>7}" for c in columns))
+    for label in labels:
+        if any(s[0] == label for s in samples):
+            print(f"  {label:>3} " + "".join(f"{confusion[(label, c)]:>7}" for c in columns))
+
+    wrong = [(name, label, a) for (label, name, _), a in zip(samples, answers) if a != label]
+    for name, label, a in wrong[:10]:
+        print(f"  ✗ {name}: {label} → {a}")
+
+    # ROC
+    points, auc = roc(samples, results)
+    print(f"\nROC по порогу MSE (AUC {auc:.4f}):")
+    print(f"  {'порог':>8} | {'TPR':>6} | {'FPR':>6}")
+    thresholds = sorted({MSE_THRESHOLD} | {MSE_THRESHOLD * k for k in (0.1, 0.25, 0.5, 0.75, 1.5, 2)})
+    for threshold in thresholds:
+        tpr, fpr = at_threshold(points, threshold)
+        mark = '  ← MSE_THRESHOLD' if threshold == MSE_THRESHOLD else ''
+        print(f"  {threshold:>8.0f} | {tpr:>6.3f} | {fpr:>6.3f}{mark}")
+
+    margins = [r.margin for r in results if r and r.rank != '?']
+    low = sum(1 for r in results if r and r.rank != '?' and not r.confident)
+    print(f"\nОтрыв от второго ранга: min {min(margins, default=0):.0f}, неуверенных {low}")
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    peak50, peak_max = np.percentile(peaks, 50), peaks.max()
+    print(f"\nЗадержка на картинку: p50 {p50:.2f} мс, p99 {p99:.2f} мс, max {latencies.max():.2f} мс")
+    print(f"Пик памяти на картинку: p50 {peak50:.0f} КБ, max {peak_max:.0f} КБ")
+
+    return {
+        'total': len(samples),
+        'accuracy': correct / len(samples),
+        'per_label': per_label,
+        'confusion': {f"{t}->{a}": n for (t, a), n in confusion.items()},
+        'auc': auc,
+        'threshold': {'mse': MSE_THRESHOLD, 'tpr_fpr': at_threshold(points, MSE_THRESHOLD)},
+        'low_confidence': low,
+        'latency_ms': {'p50': p50, 'p99': p99, 'max': float(latencies.max())},
+        'peak_kb': {'p50': peak50, 'max': float(peak_max)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', type=Path, help='папка с подпапками по рангам')
+    parser.add_argument('--per-template', type=int, default=40,
+                        help='карт на шаблон в сгенерированном наборе')
+    parser.add_argument('--repeat', type=int, default=5, help='повторов для замера задержки')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', type=Path, help='сохранить сводку в JSON')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    detector = RankDetectorImproved()
+    if not detector.is_ready:
+        print("❌ Шаблоны в ranks/ не найдены")
+        return 1
+
+    if args.corpus:
+        samples = load_corpus(args.corpus)
+        source = str(args.corpus)
+    else:
+        samples = synthetic_corpus(args.per_template, np.random.default_rng(args.seed))
+        source = "сгенерирован из ranks/"
+    if not samples:
+        print(f"❌ В наборе нет картинок: {source}")
+        return 1
+
+    print(f"Набор: {source}; шаблонов {len(detector._packed_ranks)}, порог MSE {MSE_THRESHOLD:.0f}\n")
+    results, latencies, peaks = run(detector, samples, args.repeat)
+    summary = report(samples, results, latencies, peaks)
+
+    if args.json:
+        args.json.write_text(json.dumps(summary, ensure_ascii=False, indent=2, default=float))
+        print(f"\nСводка сохранена: {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
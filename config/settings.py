@@ -20,6 +20,54 @@ BASE_URL = 'https://mangabuff.ru'
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
 REQUEST_TIMEOUT = 30
 
+# Мониторинг карт: 'async' — неблокирующий httpx-клиент с пулом соединений,
+# 'sync' — старый путь через requests (блокирует event loop на время запроса)
+CARD_MONITOR_HTTP_MODE = 'async'
+HTTP_POOL_MAX_CONNECTIONS = 10
+HTTP_POOL_MAX_KEEPALIVE = 5
+# Сколько запросов монитор карт делает одновременно при обогащении карты
+CARD_ENRICH_CONCURRENCY = 8
+
+# Прогрессивное уведомление в группу: сначала ID, картинка и ссылка,
+# затем подпись дописывается по мере загрузки данных (не чаще интервала, сек)
+CARD_NOTIFY_PROGRESSIVE = True
+CARD_CAPTION_EDIT_INTERVAL = 1.5
+
+# Личные уведомления о картах: общий лимит Telegram (сообщ/сек), интервал
+# между сообщениями в один чат (сек), параллельных запросов и повторов
+NOTIFY_GLOBAL_RATE = 25
+NOTIFY_PER_CHAT_INTERVAL = 1.0
+NOTIFY_CONCURRENCY = 10
+NOTIFY_MAX_RETRIES = 3
+
+# Кеш ников с сайта: время жизни записи (сек) и размер LRU в памяти
+NICKNAME_CACHE_TTL = 24 * 3600
+NICKNAME_CACHE_SIZE = 512
+
+# Сколько последних картинок карт держать в памяти (для RankDetector и загрузки в Telegram)
+CARD_IMAGE_CACHE_SIZE = 8
+
+# /backfill_ranks: карт за пакет, параллельных загрузок картинок, процессов для сравнения
+RANK_BACKFILL_BATCH = 50
+RANK_BACKFILL_CONCURRENCY = 8
+RANK_BACKFILL_WORKERS = 2
+
+# Кеш метаданных карт: название и ранг бессрочно, количества владельцев/желающих (сек)
+CARD_COUNTS_TTL = 10 * 60
+
+# Адаптивный опрос страницы boost (вместо фиксированных 2 сек):
+# чаще в окна, когда карты обычно меняются, реже в тихие часы и после ошибок
+CARD_MONITOR_ADAPTIVE = True
+CARD_POLL_MIN_INTERVAL = 1.0
+CARD_POLL_BASE_INTERVAL = 2.0
+CARD_POLL_MAX_INTERVAL = 30.0
+CARD_POLL_HOT_WINDOW = 5        # минут вокруг типичного времени смены
+CARD_POLL_JITTER = 0.2          # ±20% к интервалу
+
+# Замер задержек event loop (сек): период пробы и период отчёта в лог
+LOOP_LAG_PROBE_INTERVAL = 0.1
+LOOP_LAG_REPORT_INTERVAL = 300
+
 # Текст приветствия
 WELCOME_TEXT = """Добро пожаловать в тг бота Club Taro
 
@@ -31,3 +79,12 @@ WELCOME_TEXT = """Добро пожаловать в тг бота Club Taro
 
 # База данных
 DATABASE_NAME = 'club_taro.db'
+
+# SQLite: размер memory-mapped области (байт), кеш страниц на соединение (КБ),
+# кеш подготовленных запросов на соединение
+DATABASE_MMAP_SIZE = 64 * 1024 * 1024
+DATABASE_CACHE_KB = 8 * 1024
+DATABASE_STATEMENT_CACHE = 256
+
+# Потоков-читателей для database.async_db (запись — всегда в одном потоке)
+DATABASE_READER_THREADS = 4
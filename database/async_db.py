@@ -0,0 +1,221 @@
+"""
+Асинхронный доступ к базе данных
+
+Функции database.db синхронные: вызов из корутины останавливает
+event loop на время запроса, а запись — ещё и на fsync. Здесь те же
+функции в awaitable-виде:
+  • запись — в одном потоке-писателе, строго в порядке вызова;
+  • чтение — в пуле потоков-читателей (WAL: читатели не ждут писателя).
+
+У каждого потока своё соединение (database.db._connect), поэтому
+медленный диск задерживает только запросы к БД, а не обработку
+обновлений Telegram.
+
+Использование:
+    from database import async_db as adb
+    if await adb.is_blacklisted(user_id): ...
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Callable
+
+from config.settings import DATABASE_READER_THREADS
+from database import db
+from database.db import NOTIF_KEY_MAIN, ROLE_USER, ROLE_OPERATOR, ROLE_ADMIN  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+READ = 'read'
+WRITE = 'write'
+
+
+class DatabaseExecutor:
+    """Поток-писатель и пул читателей с учётом глубины очередей"""
+
+    def __init__(self, readers: int = DATABASE_READER_THREADS):
+        self._executors = {
+            WRITE: ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer'),
+            READ: ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader'),
+        }
+        # Счётчики меняются только в потоке event loop
+        self.depth: Dict[str, int] = {READ: 0, WRITE: 0}
+        self.max_depth: Dict[str, int] = {READ: 0, WRITE: 0}
+        self.calls: Dict[str, int] = {READ: 0, WRITE: 0}
+        self.busy_s: Dict[str, float] = {READ: 0.0, WRITE: 0.0}
+
+    async def run(self, kind: str, fn: Callable, *args, **kwargs):
+        """Выполняет fn в потоке писателя (WRITE) или читателей (READ)"""
+        loop = asyncio.get_running_loop()
+        self.depth[kind] += 1
+        self.max_depth[kind] = max(self.max_depth[kind], self.depth[kind])
+        started = loop.time()
+        try:
+            return await loop.run_in_executor(
+                self._executors[kind], functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.depth[kind] -= 1
+            self.calls[kind] += 1
+            self.busy_s[kind] += loop.time() - started
+
+    @property
+    def queue_depth(self) -> int:
+        """Запросов в очереди и в работе сейчас"""
+        return self.depth[READ] + self.depth[WRITE]
+
+    def format_stats(self, reset: bool = False) -> str:
+        parts = []
+        for kind, name in ((WRITE, 'запись'), (READ, 'чтение')):
+            calls = self.calls[kind]
+            avg_ms = self.busy_s[kind] / calls * 1000 if calls else 0.0
+            parts.append(
+                f"{name}: {calls} запросов, в среднем {avg_ms:.1f} мс, "
+                f"очередь {self.depth[kind]} (макс {self.max_depth[kind]})"
+            )
+        if reset:
+            for kind in (READ, WRITE):
+                self.max_depth[kind] = self.depth[kind]
+                self.calls[kind] = 0
+                self.busy_s[kind] = 0.0
+        return "; ".join(parts)
+
+    def shutdown(self):
+        """Дожидается запросов в очереди и закрывает соединение писателя"""
+        writer = self._executors[WRITE]
+        try:
+            writer.submit(db.close_connection).result(timeout=10)
+        except Exception as e:
+            logger.error(f"Ошибка закрытия соединения писателя БД: {e}")
+        # Соединения читателей закрываются вместе с их потоками
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+
+
+# Глобальный экземпляр
+_executor_instance: Optional[DatabaseExecutor] = None
+
+
+def get_db_executor() -> DatabaseExecutor:
+    """Возвращает глобальный исполнитель запросов к БД"""
+    global _executor_instance
+    if _executor_instance is None:
+        _executor_instance = DatabaseExecutor()
+    return _executor_instance
+
+
+def shutdown():
+    global _executor_instance
+    if _executor_instance is not None:
+        _executor_instance.shutdown()
+        _executor_instance = None
+
+
+def _reader(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await get_db_executor().run(READ, fn, *args, **kwargs)
+    return wrapper
+
+
+def _writer(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await get_db_executor().run(WRITE, fn, *args, **kwargs)
+    return wrapper
+
+
+# ══════════════════════════════════════════════════════════════
+# РОЛИ
+# ══════════════════════════════════════════════════════════════
+
+get_user_role = _reader(db.get_user_role)
+set_user_role = _writer(db.set_user_role)
+is_user = _reader(db.is_user)
+is_operator = _reader(db.is_operator)
+is_admin = _reader(db.is_admin)
+is_staff = _reader(db.is_staff)
+get_all_users_by_role = _reader(db.get_all_users_by_role)
+get_staff_list = _reader(db.get_staff_list)
+
+# ══════════════════════════════════════════════════════════════
+# НАСТРОЙКИ УВЕДОМЛЕНИЙ
+# ══════════════════════════════════════════════════════════════
+
+get_notification_settings = _reader(db.get_notification_settings)
+get_account_notification_enabled = _reader(db.get_account_notification_enabled)
+toggle_notification = _writer(db.toggle_notification)
+
+# ══════════════════════════════════════════════════════════════
+# ЧЁРНЫЙ СПИСОК
+# ══════════════════════════════════════════════════════════════
+
+is_blacklisted = _reader(db.is_blacklisted)
+add_to_blacklist = _writer(db.add_to_blacklist)
+remove_from_blacklist = _writer(db.remove_from_blacklist)
+get_blacklist = _reader(db.get_blacklist)
+
+# ══════════════════════════════════════════════════════════════
+# ПОЛЬЗОВАТЕЛИ И ТВИНЫ
+# ══════════════════════════════════════════════════════════════
+
+save_user = _writer(db.save_user)
+is_user_linked = _reader(db.is_user_linked)
+get_user_profile_url = _reader(db.get_user_profile_url)
+get_user_info = _reader(db.get_user_info)
+get_all_users = _reader(db.get_all_users)
+get_linked_user = _reader(db.get_linked_user)
+get_profile_owners = _reader(db.get_profile_owners)
+add_twink = _writer(db.add_twink)
+get_user_twinks = _reader(db.get_user_twinks)
+remove_twink = _writer(db.remove_twink)
+get_twinks_count = _reader(db.get_twinks_count)
+
+# ══════════════════════════════════════════════════════════════
+# ЦЕНЫ КАРТ
+# ══════════════════════════════════════════════════════════════
+
+clear_all_card_prices = _writer(db.clear_all_card_prices)
+save_card_price = _writer(db.save_card_price)
+replace_card_prices = _writer(db.replace_card_prices)
+get_card_price = _reader(db.get_card_price)
+get_all_card_prices = _reader(db.get_all_card_prices)
+get_card_prices_count = _reader(db.get_card_prices_count)
+
+# ══════════════════════════════════════════════════════════════
+# КАРТЫ КЛУБА
+# ══════════════════════════════════════════════════════════════
+
+save_club_card = _writer(db.save_club_card)
+is_club_card_saved = _reader(db.is_club_card_saved)
+get_club_card = _reader(db.get_club_card)
+get_all_club_cards = _reader(db.get_all_club_cards)
+get_club_card_discovery_times = _reader(db.get_club_card_discovery_times)
+count_unranked_club_cards = _reader(db.count_unranked_club_cards)
+get_unranked_club_cards = _reader(db.get_unranked_club_cards)
+update_club_card_ranks = _writer(db.update_club_card_ranks)
+get_card_file_id = _reader(db.get_card_file_id)
+save_card_file_id = _writer(db.save_card_file_id)
+delete_card_file_id = _writer(db.delete_card_file_id)
+
+# ══════════════════════════════════════════════════════════════
+# КЕШИ
+# ══════════════════════════════════════════════════════════════
+
+get_rank_cache_entry = _reader(db.get_rank_cache_entry)
+save_rank_cache_entries = _writer(db.save_rank_cache_entries)
+purge_rank_cache = _writer(db.purge_rank_cache)
+get_cached_site_nickname = _reader(db.get_cached_site_nickname)
+save_cached_site_nickname = _writer(db.save_cached_site_nickname)
+
+# ══════════════════════════════════════════════════════════════
+# ЛОГИ ПЕРСОНАЛА И ДИАЛОГИ
+# ══════════════════════════════════════════════════════════════
+
+log_operator_action = _writer(db.log_operator_action)
+get_operator_logs = _reader(db.get_operator_logs)
+get_operator_stats = _reader(db.get_operator_stats)
+save_dialog_message = _writer(db.save_dialog_message)
+get_dialog_messages = _reader(db.get_dialog_messages)
+get_dialog_stats = _reader(db.get_dialog_stats)
@@ -3,16 +3,82 @@
 ✅ ОБНОВЛЕНО: Добавлена функция get_all_users для уведомлений о картах
 ✅ ОБНОВЛЕНО: Добавлена система ролей (user, operator, admin)
 ✅ ОБНОВЛЕНО: Добавлены настройки уведомлений per-аккаунт (notification_settings)
+✅ ОБНОВЛЕНО: Аккаунты (основной и твины) с настройкой уведомлений — таблица accounts
 """
 import sqlite3
 import logging
 import json
-from typing import Optional, List, Tuple, Dict
+import threading
+from typing import Optional, List, Tuple, Dict, Callable, Iterable
 from datetime import datetime
-from config.settings import DATABASE_NAME, ADMIN_CHAT_ID
+from config.settings import (
+    DATABASE_NAME, ADMIN_CHAT_ID,
+    DATABASE_MMAP_SIZE, DATABASE_CACHE_KB, DATABASE_STATEMENT_CACHE
+)
 
 logger = logging.getLogger(__name__)
 
+# ══════════════════════════════════════════════════════════════
+# СОЕДИНЕНИЯ
+# ══════════════════════════════════════════════════════════════
+
+class _PooledConnection(sqlite3.Connection):
+    """
+    Соединение, которое держит поток. close() его не закрывает, а только
+    откатывает незафиксированную транзакцию — как и настоящее закрытие.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Соединение с БД текущего потока (открывается один раз).
+
+    WAL — чтение не ждёт записи, synchronous=NORMAL — без fsync на каждый
+    commit (в WAL безопасно для целостности), mmap и кеш страниц —
+    чтение без системных вызовов. Подготовленные запросы кешируются
+    соединением (cached_statements).
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.database == DATABASE_NAME:
+        # Транзакция, брошенная функцией, упавшей до commit/close
+        if conn.in_transaction:
+            conn.rollback()
+        return conn
+
+    if conn is not None:
+        conn.really_close()
+    conn = sqlite3.connect(
+        DATABASE_NAME,
+        factory=_PooledConnection,
+        cached_statements=DATABASE_STATEMENT_CACHE,
+    )
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={int(DATABASE_MMAP_SIZE)}')
+    conn.execute(f'PRAGMA cache_size=-{int(DATABASE_CACHE_KB)}')
+    _local.conn = conn
+    _local.database = DATABASE_NAME
+    return conn
+
+
+def close_connection():
+    """Закрывает соединение текущего потока (при остановке бота)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.really_close()
+        _local.conn = None
+
+
 # ══════════════════════════════════════════════════════════════
 # РОЛИ ПОЛЬЗОВАТЕЛЕЙ
 # ══════════════════════════════════════════════════════════════
@@ -22,13 +88,30 @@ ROLE_ADMIN = 'admin'
 
 VALID_ROLES = [ROLE_USER, ROLE_OPERATOR, ROLE_ADMIN]
 
-# Ключ для основного аккаунта в notification_settings
+# Ключ основного аккаунта в настройках уведомлений (у твина ключ — profile_id)
 NOTIF_KEY_MAIN = 'main'
 
+# Подписчики на изменение аккаунтов пользователя (основной, твины, уведомления)
+_account_listeners: List[Callable[[int], None]] = []
+
+
+def add_account_listener(callback: Callable[[int], None]):
+    """Регистрирует callback(user_id), вызываемый после изменения аккаунтов пользователя"""
+    if callback not in _account_listeners:
+        _account_listeners.append(callback)
+
+
+def _notify_account_changed(user_id: int):
+    for callback in _account_listeners:
+        try:
+            callback(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика изменения аккаунтов пользователя {user_id}: {e}")
+
 
 def init_db():
     """Инициализирует базу данных и применяет миграции"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
 
     # Таблица пользователей
@@ -41,14 +124,26 @@ def init_db():
             profile_url TEXT,
             profile_id TEXT,
             site_nickname TEXT,
-            twinks TEXT,
             is_linked INTEGER DEFAULT 0,
             role TEXT DEFAULT 'user',
-            notification_settings TEXT DEFAULT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
 
+    # Аккаунты сайта пользователей: основной (is_main = 1, profile_id может
+    # быть NULL до привязки) и твины в порядке добавления (id)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            profile_id TEXT,
+            profile_url TEXT,
+            nickname TEXT,
+            is_main INTEGER NOT NULL DEFAULT 0,
+            notify INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+
     # Таблица черного списка
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS blacklist (
@@ -73,7 +168,8 @@ def init_db():
             wants_count INTEGER DEFAULT 0,
             owners_count INTEGER DEFAULT 0,
             club_owners TEXT,
-            discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            counts_updated_at REAL
         )
     ''')
 
@@ -92,14 +188,7 @@ def init_db():
     ''')
 
     # ✅ НОВАЯ ТАБЛИЦА: Таблица цен на карты
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS card_prices (
-            card_id TEXT PRIMARY KEY,
-            card_url TEXT UNIQUE NOT NULL,
-            price REAL NOT NULL,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS card_prices {_CARD_PRICES_COLUMNS}')
 
     # Таблица сообщений диалогов
     cursor.execute('''
@@ -113,11 +202,46 @@ def init_db():
         )
     ''')
 
+    # file_id загруженных в Telegram картинок карт клуба
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS card_file_ids (
+            card_id TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Результаты распознавания ранга: ключ 'url:…' или 'sha:…' (хеш картинки);
+    # templates_sig — отпечаток набора шаблонов, с которым получен результат
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rank_cache (
+            cache_key TEXT PRIMARY KEY,
+            rank TEXT NOT NULL,
+            mse REAL,
+            variant INTEGER,
+            margin REAL,
+            templates_sig TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+    # Кеш ников с сайта (profile_id → ник)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS site_nicknames (
+            profile_id TEXT PRIMARY KEY,
+            nickname TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+    ''')
+
     # Индексы
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_operator_logs_operator ON operator_logs(operator_id, created_at DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_operator_logs_action ON operator_logs(action_type, created_at DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_dialog_messages_dialog ON dialog_messages(dialog_id, created_at DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_user ON accounts(user_id, profile_id)')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_main ON accounts(user_id) WHERE is_main = 1')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_accounts_profile ON accounts(profile_id)')
 
     # ═══════════════════════════════════════════════════════════
     # МИГРАЦИИ
@@ -127,6 +251,7 @@ def init_db():
         ('card_rank',     "TEXT DEFAULT '?'"),
         ('card_progress', 'TEXT'),
         ('daily_donated', 'TEXT'),
+        ('counts_updated_at', 'REAL'),
     ]:
         try:
             cursor.execute(f'ALTER TABLE club_cards ADD COLUMN {col} {col_type}')
@@ -134,7 +259,13 @@ def init_db():
         except Exception:
             pass
 
-    for col in ['site_nickname TEXT', 'twinks TEXT', "role TEXT DEFAULT 'user'", 'notification_settings TEXT DEFAULT NULL']:
+    try:
+        cursor.execute('ALTER TABLE rank_cache ADD COLUMN margin REAL')
+        logger.info("Миграция БД: добавлен столбец rank_cache.margin")
+    except Exception:
+        pass
+
+    for col in ['site_nickname TEXT', "role TEXT DEFAULT 'user'"]:
         try:
             cursor.execute(f'ALTER TABLE users ADD COLUMN {col}')
             col_name = col.split()[0]
@@ -161,36 +292,86 @@ def init_db():
     except Exception as e:
         logger.debug(f"Миграция admin role: {e}")
 
+    # Основной аккаунт есть у каждого пользователя
+    cursor.execute('''
+        INSERT OR IGNORE INTO accounts (user_id, profile_id, profile_url, nickname, is_main)
+        SELECT user_id, profile_id, profile_url, site_nickname, 1 FROM users
+    ''')
+
     # Миграция старой таблицы twinks
     try:
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='twinks'")
         if cursor.fetchone():
             logger.info("Обнаружена старая таблица twinks, выполняю миграцию...")
-            cursor.execute('SELECT user_id, profile_url, profile_id, site_nickname FROM twinks')
-            old_twinks = cursor.fetchall()
-            user_twinks_map = {}
-            for uid, profile_url, profile_id, site_nickname in old_twinks:
-                if uid not in user_twinks_map:
-                    user_twinks_map[uid] = []
-                user_twinks_map[uid].append({'profile_url': profile_url, 'profile_id': profile_id, 'site_nickname': site_nickname})
-            for uid, twinks_list in user_twinks_map.items():
-                cursor.execute('UPDATE users SET twinks = ? WHERE user_id = ?', (json.dumps(twinks_list, ensure_ascii=False), uid))
+            cursor.execute('''
+                INSERT OR IGNORE INTO accounts (user_id, profile_id, profile_url, nickname)
+                SELECT user_id, profile_id, profile_url, site_nickname FROM twinks ORDER BY rowid
+            ''')
+            migrated = cursor.rowcount
             cursor.execute('DROP TABLE twinks')
-            logger.info(f"Миграция twinks завершена: {len(old_twinks)} твинов")
+            logger.info(f"Миграция twinks завершена: {migrated} твинов")
     except Exception as e:
         logger.debug(f"Миграция twinks: {e}")
 
+    _migrate_account_json(cursor)
+
     conn.commit()
     conn.close()
     logger.info("База данных инициализирована")
 
 
+def _migrate_account_json(cursor: sqlite3.Cursor):
+    """
+    Переносит твины и настройки уведомлений из JSON-столбцов users.twinks
+    и users.notification_settings в таблицу accounts. Столбцы остаются
+    (для отката на старую версию), но очищаются — повторно не переносятся.
+    """
+    cursor.execute('PRAGMA table_info(users)')
+    columns = {row[1] for row in cursor.fetchall()}
+    if not {'twinks', 'notification_settings'} <= columns:
+        return
+
+    cursor.execute('''
+        SELECT user_id, twinks, notification_settings FROM users
+        WHERE twinks IS NOT NULL OR notification_settings IS NOT NULL
+    ''')
+    rows = cursor.fetchall()
+    if not rows:
+        return
+
+    twinks_total = 0
+    for user_id, raw_twinks, raw_settings in rows:
+        try:
+            twinks = json.loads(raw_twinks) if raw_twinks else []
+            settings = json.loads(raw_settings) if raw_settings else {}
+        except Exception as e:
+            logger.error(f"Миграция аккаунтов: не удалось разобрать JSON пользователя {user_id}: {e}")
+            continue
+
+        for twink in twinks:
+            profile_id = twink.get('profile_id')
+            if not profile_id:
+                continue
+            cursor.execute(
+                'INSERT OR IGNORE INTO accounts (user_id, profile_id, profile_url, nickname, notify) VALUES (?, ?, ?, ?, ?)',
+                (user_id, str(profile_id), twink.get('profile_url'), twink.get('site_nickname'),
+                 1 if settings.get(str(profile_id), True) else 0)
+            )
+            twinks_total += cursor.rowcount
+        cursor.execute(
+            'UPDATE accounts SET notify = ? WHERE user_id = ? AND is_main = 1',
+            (1 if settings.get(NOTIF_KEY_MAIN, True) else 0, user_id)
+        )
+        cursor.execute('UPDATE users SET twinks = NULL, notification_settings = NULL WHERE user_id = ?', (user_id,))
+    logger.info(f"Миграция БД: аккаунты {len(rows)} пользователей перенесены в accounts ({twinks_total} твинов)")
+
+
 # ══════════════════════════════════════════════════════════════
 # УПРАВЛЕНИЕ РОЛЯМИ
 # ══════════════════════════════════════════════════════════════
 
 def get_user_role(user_id: int) -> str:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT role FROM users WHERE user_id = ?', (user_id,))
     result = cursor.fetchone()
@@ -205,7 +386,7 @@ def set_user_role(user_id: int, role: str) -> bool:
     if role not in VALID_ROLES:
         logger.error(f"Попытка установить невалидную роль: {role}")
         return False
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT user_id FROM users WHERE user_id = ?', (user_id,))
     exists = cursor.fetchone()
@@ -233,7 +414,7 @@ def is_staff(user_id: int) -> bool:
 
 
 def get_all_users_by_role(role: str = None) -> List[Tuple]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     if role:
         cursor.execute('SELECT user_id, username, first_name, role FROM users WHERE role = ? ORDER BY created_at DESC', (role,))
@@ -245,7 +426,7 @@ def get_all_users_by_role(role: str = None) -> List[Tuple]:
 
 
 def get_staff_list() -> List[Dict]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT user_id, username, first_name, last_name, role FROM users
@@ -258,100 +439,40 @@ def get_staff_list() -> List[Dict]:
 
 
 # ══════════════════════════════════════════════════════════════
-# ✅ НАСТРОЙКИ УВЕДОМЛЕНИЙ
+# ✅ НАСТРОЙКИ УВЕДОМЛЕНИЙ (accounts.notify)
 # ══════════════════════════════════════════════════════════════
 
-def _build_default_notification_settings(user_id: int) -> Dict[str, bool]:
+def _account_condition(profile_key: str) -> Tuple[str, Tuple]:
+    """Условие WHERE для аккаунта по ключу настройки: 'main' или profile_id твина"""
+    if str(profile_key) == NOTIF_KEY_MAIN:
+        return 'is_main = 1', ()
+    return 'is_main = 0 AND profile_id = ?', (str(profile_key),)
+
+
+def get_notification_settings(user_id: int) -> Dict[str, bool]:
     """
-    Строит словарь настроек уведомлений по умолчанию (всё включено).
-    
+    Возвращает настройки уведомлений пользователя.
+
     Формат:
     {
         "main": True,          # основной аккаунт
         "123456": True,        # твин с profile_id=123456
         ...
     }
+    Аккаунты без записи считаются включёнными.
     """
-    settings = {NOTIF_KEY_MAIN: True}
-
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT twinks FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-
-    if result and result[0]:
-        try:
-            twinks = json.loads(result[0])
-            for t in twinks:
-                pid = t.get('profile_id')
-                if pid:
-                    settings[str(pid)] = True
-        except Exception as e:
-            logger.error(f"Ошибка парсинга твинов при построении настроек: {e}")
-
-    return settings
-
-
-def get_notification_settings(user_id: int) -> Dict[str, bool]:
-    """
-    Возвращает настройки уведомлений пользователя.
-    Если настроек нет — создаёт и сохраняет дефолтные (всё включено).
-    Если в настройках отсутствуют ключи для новых твинов — добавляет их.
-    """
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute('SELECT notification_settings, twinks FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
+    cursor.execute('SELECT is_main, profile_id, notify FROM accounts WHERE user_id = ?', (user_id,))
+    rows = cursor.fetchall()
     conn.close()
 
-    if not result:
-        return {NOTIF_KEY_MAIN: True}
-
-    raw_settings, raw_twinks = result
-
-    # Парсим сохранённые настройки
-    settings: Dict[str, bool] = {}
-    if raw_settings:
-        try:
-            settings = json.loads(raw_settings)
-        except Exception:
-            settings = {}
-
-    # Убеждаемся что main всегда есть
-    if NOTIF_KEY_MAIN not in settings:
-        settings[NOTIF_KEY_MAIN] = True
-
-    # Добавляем ключи для твинов, если их ещё нет (новые твины по умолчанию включены)
-    if raw_twinks:
-        try:
-            twinks = json.loads(raw_twinks)
-            changed = False
-            for t in twinks:
-                pid = str(t.get('profile_id', ''))
-                if pid and pid not in settings:
-                    settings[pid] = True
-                    changed = True
-            if changed:
-                _save_notification_settings(user_id, settings)
-        except Exception as e:
-            logger.error(f"Ошибка синхронизации настроек уведомлений с твинами: {e}")
-
+    settings = {NOTIF_KEY_MAIN: True}
+    for is_main, profile_id, notify in rows:
+        settings[NOTIF_KEY_MAIN if is_main else str(profile_id)] = bool(notify)
     return settings
 
 
-def _save_notification_settings(user_id: int, settings: Dict[str, bool]):
-    """Сохраняет настройки уведомлений в БД"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        'UPDATE users SET notification_settings = ? WHERE user_id = ?',
-        (json.dumps(settings, ensure_ascii=False), user_id)
-    )
-    conn.commit()
-    conn.close()
-
-
 def toggle_notification(user_id: int, profile_key: str) -> bool:
     """
     Переключает настройку уведомления для конкретного аккаунта.
@@ -363,11 +484,21 @@ def toggle_notification(user_id: int, profile_key: str) -> bool:
     Returns:
         bool: Новое значение настройки (True = включено, False = выключено)
     """
-    settings = get_notification_settings(user_id)
-    current_value = settings.get(str(profile_key), True)
-    new_value = not current_value
-    settings[str(profile_key)] = new_value
-    _save_notification_settings(user_id, settings)
+    condition, params = _account_condition(profile_key)
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'UPDATE accounts SET notify = 1 - notify WHERE user_id = ? AND {condition}', (user_id, *params))
+    cursor.execute(f'SELECT notify FROM accounts WHERE user_id = ? AND {condition}', (user_id, *params))
+    row = cursor.fetchone()
+    conn.commit()
+    conn.close()
+
+    if row is None:
+        logger.warning(f"Пользователь {user_id}: аккаунт '{profile_key}' не найден, уведомления не переключены")
+        return True
+
+    new_value = bool(row[0])
+    _notify_account_changed(user_id)
     logger.info(f"Пользователь {user_id}: уведомления для '{profile_key}' → {'вкл' if new_value else 'выкл'}")
     return new_value
 
@@ -377,17 +508,13 @@ def get_account_notification_enabled(user_id: int, profile_key: str) -> bool:
     Проверяет, включены ли уведомления для конкретного аккаунта.
     По умолчанию True.
     """
-    settings = get_notification_settings(user_id)
-    return settings.get(str(profile_key), True)
-
-
-def init_notification_settings_for_user(user_id: int):
-    """
-    Инициализирует настройки уведомлений для нового/обновлённого пользователя.
-    Вызывается при сохранении пользователя и добавлении твина.
-    """
-    settings = get_notification_settings(user_id)
-    _save_notification_settings(user_id, settings)
+    condition, params = _account_condition(profile_key)
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT notify FROM accounts WHERE user_id = ? AND {condition}', (user_id, *params))
+    row = cursor.fetchone()
+    conn.close()
+    return bool(row[0]) if row else True
 
 
 # ══════════════════════════════════════════════════════════════
@@ -395,7 +522,7 @@ def init_notification_settings_for_user(user_id: int):
 # ══════════════════════════════════════════════════════════════
 
 def is_blacklisted(user_id: int) -> bool:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT user_id FROM blacklist WHERE user_id = ?', (user_id,))
     result = cursor.fetchone()
@@ -404,7 +531,7 @@ def is_blacklisted(user_id: int) -> bool:
 
 
 def add_to_blacklist(user_id: int, username: str = "", first_name: str = "", reason: str = ""):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('INSERT OR REPLACE INTO blacklist (user_id, username, first_name, reason) VALUES (?, ?, ?, ?)', (user_id, username, first_name, reason))
     conn.commit()
@@ -413,7 +540,7 @@ def add_to_blacklist(user_id: int, username: str = "", first_name: str = "", rea
 
 
 def remove_from_blacklist(user_id: int):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM blacklist WHERE user_id = ?', (user_id,))
     conn.commit()
@@ -422,7 +549,7 @@ def remove_from_blacklist(user_id: int):
 
 
 def get_blacklist() -> List[Tuple]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT user_id, username, first_name, reason, blocked_at FROM blacklist ORDER BY blocked_at DESC')
     result = cursor.fetchall()
@@ -433,34 +560,43 @@ def get_blacklist() -> List[Tuple]:
 def save_user(user_id: int, username: str, first_name: str, last_name: str,
               profile_url: str = None, profile_id: str = None,
               site_nickname: str = None, is_linked: bool = False):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT twinks, role, notification_settings FROM users WHERE user_id = ?', (user_id,))
-    existing = cursor.fetchone()
-    existing_twinks = existing[0] if existing else None
-    existing_role = existing[1] if existing else ROLE_USER
-    existing_notif = existing[2] if existing else None
-
     cursor.execute('''
-        INSERT OR REPLACE INTO users
-        (user_id, username, first_name, last_name, profile_url, profile_id, site_nickname,
-         twinks, is_linked, role, notification_settings)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO users
+        (user_id, username, first_name, last_name, profile_url, profile_id, site_nickname, is_linked, role)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            username = excluded.username, first_name = excluded.first_name,
+            last_name = excluded.last_name, profile_url = excluded.profile_url,
+            profile_id = excluded.profile_id, site_nickname = excluded.site_nickname,
+            is_linked = excluded.is_linked
     ''', (user_id, username, first_name, last_name, profile_url, profile_id, site_nickname,
-          existing_twinks, 1 if is_linked else 0, existing_role, existing_notif))
+          1 if is_linked else 0, ROLE_USER))
+    cursor.execute('SELECT role FROM users WHERE user_id = ?', (user_id,))
+    role = cursor.fetchone()[0]
+
+    # Основной аккаунт; настройка уведомлений сохраняется при перепривязке.
+    # Твин с тем же profile_id становится основным аккаунтом.
+    if profile_id:
+        cursor.execute('DELETE FROM accounts WHERE user_id = ? AND profile_id = ? AND is_main = 0',
+                       (user_id, str(profile_id)))
+    cursor.execute('''
+        INSERT INTO accounts (user_id, profile_id, profile_url, nickname, is_main) VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT(user_id) WHERE is_main = 1 DO UPDATE SET
+            profile_id = excluded.profile_id, profile_url = excluded.profile_url, nickname = excluded.nickname
+    ''', (user_id, str(profile_id) if profile_id else None, profile_url, site_nickname))
     conn.commit()
     conn.close()
 
-    # ✅ Инициализируем/синхронизируем настройки уведомлений
-    if is_linked:
-        init_notification_settings_for_user(user_id)
+    _notify_account_changed(user_id)
 
-    logger.info(f"Данные пользователя {user_id} сохранены (ник: {site_nickname}, роль: {existing_role})")
+    logger.info(f"Данные пользователя {user_id} сохранены (ник: {site_nickname}, роль: {role})")
 
 
 def is_user_linked(user_id: int) -> bool:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT is_linked FROM users WHERE user_id = ?', (user_id,))
     result = cursor.fetchone()
@@ -469,7 +605,7 @@ def is_user_linked(user_id: int) -> bool:
 
 
 def get_user_profile_url(user_id: int) -> Optional[str]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT profile_url FROM users WHERE user_id = ?', (user_id,))
     result = cursor.fetchone()
@@ -478,7 +614,7 @@ def get_user_profile_url(user_id: int) -> Optional[str]:
 
 
 def get_user_info(user_id: int) -> Optional[Tuple]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT user_id, username, first_name, last_name, site_nickname, role FROM users WHERE user_id = ?', (user_id,))
     result = cursor.fetchone()
@@ -486,94 +622,139 @@ def get_user_info(user_id: int) -> Optional[Tuple]:
     return result
 
 
+# Аккаунты привязанных пользователей: основной первым, твины в порядке добавления
+_LINKED_ACCOUNTS = '''
+    SELECT u.user_id, u.username, u.first_name, u.last_name, u.site_nickname, u.role,
+           a.profile_id, a.nickname, a.is_main, a.notify
+    FROM users u JOIN accounts a ON a.user_id = u.user_id
+    WHERE u.is_linked = 1 AND a.profile_id IS NOT NULL {where}
+    ORDER BY u.user_id, a.is_main DESC, a.id
+'''
+
+
 def get_all_users() -> List[Dict]:
     """
-    Получает всех привязанных пользователей из БД.
+    Получает всех привязанных пользователей из БД вместе с аккаунтами.
     Используется для проверки владения картами клуба.
     """
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT user_id, username, first_name, last_name, profile_id, twinks, site_nickname, role, notification_settings
-        FROM users WHERE is_linked = 1
-    ''')
+    cursor.execute(_LINKED_ACCOUNTS.format(where=''))
     rows = cursor.fetchall()
     conn.close()
+    return _linked_users_from_rows(rows)
 
-    result = []
-    for r in rows:
-        notif_raw = r[8] if len(r) > 8 else None
-        notif_settings = {}
-        if notif_raw:
-            try:
-                notif_settings = json.loads(notif_raw)
-            except Exception:
-                notif_settings = {}
-
-        result.append({
-            'user_id': r[0],
-            'username': r[1],
-            'first_name': r[2],
-            'last_name': r[3],
-            'profile_id': r[4],
-            'twinks': r[5],
-            'site_nickname': r[6],
-            'role': r[7] if len(r) > 7 else ROLE_USER,
-            'notification_settings': notif_settings,
+
+def get_linked_user(user_id: int) -> Optional[Dict]:
+    """Привязанный пользователь в формате get_all_users или None"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(_LINKED_ACCOUNTS.format(where='AND u.user_id = ?'), (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    users = _linked_users_from_rows(rows)
+    return users[0] if users else None
+
+
+def _linked_users_from_rows(rows: List[Tuple]) -> List[Dict]:
+    users: Dict[int, Dict] = {}
+    for user_id, username, first_name, last_name, site_nickname, role, profile_id, nickname, is_main, notify in rows:
+        user = users.get(user_id)
+        if user is None:
+            user = users[user_id] = {
+                'user_id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+                'profile_id': None,
+                'site_nickname': site_nickname,
+                'role': role or ROLE_USER,
+                'accounts': [],
+            }
+        if is_main:
+            user['profile_id'] = profile_id
+        user['accounts'].append({
+            'profile_id': profile_id,
+            'nickname': nickname,
+            'is_main': bool(is_main),
+            'notify': bool(notify),
         })
-    return result
+    return list(users.values())
+
+
+def get_profile_owners(profile_id: str) -> List[Dict]:
+    """
+    Аккаунты привязанных пользователей с profile_id (поиск по индексу
+    idx_accounts_profile). order — 0 у основного аккаунта, у твинов
+    растёт в порядке добавления.
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT a.user_id, a.profile_id, a.nickname, a.is_main, a.notify, a.id
+        FROM accounts a JOIN users u ON u.user_id = a.user_id
+        WHERE a.profile_id = ? AND u.is_linked = 1
+    ''', (str(profile_id),))
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {
+            'user_id': user_id,
+            'profile_id': profile_id,
+            'nickname': nickname,
+            'is_main': bool(is_main),
+            'notify': bool(notify),
+            'order': 0 if is_main else account_id,
+        }
+        for user_id, profile_id, nickname, is_main, notify, account_id in rows
+    ]
 
 
 # ══════════════════════════════════════════════════════════════
-# ТВИНЫ (ХРАНЯТСЯ В СТОЛБЦЕ users.twinks КАК JSON)
+# ТВИНЫ (accounts, is_main = 0)
 # ══════════════════════════════════════════════════════════════
 
 def add_twink(user_id: int, profile_url: str, profile_id: str, site_nickname: str = None) -> bool:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
-        cursor.execute('SELECT twinks FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        if not result:
+        cursor.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,))
+        if not cursor.fetchone():
             logger.warning(f"Пользователь {user_id} не найден в БД")
-            conn.close()
             return False
 
-        twinks_list = json.loads(result[0]) if result[0] else []
-
-        for twink in twinks_list:
-            if twink.get('profile_id') == profile_id:
-                logger.warning(f"Твин {profile_id} уже существует для пользователя {user_id}")
-                conn.close()
-                return False
+        # Новый твин по умолчанию с включёнными уведомлениями
+        cursor.execute(
+            'INSERT OR IGNORE INTO accounts (user_id, profile_id, profile_url, nickname) VALUES (?, ?, ?, ?)',
+            (user_id, str(profile_id), profile_url, site_nickname)
+        )
+        if cursor.rowcount == 0:
+            logger.warning(f"Твин {profile_id} уже существует для пользователя {user_id}")
+            return False
 
-        twinks_list.append({'profile_url': profile_url, 'profile_id': profile_id, 'site_nickname': site_nickname})
-        cursor.execute('UPDATE users SET twinks = ? WHERE user_id = ?', (json.dumps(twinks_list, ensure_ascii=False), user_id))
         conn.commit()
         logger.info(f"Твин добавлен для пользователя {user_id}: {profile_url} (ник: {site_nickname})")
+        _notify_account_changed(user_id)
         return True
     except Exception as e:
         logger.error(f"Ошибка добавления твина: {e}")
         return False
     finally:
         conn.close()
-        # ✅ После добавления твина — синхронизируем настройки уведомлений
-        # (новый твин автоматически получит значение True)
-        try:
-            init_notification_settings_for_user(user_id)
-        except Exception as e:
-            logger.error(f"Ошибка инициализации уведомлений после добавления твина: {e}")
 
 
 def get_user_twinks(user_id: int) -> List[Dict]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
-        cursor.execute('SELECT twinks FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        if not result or not result[0]:
-            return []
-        return json.loads(result[0])
+        cursor.execute(
+            'SELECT profile_url, profile_id, nickname FROM accounts WHERE user_id = ? AND is_main = 0 ORDER BY id',
+            (user_id,)
+        )
+        return [
+            {'profile_url': profile_url, 'profile_id': profile_id, 'site_nickname': nickname}
+            for profile_url, profile_id, nickname in cursor.fetchall()
+        ]
     except Exception as e:
         logger.error(f"Ошибка получения твинов: {e}")
         return []
@@ -582,43 +763,18 @@ def get_user_twinks(user_id: int) -> List[Dict]:
 
 
 def remove_twink(user_id: int, profile_id: str) -> bool:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
-        cursor.execute('SELECT twinks FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        if not result or not result[0]:
-            conn.close()
+        # Настройка уведомлений твина удаляется вместе с ним
+        cursor.execute('DELETE FROM accounts WHERE user_id = ? AND profile_id = ? AND is_main = 0',
+                       (user_id, str(profile_id)))
+        if cursor.rowcount == 0:
             return False
 
-        twinks_list = json.loads(result[0])
-        new_twinks = [t for t in twinks_list if t.get('profile_id') != profile_id]
-
-        if len(new_twinks) == len(twinks_list):
-            conn.close()
-            return False
-
-        cursor.execute(
-            'UPDATE users SET twinks = ? WHERE user_id = ?',
-            (json.dumps(new_twinks, ensure_ascii=False) if new_twinks else None, user_id)
-        )
-
-        # ✅ Убираем ключ удалённого твина из настроек уведомлений
-        cursor.execute('SELECT notification_settings FROM users WHERE user_id = ?', (user_id,))
-        notif_result = cursor.fetchone()
-        if notif_result and notif_result[0]:
-            try:
-                notif_settings = json.loads(notif_result[0])
-                notif_settings.pop(str(profile_id), None)
-                cursor.execute(
-                    'UPDATE users SET notification_settings = ? WHERE user_id = ?',
-                    (json.dumps(notif_settings, ensure_ascii=False), user_id)
-                )
-            except Exception as e:
-                logger.error(f"Ошибка очистки настроек уведомлений при удалении твина: {e}")
-
         conn.commit()
         logger.info(f"Твин {profile_id} удален для пользователя {user_id}")
+        _notify_account_changed(user_id)
         return True
     except Exception as e:
         logger.error(f"Ошибка удаления твина: {e}")
@@ -628,14 +784,11 @@ def remove_twink(user_id: int, profile_id: str) -> bool:
 
 
 def get_twinks_count(user_id: int) -> int:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
-        cursor.execute('SELECT twinks FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        if not result or not result[0]:
-            return 0
-        return len(json.loads(result[0]))
+        cursor.execute('SELECT COUNT(*) FROM accounts WHERE user_id = ? AND is_main = 0', (user_id,))
+        return cursor.fetchone()[0]
     except Exception as e:
         logger.error(f"Ошибка подсчета твинов: {e}")
         return 0
@@ -647,13 +800,45 @@ def get_twinks_count(user_id: int) -> int:
 # УПРАВЛЕНИЕ ЦЕНАМИ КАРТ
 # ══════════════════════════════════════════════════════════════
 
+_CARD_PRICES_COLUMNS = '''(
+    card_id TEXT PRIMARY KEY,
+    card_url TEXT UNIQUE NOT NULL,
+    price REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+# Промежуточная таблица массовой загрузки цен (replace_card_prices)
+_CARD_PRICES_STAGING = 'card_prices_staging'
+
+# Подписчики на изменение цен (индекс цен в памяти)
+_prices_listeners: List[Callable[[Optional[Dict[str, float]]], None]] = []
+
+
+def add_prices_listener(callback: Callable[[Optional[Dict[str, float]]], None]):
+    """
+    Регистрирует callback(changed), вызываемый после изменения цен на карты:
+    changed — {card_id: цена} для точечных изменений, None — цены заменены целиком
+    """
+    if callback not in _prices_listeners:
+        _prices_listeners.append(callback)
+
+
+def _notify_prices_changed(changed: Optional[Dict[str, float]] = None):
+    for callback in _prices_listeners:
+        try:
+            callback(changed)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика изменения цен: {e}")
+
+
 def clear_all_card_prices():
     """Удаляет все цены на карты из БД"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM card_prices')
     conn.commit()
     conn.close()
+    _notify_prices_changed()
     logger.info("Все цены на карты удалены из БД")
 
 
@@ -678,7 +863,7 @@ def save_card_price(card_url: str, price: float) -> bool:
     
     card_id = match.group(1)
     
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     
     try:
@@ -687,6 +872,7 @@ def save_card_price(card_url: str, price: float) -> bool:
             VALUES (?, ?, ?, CURRENT_TIMESTAMP)
         ''', (card_id, card_url, price))
         conn.commit()
+        _notify_prices_changed({card_id: float(price)})
         logger.info(f"Цена на карту {card_id} сохранена: {price}")
         return True
     except Exception as e:
@@ -696,6 +882,42 @@ def save_card_price(card_url: str, price: float) -> bool:
         conn.close()
 
 
+def replace_card_prices(prices: Iterable[Tuple[str, str, float]]) -> int:
+    """
+    Заменяет все цены на карты новым набором [(card_id, card_url, price)].
+
+    Строки загружаются в промежуточную таблицу одним executemany, затем она
+    переименовывается в card_prices — всё в одной транзакции. Читатели до
+    commit видят старые цены; при ошибке старые цены остаются нетронутыми.
+
+    Returns:
+        int: количество цен после замены (повторы card_id — последняя цена)
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'DROP TABLE IF EXISTS {_CARD_PRICES_STAGING}')
+        cursor.execute(f'CREATE TABLE {_CARD_PRICES_STAGING} {_CARD_PRICES_COLUMNS}')
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {_CARD_PRICES_STAGING} (card_id, card_url, price) VALUES (?, ?, ?)',
+            prices
+        )
+        cursor.execute(f'SELECT COUNT(*) FROM {_CARD_PRICES_STAGING}')
+        count = cursor.fetchone()[0]
+        cursor.execute('DROP TABLE card_prices')
+        cursor.execute(f'ALTER TABLE {_CARD_PRICES_STAGING} RENAME TO card_prices')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    _notify_prices_changed()
+    logger.info(f"Цены на карты заменены: {count} цен")
+    return count
+
+
 def get_card_price(card_id: str) -> Optional[float]:
     """
     Получает цену карты по ID
@@ -706,7 +928,7 @@ def get_card_price(card_id: str) -> Optional[float]:
     Returns:
         float: Цена карты или None если не найдена
     """
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT price FROM card_prices WHERE card_id = ?', (card_id,))
     result = cursor.fetchone()
@@ -721,7 +943,7 @@ def get_all_card_prices() -> List[Tuple[str, str, float, str]]:
     Returns:
         List[Tuple]: [(card_id, card_url, price, updated_at), ...]
     """
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT card_id, card_url, price, updated_at FROM card_prices ORDER BY updated_at DESC')
     result = cursor.fetchall()
@@ -729,9 +951,19 @@ def get_all_card_prices() -> List[Tuple[str, str, float, str]]:
     return result
 
 
+def get_card_price_pairs() -> List[Tuple[str, float]]:
+    """Все цены [(card_id, price)] — для индекса цен в памяти"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT card_id, price FROM card_prices')
+    result = cursor.fetchall()
+    conn.close()
+    return result
+
+
 def get_card_prices_count() -> int:
     """Возвращает количество цен в БД"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM card_prices')
     result = cursor.fetchone()[0]
@@ -744,13 +976,13 @@ def get_card_prices_count() -> int:
 # ══════════════════════════════════════════════════════════════
 
 def save_club_card(card_data: dict):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         INSERT OR REPLACE INTO club_cards
         (card_id, card_name, card_rank, card_image_url, card_progress, daily_donated,
-         wants_count, owners_count, club_owners)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+         wants_count, owners_count, club_owners, counts_updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         card_data.get('card_id'),
         card_data.get('card_name'),
@@ -761,6 +993,7 @@ def save_club_card(card_data: dict):
         card_data.get('wants_count', 0),
         card_data.get('owners_count', 0),
         json.dumps(card_data.get('club_owners', []), ensure_ascii=False),
+        card_data.get('counts_updated_at'),
     ))
     conn.commit()
     conn.close()
@@ -768,7 +1001,7 @@ def save_club_card(card_data: dict):
 
 
 def is_club_card_saved(card_id: str) -> bool:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT card_id FROM club_cards WHERE card_id = ?', (card_id,))
     result = cursor.fetchone()
@@ -777,11 +1010,11 @@ def is_club_card_saved(card_id: str) -> bool:
 
 
 def get_club_card(card_id: str) -> Optional[dict]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT card_id, card_name, card_rank, card_image_url, card_progress, daily_donated,
-               wants_count, owners_count, club_owners, discovered_at
+               wants_count, owners_count, club_owners, discovered_at, counts_updated_at
         FROM club_cards WHERE card_id = ?
     ''', (card_id,))
     row = cursor.fetchone()
@@ -793,16 +1026,16 @@ def get_club_card(card_id: str) -> Optional[dict]:
         'card_image_url': row[3], 'card_progress': row[4], 'daily_donated': row[5],
         'wants_count': row[6], 'owners_count': row[7],
         'club_owners': json.loads(row[8]) if row[8] else [],
-        'discovered_at': row[9],
+        'discovered_at': row[9], 'counts_updated_at': row[10],
     }
 
 
 def get_all_club_cards() -> List[dict]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT card_id, card_name, card_rank, card_image_url, card_progress, daily_donated,
-               wants_count, owners_count, club_owners, discovered_at
+               wants_count, owners_count, club_owners, discovered_at, counts_updated_at
         FROM club_cards ORDER BY discovered_at DESC
     ''')
     rows = cursor.fetchall()
@@ -813,19 +1046,173 @@ def get_all_club_cards() -> List[dict]:
             'card_image_url': r[3], 'card_progress': r[4], 'daily_donated': r[5],
             'wants_count': r[6], 'owners_count': r[7],
             'club_owners': json.loads(r[8]) if r[8] else [],
-            'discovered_at': r[9],
+            'discovered_at': r[9], 'counts_updated_at': r[10],
         }
         for r in rows
     ]
 
 
+def get_club_card_discovery_times(limit: int = 1000) -> List[str]:
+    """Время появления последних карт (UTC, 'YYYY-MM-DD HH:MM:SS'), новые первыми"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT discovered_at FROM club_cards
+        WHERE discovered_at IS NOT NULL
+        ORDER BY discovered_at DESC LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+# Карты без распознанного ранга: добавлены до появления шаблонов
+# или не прошли порог MSE
+_UNRANKED_CLUB_CARDS = "(card_rank IS NULL OR card_rank = '?') AND card_image_url IS NOT NULL"
+
+
+def count_unranked_club_cards() -> int:
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT COUNT(*) FROM club_cards WHERE {_UNRANKED_CLUB_CARDS}')
+    result = cursor.fetchone()[0]
+    conn.close()
+    return result
+
+
+def get_unranked_club_cards(after_id: int = 0, limit: int = 100) -> List[Tuple[int, str, str]]:
+    """
+    Страница карт без ранга: [(id, card_id, card_image_url)] с id > after_id.
+    Постраничный обход по id не держит соединение открытым между страницами.
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, card_id, card_image_url FROM club_cards
+        WHERE id > ? AND {_UNRANKED_CLUB_CARDS}
+        ORDER BY id LIMIT ?
+    ''', (after_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def update_club_card_ranks(ranks: List[Tuple[str, str]]) -> int:
+    """Записывает ранги [(card_id, rank)] одной транзакцией"""
+    if not ranks:
+        return 0
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.executemany(
+        'UPDATE club_cards SET card_rank = ? WHERE card_id = ?',
+        [(rank, card_id) for card_id, rank in ranks]
+    )
+    updated = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return updated
+
+
+def get_card_file_id(card_id: str) -> Optional[str]:
+    """Telegram file_id картинки карты или None"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT file_id FROM card_file_ids WHERE card_id = ?', (card_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result[0] if result else None
+
+
+def save_card_file_id(card_id: str, file_id: str):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT OR REPLACE INTO card_file_ids (card_id, file_id) VALUES (?, ?)',
+        (card_id, file_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+def delete_card_file_id(card_id: str):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM card_file_ids WHERE card_id = ?', (card_id,))
+    conn.commit()
+    conn.close()
+
+# ══════════════════════════════════════════════════════════════
+# КЕШ РАСПОЗНАВАНИЯ РАНГОВ
+# ══════════════════════════════════════════════════════════════
+
+def get_rank_cache_entry(cache_key: str, templates_sig: str) -> Optional[Tuple[str, float, int, Optional[float]]]:
+    """(ранг, MSE, вариант, отрыв) для ключа, если он получен с текущими шаблонами"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT rank, mse, variant, margin FROM rank_cache WHERE cache_key = ? AND templates_sig = ?',
+        (cache_key, templates_sig)
+    )
+    result = cursor.fetchone()
+    conn.close()
+    return result
+
+
+def save_rank_cache_entries(entries: List[Tuple[str, str, float, int, Optional[float]]],
+                            templates_sig: str, created_at: float):
+    """Сохраняет [(ключ, ранг, MSE, вариант, отрыв)] одной транзакцией"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT OR REPLACE INTO rank_cache (cache_key, rank, mse, variant, margin, templates_sig, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(*entry, templates_sig, created_at) for entry in entries])
+    conn.commit()
+    conn.close()
+
+
+def purge_rank_cache(templates_sig: str) -> int:
+    """Удаляет результаты, полученные с другим набором шаблонов"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM rank_cache WHERE templates_sig != ?', (templates_sig,))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+# ══════════════════════════════════════════════════════════════
+# КЕШ НИКОВ С САЙТА
+# ══════════════════════════════════════════════════════════════
+
+def get_cached_site_nickname(profile_id: str) -> Optional[Tuple[str, float]]:
+    """Возвращает (ник, время загрузки в unix-секундах) или None"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT nickname, fetched_at FROM site_nicknames WHERE profile_id = ?', (str(profile_id),))
+    result = cursor.fetchone()
+    conn.close()
+    return (result[0], result[1]) if result else None
+
+
+def save_cached_site_nickname(profile_id: str, nickname: str, fetched_at: float):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT OR REPLACE INTO site_nicknames (profile_id, nickname, fetched_at) VALUES (?, ?, ?)',
+        (str(profile_id), nickname, fetched_at)
+    )
+    conn.commit()
+    conn.close()
+
+
 # ══════════════════════════════════════════════════════════════
 # ЛОГИ ДЕЙСТВИЙ ОПЕРАТОРА
 # ══════════════════════════════════════════════════════════════
 
 def log_operator_action(operator_id: int, action_type: str, target_user_id: int = None,
                         target_username: str = None, target_first_name: str = None, details: str = None):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO operator_logs (operator_id, action_type, target_user_id, target_username, target_first_name, details)
@@ -837,7 +1224,7 @@ def log_operator_action(operator_id: int, action_type: str, target_user_id: int
 
 
 def get_operator_logs(operator_id: int = None, action_type: str = None, limit: int = 100, offset: int = 0) -> List[Tuple]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     query = 'SELECT * FROM operator_logs WHERE 1=1'
     params = []
@@ -856,7 +1243,7 @@ def get_operator_logs(operator_id: int = None, action_type: str = None, limit: i
 
 
 def get_operator_stats(operator_id: int) -> dict:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM operator_logs WHERE operator_id = ?', (operator_id,))
     total_actions = cursor.fetchone()[0]
@@ -877,7 +1264,7 @@ def get_operator_stats(operator_id: int) -> dict:
 # ══════════════════════════════════════════════════════════════
 
 def save_dialog_message(dialog_id: str, sender_id: int, sender_type: str, message_text: str):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('INSERT INTO dialog_messages (dialog_id, sender_id, sender_type, message_text) VALUES (?, ?, ?, ?)', (dialog_id, sender_id, sender_type, message_text))
     conn.commit()
@@ -885,7 +1272,7 @@ def save_dialog_message(dialog_id: str, sender_id: int, sender_type: str, messag
 
 
 def get_dialog_messages(dialog_id: str, limit: int = 100) -> List[Tuple]:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM dialog_messages WHERE dialog_id = ? ORDER BY created_at ASC LIMIT ?', (dialog_id, limit))
     result = cursor.fetchall()
@@ -894,7 +1281,7 @@ def get_dialog_messages(dialog_id: str, limit: int = 100) -> List[Tuple]:
 
 
 def get_dialog_stats(dialog_id: str) -> dict:
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM dialog_messages WHERE dialog_id = ?', (dialog_id,))
     total_messages = cursor.fetchone()[0]
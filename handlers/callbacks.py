@@ -11,14 +11,7 @@ from telegram.constants import ParseMode
 from telegram.error import BadRequest, TimedOut, NetworkError
 from config.settings import ADMIN_CHAT_ID, WELCOME_TEXT
 from handlers.wishlist import handle_my_wishlist_in_obshaga, handle_obshaga_wishlist_with_me
-from database.db import (
-    add_to_blacklist, remove_from_blacklist, get_blacklist,
-    is_user_linked, get_user_profile_url, log_operator_action,
-    get_twinks_count, remove_twink,
-    is_staff, is_admin,
-    toggle_notification, get_notification_settings,
-    get_user_twinks 
-)
+from database import async_db as adb
 from keyboards.inline import (
     get_main_menu_keyboard, get_back_button,
     get_user_action_keyboard, get_blacklist_user_keyboard,
@@ -92,7 +85,7 @@ async def _finish_account_linking(query, context, user, user_id: int, twinks_cou
     context.user_data['twink_source'] = None
     context.user_data['twinks_added_this_session'] = 0
 
-    is_operator = is_staff(user_id)
+    is_operator = await adb.is_staff(user_id)
     main_profile_url = context.user_data.get('main_profile_url', 'не указан')
     twinks_info = f"\n💎 Привязано твинов: {twinks_count}" if twinks_count > 0 else ""
 
@@ -153,7 +146,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data.startswith('toggle_notif_'):
         profile_key = data[len('toggle_notif_'):]
-        new_value = toggle_notification(user_id, profile_key)
+        new_value = await adb.toggle_notification(user_id, profile_key)
 
         status_word = "включены ✅" if new_value else "выключены 🔕"
         await query.answer(f"Уведомления {status_word}", show_alert=False)
@@ -161,8 +154,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Обновляем текст и клавиатуру на месте
         await safe_edit_message(
             query,
-            notifications_text(user_id),
-            reply_markup=get_notifications_keyboard(user_id),
+            await notifications_text(user_id),
+            reply_markup=await get_notifications_keyboard(user_id),
             parse_mode=ParseMode.HTML
         )
         return
@@ -189,16 +182,16 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data.startswith('delete_twink_'):
         profile_id = data.replace('delete_twink_', '')
-        success = remove_twink(user_id, profile_id)
+        success = await adb.remove_twink(user_id, profile_id)
         if success:
             await query.answer("✅ Твин удалён", show_alert=False)
-            twinks = get_user_twinks(user_id)
+            twinks = await adb.get_user_twinks(user_id)
             if not twinks:
                 text_msg = "💎 <b>Дополнительные аккаунты (твины)</b>\n\nУ вас больше нет привязанных твинов.\n\nХотите добавить твин?"
             else:
                 twinks_list = "\n".join(f"{i+1}. {t.get('site_nickname','Без ника')} - {t.get('profile_url')}" for i, t in enumerate(twinks))
                 text_msg = f"💎 <b>Ваши твины ({len(twinks)})</b>\n\n{twinks_list}\n\nВы можете добавить новый или удалить существующий."
-            await safe_edit_message(query, text_msg, reply_markup=get_twink_manage_keyboard(user_id),
+            await safe_edit_message(query, text_msg, reply_markup=await get_twink_manage_keyboard(user_id),
                                     parse_mode=ParseMode.HTML, link_preview_options=LinkPreviewOptions(is_disabled=True))
         else:
             await query.answer("❌ Ошибка удаления", show_alert=True)
@@ -226,26 +219,24 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         added_count = context.user_data.get('twinks_added_this_session', 0)
 
         if source == 'linking':
-            twinks = get_user_twinks(user_id)
-            twinks_count = len(twinks) if twinks else 0
+            twinks_count = await adb.get_twinks_count(user_id)
             await _finish_account_linking(query, context, user, user_id, twinks_count)
         else:
             context.user_data['twink_source'] = None
             context.user_data['twinks_added_this_session'] = 0
-            twinks = get_user_twinks(user_id)
+            twinks = await adb.get_user_twinks(user_id)
             if not twinks:
                 text_msg = "💎 <b>Дополнительные аккаунты (твины)</b>\n\nУ вас пока нет привязанных твинов.\n\nХотите добавить твин?"
             else:
                 twinks_list = "\n".join(f"{i+1}. {t.get('site_nickname','Без ника')} - {t.get('profile_url')}" for i, t in enumerate(twinks))
                 text_msg = f"💎 <b>Ваши твины ({len(twinks)})</b>\n\n{twinks_list}\n\nВы можете добавить новый или удалить существующий."
-            await safe_edit_message(query, text_msg, reply_markup=get_twink_manage_keyboard(user_id),
+            await safe_edit_message(query, text_msg, reply_markup=await get_twink_manage_keyboard(user_id),
                                     parse_mode=ParseMode.HTML, link_preview_options=LinkPreviewOptions(is_disabled=True))
         logger.info(f"Пользователь {user_id} отменил добавление твина (источник: {source}, добавлено: {added_count})")
         return
 
     if data == 'twink_no':
-        twinks = get_user_twinks(user_id)
-        twinks_count = len(twinks) if twinks else 0
+        twinks_count = await adb.get_twinks_count(user_id)
         await _finish_account_linking(query, context, user, user_id, twinks_count)
         return
 
@@ -255,13 +246,12 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         added_count = context.user_data.get('twinks_added_this_session', 0)
 
         if source == 'linking':
-            twinks = get_user_twinks(user_id)
-            twinks_count = len(twinks) if twinks else 0
+            twinks_count = await adb.get_twinks_count(user_id)
             await _finish_account_linking(query, context, user, user_id, twinks_count)
         else:
             context.user_data['twink_source'] = None
             context.user_data['twinks_added_this_session'] = 0
-            twinks = get_user_twinks(user_id)
+            twinks = await adb.get_user_twinks(user_id)
             if added_count == 0:
                 if not twinks:
                     text_msg = "💎 <b>Дополнительные аккаунты (твины)</b>\n\nВы не добавили ни одного твина.\n\nХотите попробовать ещё раз?"
@@ -271,7 +261,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 twinks_list = "\n".join(f"{i+1}. {t.get('site_nickname','Без ника')} - {t.get('profile_url')}" for i, t in enumerate(twinks))
                 text_msg = f"✅ <b>Твины успешно добавлены!</b>\n\n💎 <b>Ваши твины ({len(twinks)})</b>\n\n{twinks_list}\n\nУправляйте твинами через кнопки ниже."
-            await safe_edit_message(query, text_msg, reply_markup=get_twink_manage_keyboard(user_id),
+            await safe_edit_message(query, text_msg, reply_markup=await get_twink_manage_keyboard(user_id),
                                     parse_mode=ParseMode.HTML, link_preview_options=LinkPreviewOptions(is_disabled=True))
         return
 
@@ -284,8 +274,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['blocking_user_id'] = None
         context.user_data['twink_source'] = None
         context.user_data['twinks_added_this_session'] = 0
-        linked = is_user_linked(user_id)
-        is_operator = is_staff(user_id)
+        linked = await adb.is_user_linked(user_id)
+        is_operator = await adb.is_staff(user_id)
         if linked:
             try:
                 await query.message.delete()
@@ -321,7 +311,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ПРОФИЛЬ / ХОТЕЛКИ / …
     # ══════════════════════════════════════════
     if data == 'profile':
-        profile_url = get_user_profile_url(user_id)
+        profile_url = await adb.get_user_profile_url(user_id)
         await safe_edit_message(
             query,
             f"👤 <b>Ваш профиль</b>\n\nИмя: {user.first_name}\n"
@@ -335,8 +325,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == 'notifications':
         await safe_edit_message(
             query,
-            notifications_text(user_id),
-            reply_markup=get_notifications_keyboard(user_id),
+            await notifications_text(user_id),
+            reply_markup=await get_notifications_keyboard(user_id),
             parse_mode=ParseMode.HTML
         )
         return
@@ -355,17 +345,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if data == 'wishlist_mine_in_obshaga':
         # Мои хотелки у общага
-        from database.db import get_user_profile_url, get_twinks_count
         from keyboards.inline import get_account_selection_keyboard
         
-        profile_url = get_user_profile_url(user_id)
+        profile_url = await adb.get_user_profile_url(user_id)
         if not profile_url:
             await query.answer("❌ Сначала привяжите аккаунт", show_alert=True)
             return
         
         # Проверяем наличие твинов
-        twinks = get_user_twinks(user_id)
-        twinks_count = len(twinks) if twinks else 0
+        twinks_count = await adb.get_twinks_count(user_id)
         
         if twinks_count > 0:
             # Есть твины - предлагаем выбрать аккаунт
@@ -373,7 +361,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 query,
                 "💎 <b>Выберите аккаунт</b>\n\n"
                 "Для какого аккаунта искать хотелки в общаге?",
-                reply_markup=get_account_selection_keyboard(user_id, 'mine_in_obshaga'),
+                reply_markup=await get_account_selection_keyboard(user_id, 'mine_in_obshaga'),
                 parse_mode=ParseMode.HTML
             )
         else:
@@ -389,17 +377,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if data == 'wishlist_obshaga_with_me':
         # Хотелки общага у меня
-        from database.db import get_user_profile_url, get_twinks_count
         from keyboards.inline import get_account_selection_keyboard
         
-        profile_url = get_user_profile_url(user_id)
+        profile_url = await adb.get_user_profile_url(user_id)
         if not profile_url:
             await query.answer("❌ Сначала привяжите аккаунт", show_alert=True)
             return
         
         # Проверяем наличие твинов
-        twinks = get_user_twinks(user_id)
-        twinks_count = len(twinks) if twinks else 0
+        twinks_count = await adb.get_twinks_count(user_id)
         
         if twinks_count > 0:
             # Есть твины - предлагаем выбрать аккаунт
@@ -407,7 +393,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 query,
                 "💎 <b>Выберите аккаунт</b>\n\n"
                 "Для какого аккаунта проверять хотелки общага?",
-                reply_markup=get_account_selection_keyboard(user_id, 'obshaga_with_me'),
+                reply_markup=await get_account_selection_keyboard(user_id, 'obshaga_with_me'),
                 parse_mode=ParseMode.HTML
             )
         else:
@@ -428,8 +414,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         if parts[2] == 'main':
             # Основной аккаунт
-            from database.db import get_user_profile_url
-            profile_url = get_user_profile_url(user_id)
+            profile_url = await adb.get_user_profile_url(user_id)
             import re
             match = re.search(r'/users/(\d+)', profile_url)
             if match:
@@ -610,10 +595,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ══════════════════════════════════════════
 
     if data == 'view_blacklist':
-        if not is_staff(user_id):
+        if not await adb.is_staff(user_id):
             await query.answer("❌ Недостаточно прав", show_alert=True)
             return
-        blacklist = get_blacklist()
+        blacklist = await adb.get_blacklist()
         if not blacklist:
             await safe_edit_message(query, "📋 <b>Черный список</b>\n\nЧерный список пуст.", reply_markup=get_back_button(), parse_mode=ParseMode.HTML)
             return
@@ -628,7 +613,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data.startswith('reply_'):
-        if not is_staff(user_id):
+        if not await adb.is_staff(user_id):
             await query.answer("❌ Недостаточно прав", show_alert=True)
             return
         reply_user_id = int(data.split('_')[1])
@@ -638,7 +623,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_name = user_info.first_name or user_info.username or f"User {reply_user_id}"
         except Exception:
             user_name = f"User {reply_user_id}"
-        log_operator_action(user_id, 'dialog_start', target_user_id=reply_user_id, target_first_name=user_name)
+        await adb.log_operator_action(user_id, 'dialog_start', target_user_id=reply_user_id, target_first_name=user_name)
         dm.start_dialog(user_id, reply_user_id, user_name)
         try:
             await query.message.reply_text(
@@ -653,7 +638,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data.startswith('block_'):
-        if not is_staff(user_id):
+        if not await adb.is_staff(user_id):
             await query.answer("❌ Недостаточно прав", show_alert=True)
             return
         blocked_uid = int(data.split('_')[1])
@@ -671,16 +656,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data.startswith('unblock_'):
-        if not is_staff(user_id):
+        if not await adb.is_staff(user_id):
             await query.answer("❌ Недостаточно прав", show_alert=True)
             return
         unblocked_uid = int(data.split('_')[1])
-        from database.db import get_user_info
-        user_info = get_user_info(unblocked_uid)
-        remove_from_blacklist(unblocked_uid)
-        log_operator_action(user_id, 'user_unblocked', target_user_id=unblocked_uid,
-                            target_username=user_info[1] if user_info else None,
-                            target_first_name=user_info[2] if user_info else None)
+        user_info = await adb.get_user_info(unblocked_uid)
+        await adb.remove_from_blacklist(unblocked_uid)
+        await adb.log_operator_action(user_id, 'user_unblocked', target_user_id=unblocked_uid,
+                                      target_username=user_info[1] if user_info else None,
+                                      target_first_name=user_info[2] if user_info else None)
         try:
             await query.answer("✅ Пользователь разблокирован", show_alert=True)
         except Exception:
@@ -689,15 +673,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data.startswith('switch_dialog_'):
-        if not is_staff(user_id):
+        if not await adb.is_staff(user_id):
             await query.answer("❌ Недостаточно прав", show_alert=True)
             return
         dialog_id = data.replace('switch_dialog_', '')
         dm = DialogManager(context.bot_data)
         if dm.switch_dialog(user_id, dialog_id):
             dialog_info = dm.get_dialog_info(dialog_id)
-            log_operator_action(user_id, 'dialog_switch', target_user_id=dialog_info['user_id'],
-                                target_first_name=dialog_info['user_name'], details=f"dialog_id: {dialog_id}")
+            await adb.log_operator_action(user_id, 'dialog_switch', target_user_id=dialog_info['user_id'],
+                                          target_first_name=dialog_info['user_name'], details=f"dialog_id: {dialog_id}")
             await query.answer(f"✅ Переключено на {dialog_info['user_name']}", show_alert=False)
             await query.message.edit_text(
                 f"✅ <b>Активный диалог изменён</b>\n\nТеперь вы в диалоге с {dialog_info['user_name']}\n\n/dialogs — все диалоги",
@@ -707,14 +691,14 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data == 'end_all_dialogs':
-        if not is_staff(user_id):
+        if not await adb.is_staff(user_id):
             await query.answer("❌ Недостаточно прав", show_alert=True)
             return
         dm = DialogManager(context.bot_data)
         dialogs = dm.get_all_operator_dialogs(user_id)
         user_ids = [info['user_id'] for _, info in dialogs]
         count = dm.end_all_operator_dialogs(user_id)
-        log_operator_action(user_id, 'dialog_end', details=f"Завершено диалогов: {count}")
+        await adb.log_operator_action(user_id, 'dialog_end', details=f"Завершено диалогов: {count}")
         await query.answer(f"✅ Завершено диалогов: {count}", show_alert=True)
         await query.message.edit_text(f"✅ <b>Завершено диалогов: {count}</b>\n\nВсе активные диалоги закрыты.", parse_mode=ParseMode.HTML)
         for other_user_id in user_ids:
@@ -2,17 +2,18 @@
 Обработчики для функционала цен на карты
 ✅ ИСПРАВЛЕНО: Валидация URL теперь принимает двойные слеши
 """
+import asyncio
 import logging
 import re
+import time
 import openpyxl
 from io import BytesIO
+from typing import List, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
-from database.db import (
-    clear_all_card_prices, save_card_price, get_card_price,
-    get_card_prices_count, is_staff, log_operator_action
-)
+from database import async_db as adb
+from utils.price_index import get_price_index
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,9 @@ logger = logging.getLogger(__name__)
 CARD_EVALUATION_CHAT_ID = -1002234810541  # https://t.me/c/2234810541/423804
 CARD_EVALUATION_THREAD_ID = 423804
 
+# Сколько ошибок в файле цен собирать, прежде чем прекратить разбор
+MAX_PRICE_FILE_ERRORS = 5000
+
 
 def validate_card_url(url: str) -> str:
     """
@@ -89,8 +93,8 @@ async def handle_card_url_message(update: Update, context: ContextTypes.DEFAULT_
         )
         return
     
-    # Проверяем наличие цены в БД
-    price = get_card_price(card_id)
+    # Проверяем наличие цены (индекс цен в памяти)
+    price = get_price_index().get_card_price(card_id)
     
     if price is not None:
         # Цена найдена
@@ -219,7 +223,7 @@ async def handle_upload_prices(update: Update, context: ContextTypes.DEFAULT_TYP
     """
     user_id = update.effective_user.id
     
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         await update.callback_query.answer("❌ Недостаточно прав", show_alert=True)
         return
     
@@ -259,17 +263,74 @@ async def handle_cancel_upload_prices(update: Update, context: ContextTypes.DEFA
     )
 
 
+def _parse_prices_sheet(file_bytes: bytes) -> Tuple[List[Tuple[str, str, float]], List[str], int]:
+    """
+    Разбирает Excel файл с ценами.
+
+    ✅ ИСПРАВЛЕНО: Автоматически убирает двойные слеши из URL
+
+    Returns:
+        (цены [(card_id, card_url, price)], примеры ошибок, число ошибок)
+    """
+    workbook = openpyxl.load_workbook(BytesIO(file_bytes), read_only=True)
+    sheet = workbook.active
+
+    prices = []
+    error_count = 0
+    errors = []
+
+    for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+        if not row or len(row) < 2:
+            continue
+
+        card_url = str(row[0]).strip() if row[0] else ""
+        price_str = str(row[1]).strip() if row[1] else ""
+
+        if not card_url or not price_str:
+            continue
+
+        # ✅ ИСПРАВЛЕНИЕ: Убираем двойные слеши из URL
+        card_url = re.sub(r'(?<!:)//+', '/', card_url)
+
+        # Валидация URL (уже очищенного)
+        card_id = validate_card_url(card_url)
+        if not card_id:
+            error_count += 1
+            errors.append(f"Строка {row_idx}: неверный URL '{card_url[:50]}'")
+            if len(errors) >= MAX_PRICE_FILE_ERRORS:
+                break
+            continue
+
+        # Валидация цены
+        try:
+            # Убираем запятые из чисел (если есть)
+            price = float(price_str.replace(',', ''))
+        except ValueError:
+            error_count += 1
+            errors.append(f"Строка {row_idx}: неверная цена '{price_str}'")
+            if len(errors) >= MAX_PRICE_FILE_ERRORS:
+                break
+            continue
+
+        prices.append((card_id, card_url, price))
+
+    workbook.close()
+    return prices, errors, error_count
+
+
 async def handle_prices_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обработчик загрузки Excel файла с ценами
-    
-    ✅ ИСПРАВЛЕНО: Автоматически убирает двойные слеши из URL
-    
+
+    Файл разбирается в отдельном потоке, затем цены заменяются целиком
+    одной транзакцией (replace_card_prices): пока идёт загрузка, в БД
+    старые цены, а при ошибке они остаются нетронутыми.
+
     Вызывается когда user_state == 'uploading_prices'
     """
     user_id = update.effective_user.id
     
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     document = update.message.document
@@ -296,58 +357,23 @@ async def handle_prices_file(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         await loading_msg.edit_text("📊 Обработка данных...")
         
-        # Открываем Excel
-        workbook = openpyxl.load_workbook(BytesIO(file_bytes))
-        sheet = workbook.active
+        started = time.perf_counter()
+        prices, errors, error_count = await asyncio.to_thread(_parse_prices_sheet, bytes(file_bytes))
+        parsed = time.perf_counter()
         
-        # Удаляем все старые цены
-        clear_all_card_prices()
+        if not prices:
+            context.user_data['state'] = None
+            report = "❌ <b>В файле нет корректных цен</b>\n\nСтарые цены сохранены."
+            if errors:
+                report += "\n\n<b>Примеры ошибок:</b>\n<code>" + "\n".join(errors[:5]) + "</code>"
+            await loading_msg.edit_text(report, parse_mode=ParseMode.HTML)
+            return
         
-        # Обрабатываем строки
-        added_count = 0
-        error_count = 0
-        errors = []
-        
-        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-            if not row or len(row) < 2:
-                continue
-            
-            card_url = str(row[0]).strip() if row[0] else ""
-            price_str = str(row[1]).strip() if row[1] else ""
-            
-            if not card_url or not price_str:
-                continue
-            
-            # ✅ ИСПРАВЛЕНИЕ: Убираем двойные слеши из URL
-            card_url = re.sub(r'(?<!:)//+', '/', card_url)
-            
-            # Валидация URL (уже очищенного)
-            if not validate_card_url(card_url):
-                error_count += 1
-                errors.append(f"Строка {row_idx}: неверный URL '{card_url[:50]}'")
-                if len(errors) >= 5000:
-                    break
-                continue
-            
-            # Валидация цены
-            try:
-                # Убираем запятые из чисел (если есть)
-                price = float(price_str.replace(',', ''))
-            except ValueError:
-                error_count += 1
-                errors.append(f"Строка {row_idx}: неверная цена '{price_str}'")
-                if len(errors) >= 5000:
-                    break
-                continue
-            
-            # Сохраняем
-            if save_card_price(card_url, price):
-                added_count += 1
-            else:
-                error_count += 1
-                errors.append(f"Строка {row_idx}: ошибка сохранения")
-                if len(errors) >= 5000:
-                    break
+        # Заменяем все цены одной транзакцией
+        total_count = await adb.replace_card_prices(prices)
+        finished = time.perf_counter()
+        added_count = len(prices)
+        rate = added_count / (finished - started) if finished > started else 0.0
         
         # Очищаем состояние
         context.user_data['state'] = None
@@ -368,23 +394,29 @@ async def handle_prices_file(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 if len(errors) > 5:
                     report += f"\n\n<i>... и ещё {len(errors) - 5} ошибок</i>"
         
-        report += f"\n\n💾 Всего цен в БД: <b>{get_card_prices_count()}</b>"
+        report += (
+            f"\n\n💾 Всего цен в БД: <b>{total_count}</b>"
+            f"\n⏱️ {finished - started:.2f} с (разбор {parsed - started:.2f} с), {rate:.0f} строк/с"
+        )
         
         await loading_msg.edit_text(report, parse_mode=ParseMode.HTML)
         
         # Логируем действие
-        log_operator_action(
+        await adb.log_operator_action(
             user_id,
             'prices_uploaded',
             details=f"Добавлено: {added_count}, Ошибок: {error_count}"
         )
         
-        logger.info(f"Оператор {user_id} загрузил цены: {added_count} успешно, {error_count} ошибок")
+        logger.info(
+            f"Оператор {user_id} загрузил цены: {added_count} успешно, {error_count} ошибок, "
+            f"{finished - started:.2f} с ({rate:.0f} строк/с)"
+        )
         
     except Exception as e:
         logger.error(f"Ошибка обработки файла с ценами: {e}", exc_info=True)
         await update.message.reply_text(
-            f"❌ Ошибка обработки файла:\n\n<code>{str(e)}</code>",
+            f"❌ Ошибка обработки файла:\n\n<code>{str(e)}</code>\n\nСтарые цены сохранены.",
             parse_mode=ParseMode.HTML
         )
-        context.user_data['state'] = None
\ No newline at end of file
+        context.user_data['state'] = None
@@ -3,20 +3,16 @@
 ✅ ИСПРАВЛЕНО: Правильная проверка ролей (оператор vs администратор)
 """
 import logging
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from config.settings import WELCOME_TEXT, ADMIN_CHAT_ID
-from database.db import (
-    is_blacklisted, is_user_linked, save_user, get_blacklist, 
-    remove_from_blacklist, log_operator_action, get_operator_logs,
-    get_operator_stats, get_dialog_messages, get_dialog_stats,
-    # ✅ ИСПРАВЛЕНИЕ: Используем правильные функции проверки ролей
-    is_staff, is_admin
-)
+from database import async_db as adb
 from keyboards.inline import get_main_menu_keyboard, get_reply_keyboard_for_linked_user
 from utils.dialog_manager import DialogManager
 from utils.helpers import get_user_link
+from utils.rank_backfill import backfill_ranks, BackfillStats
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +26,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
     # Проверка чёрного списка
-    if is_blacklisted(user.id):
+    if await adb.is_blacklisted(user.id):
         await update.message.reply_text(
             "❌ Вы заблокированы и не можете использовать этого бота.\n"
             "Если вы считаете это ошибкой, обратитесь к администратору."
@@ -39,11 +35,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Сохраняем базовую информацию о пользователе
-    save_user(user.id, user.username, user.first_name, user.last_name)
+    await adb.save_user(user.id, user.username, user.first_name, user.last_name)
 
-    linked = is_user_linked(user.id)
+    linked = await adb.is_user_linked(user.id)
     # ✅ ИСПРАВЛЕНИЕ: Используем is_staff() вместо is_operator()
-    is_operator = is_staff(user.id)
+    is_operator = await adb.is_staff(user.id)
 
     if linked:
         # Привязанный пользователь — показываем клавиатуру (с учетом роли персонала)
@@ -80,13 +76,13 @@ async def blacklist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     # ✅ Логируем действие
-    log_operator_action(user_id, 'blacklist_view')
+    await adb.log_operator_action(user_id, 'blacklist_view')
     
-    blacklist = get_blacklist()
+    blacklist = await adb.get_blacklist()
     
     if not blacklist:
         await update.message.reply_text(
@@ -142,7 +138,7 @@ async def unblock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     # Извлекаем ID пользователя из команды
@@ -178,7 +174,7 @@ async def unblock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Проверяем, заблокирован ли пользователь
-    if not is_blacklisted(target_user_id):
+    if not await adb.is_blacklisted(target_user_id):
         await update.message.reply_text(
             f"ℹ️ Пользователь <code>{target_user_id}</code> не заблокирован",
             parse_mode=ParseMode.HTML
@@ -186,16 +182,15 @@ async def unblock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Получаем информацию о пользователе для логирования
-    from database.db import get_user_info
-    user_info = get_user_info(target_user_id)
+    user_info = await adb.get_user_info(target_user_id)
     target_username = user_info[1] if user_info else None
     target_first_name = user_info[2] if user_info else None
     
     # Разблокируем
-    remove_from_blacklist(target_user_id)
+    await adb.remove_from_blacklist(target_user_id)
     
     # ✅ Логируем действие
-    log_operator_action(
+    await adb.log_operator_action(
         user_id, 
         'user_unblocked',
         target_user_id=target_user_id,
@@ -215,7 +210,7 @@ async def unblock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def dialogs_command_impl(bot_data: dict, bot, operator_id: int, chat_id: int):
     """Внутренняя реализация команды /dialogs"""
     # ✅ Логируем действие
-    log_operator_action(operator_id, 'dialogs_view')
+    await adb.log_operator_action(operator_id, 'dialogs_view')
     
     dm = DialogManager(bot_data)
     dialogs = dm.get_all_operator_dialogs(operator_id)
@@ -301,7 +296,7 @@ async def dialogs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     await dialogs_command_impl(context.bot_data, context.bot, user_id, update.effective_chat.id)
@@ -313,7 +308,7 @@ async def end_dialog_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     dm = DialogManager(context.bot_data)
     
     # ✅ ИСПРАВЛЕНИЕ: Используем is_staff() вместо is_operator()
-    is_operator = is_staff(user_id)
+    is_operator = await adb.is_staff(user_id)
     
     if is_operator:
         active_dialog_id = dm.get_active_dialog_for_operator(user_id)
@@ -331,7 +326,7 @@ async def end_dialog_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         other_user_name = dialog_info['user_name']
         
         # ✅ Логируем действие
-        log_operator_action(
+        await adb.log_operator_action(
             user_id,
             'dialog_end',
             target_user_id=other_user_id,
@@ -405,7 +400,7 @@ async def end_all_dialogs_command(update: Update, context: ContextTypes.DEFAULT_
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     dm = DialogManager(context.bot_data)
@@ -421,7 +416,7 @@ async def end_all_dialogs_command(update: Update, context: ContextTypes.DEFAULT_
     user_ids = [info['user_id'] for _, info in dialogs]
     
     # ✅ Логируем действие
-    log_operator_action(
+    await adb.log_operator_action(
         user_id,
         'dialog_end',
         details=f"Завершено диалогов: {len(dialogs)}"
@@ -461,7 +456,7 @@ async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     # Парсим аргументы
@@ -476,7 +471,7 @@ async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 action_type = arg
     
     # Получаем логи
-    logs = get_operator_logs(
+    logs = await adb.get_operator_logs(
         operator_id=user_id,
         action_type=action_type,
         limit=limit
@@ -549,11 +544,11 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     # Получаем статистику
-    stats = get_operator_stats(user_id)
+    stats = await adb.get_operator_stats(user_id)
     
     text = (
         f"📊 <b>Статистика персонала</b>\n\n"
@@ -597,7 +592,7 @@ async def dialog_history_command(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.effective_user.id
     
     # ✅ ИСПРАВЛЕНИЕ: Проверяем, является ли пользователь персоналом
-    if not is_staff(user_id):
+    if not await adb.is_staff(user_id):
         return
     
     if not context.args:
@@ -612,7 +607,7 @@ async def dialog_history_command(update: Update, context: ContextTypes.DEFAULT_T
     dialog_id = context.args[0]
     
     # Получаем сообщения
-    messages = get_dialog_messages(dialog_id, limit=50)
+    messages = await adb.get_dialog_messages(dialog_id, limit=50)
     
     if not messages:
         await update.message.reply_text(
@@ -622,7 +617,7 @@ async def dialog_history_command(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Получаем статистику
-    stats = get_dialog_stats(dialog_id)
+    stats = await adb.get_dialog_stats(dialog_id)
     
     text = (
         f"💬 <b>История диалога</b>\n"
@@ -651,4 +646,52 @@ async def dialog_history_command(update: Update, context: ContextTypes.DEFAULT_T
     if len(messages) > 30:
         text += f"\n💡 Показаны последние 30 из {len(messages)} сообщений"
     
-    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
\ No newline at end of file
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+
+
+async def backfill_ranks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Досчитывает ранги карт клуба, сохранённых с рангом '?'
+    Команда: /backfill_ranks (только администратор)
+    """
+    user_id = update.effective_user.id
+
+    if not await adb.is_admin(user_id):
+        return
+
+    monitor = context.bot_data.get('card_monitor')
+    if not monitor or not monitor.rank_detector or not monitor.rank_detector.is_ready:
+        await update.message.reply_text("❌ Детектор рангов не готов (нет шаблонов в ranks/)")
+        return
+
+    if context.bot_data.get('rank_backfill_running'):
+        await update.message.reply_text("⏳ Досчёт рангов уже выполняется")
+        return
+
+    status = await update.message.reply_text("🔁 Досчёт рангов запущен...")
+    context.bot_data['rank_backfill_running'] = True
+
+    last_edit = 0.0
+
+    async def report(stats: BackfillStats):
+        nonlocal last_edit
+        # Не чаще раза в 3 секунды — лимит Telegram на редактирование
+        if time.monotonic() - last_edit < 3:
+            return
+        last_edit = time.monotonic()
+        await status.edit_text(f"🔁 Досчёт рангов: {stats.format()}")
+
+    async def run():
+        try:
+            stats = await backfill_ranks(monitor, progress=report)
+            if stats.total:
+                await status.edit_text(f"✅ Досчёт рангов завершён\n\n{stats.format()}")
+            else:
+                await status.edit_text("✅ Карт без ранга нет")
+        except Exception as e:
+            logger.error(f"Ошибка досчёта рангов: {e}", exc_info=True)
+            await status.edit_text(f"❌ Ошибка досчёта рангов: {e}")
+        finally:
+            context.bot_data['rank_backfill_running'] = False
+
+    context.application.create_task(run(), update=update)
@@ -9,14 +9,7 @@ from telegram import Update, LinkPreviewOptions
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from config.settings import ADMIN_CHAT_ID
-from database.db import (
-    is_blacklisted, save_user, is_user_linked,
-    get_user_profile_url, add_to_blacklist,
-    log_operator_action, save_dialog_message,
-    add_twink, get_twinks_count, get_user_twinks,
-    is_staff, get_all_users_by_role,
-    get_user_twinks
-)
+from database import async_db as adb
 from keyboards.inline import (
     get_back_button, get_user_action_keyboard, get_application_keyboard,
     get_reply_keyboard_for_linked_user, get_operator_commands_keyboard,
@@ -32,8 +25,8 @@ from keyboards.inline import (
 from utils.helpers import (
     get_user_link, check_club_membership,
     is_user_in_group, validate_profile_url,
-    get_site_nickname
 )
+from utils.nickname_cache import get_nickname_cache
 from utils.dialog_manager import DialogManager
 from config.settings import WELCOME_TEXT
 
@@ -48,7 +41,7 @@ logger = logging.getLogger(__name__)
 
 
 async def _send_to_operators(context, text, reply_markup=None, **kwargs):
-    operators = get_all_users_by_role('operator')
+    operators = await adb.get_all_users_by_role('operator')
     if not operators:
         logger.warning("Операторов в БД нет, отправляем администратору")
         await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=text, reply_markup=reply_markup, **kwargs)
@@ -75,7 +68,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user    = update.message.from_user
     user_id = user.id
 
-    if is_blacklisted(user_id):
+    if await adb.is_blacklisted(user_id):
         logger.warning(f"Заблокированный {user_id} пытается отправить сообщение")
         return
 
@@ -106,20 +99,20 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ── ПЕРСОНАЛ ──────────────────────────────────────────────
-    if is_staff(user_id):
+    if await adb.is_staff(user_id):
         if user_state == 'blocking_user':
             blocked_uid = context.user_data.get('blocking_user_id')
             if blocked_uid:
                 reason = user_message.strip()
                 try:
                     chat = await context.bot.get_chat(blocked_uid)
-                    add_to_blacklist(blocked_uid, chat.username or "", chat.first_name or "", reason)
-                    log_operator_action(user_id, 'user_blocked', target_user_id=blocked_uid,
-                                        target_username=chat.username or "", target_first_name=chat.first_name or "",
-                                        details=f"Причина: {reason}")
+                    await adb.add_to_blacklist(blocked_uid, chat.username or "", chat.first_name or "", reason)
+                    await adb.log_operator_action(user_id, 'user_blocked', target_user_id=blocked_uid,
+                                                  target_username=chat.username or "", target_first_name=chat.first_name or "",
+                                                  details=f"Причина: {reason}")
                 except Exception:
-                    add_to_blacklist(blocked_uid, "", "", reason)
-                    log_operator_action(user_id, 'user_blocked', target_user_id=blocked_uid, details=f"Причина: {reason}")
+                    await adb.add_to_blacklist(blocked_uid, "", "", reason)
+                    await adb.log_operator_action(user_id, 'user_blocked', target_user_id=blocked_uid, details=f"Причина: {reason}")
                 context.user_data['blocking_user_id'] = None
                 context.user_data['state'] = None
                 await update.message.reply_text(
@@ -133,7 +126,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             target_user_id = dialog_info['user_id']
             user_name = dialog_info['user_name']
             try:
-                save_dialog_message(active_dialog_id, user_id, 'operator', user_message)
+                await adb.save_dialog_message(active_dialog_id, user_id, 'operator', user_message)
                 await context.bot.send_message(chat_id=target_user_id,
                     text=f"💬 <b>Оператор:</b>\n\n{user_message}", parse_mode=ParseMode.HTML)
                 await update.message.reply_text(f"✅ Сообщение отправлено пользователю {user_name}", disable_notification=True)
@@ -154,7 +147,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         operator_id = dialog_info['operator_id']
         try:
-            save_dialog_message(dialog_id, user_id, 'user', user_message)
+            await adb.save_dialog_message(dialog_id, user_id, 'user', user_message)
             sender_name = user.first_name or user.username or f"User {user_id}"
             await context.bot.send_message(chat_id=operator_id,
                 text=f"💬 <b>Сообщение от {get_user_link(user_id, sender_name)}:</b>\n\n{user_message}",
@@ -167,7 +160,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # ── НИЖНЯЯ КЛАВИАТУРА ─────────────────────────────────────
-    if user_message in REPLY_KEYBOARD_BUTTONS and is_user_linked(user_id):
+    if user_message in REPLY_KEYBOARD_BUTTONS and await adb.is_user_linked(user_id):
         await _handle_reply_button(update, context, user, user_id, user_message)
         return
 
@@ -220,7 +213,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_state == 'contacting_operator':
         await update.message.reply_text(
             "✅ Ваше сообщение отправлено оператору!\nОператор ответит в течение 5-15 минут.",
-            reply_markup=get_back_button() if not is_user_linked(user_id) else None)
+            reply_markup=get_back_button() if not await adb.is_user_linked(user_id) else None)
         user_link = get_user_link(user_id, user.first_name or user.username or "Пользователь")
         await _send_to_operators(context,
             text=(f"💬 <b>Новое сообщение от пользователя</b>\n\nОт: {user_link}\nID: <code>{user_id}</code>\n\n<b>Сообщение:</b>\n{user_message}"),
@@ -235,15 +228,14 @@ async def _handle_reply_button(update, context, user, user_id, text):
     if text == BTN_PROFILE:
         loading_msg = await update.message.reply_text("🔄 Загружаю данные профиля...")
         try:
-            from database.db import get_user_info
-            user_info = get_user_info(user_id)
+            user_info = await adb.get_user_info(user_id)
             if not user_info:
                 await loading_msg.edit_text("❌ Ошибка: данные пользователя не найдены в БД")
                 return
             user_data = {
                 'user_id': user_info[0], 'username': user_info[1],
                 'first_name': user_info[2], 'last_name': user_info[3],
-                'profile_url': get_user_profile_url(user_id), 'profile_id': None,
+                'profile_url': await adb.get_user_profile_url(user_id), 'profile_id': None,
                 'site_nickname': user_info[4] if len(user_info) > 4 else None,
             }
             profile_url = user_data['profile_url']
@@ -253,8 +245,7 @@ async def _handle_reply_button(update, context, user, user_id, text):
                 if m:
                     user_data['profile_id'] = m.group(1)
             if not profile_url or not user_data['profile_id']:
-                twinks = get_user_twinks(user_id)
-                twinks_count = len(twinks) if twinks else 0
+                twinks_count = await adb.get_twinks_count(user_id)
                 await loading_msg.edit_text(
                     f"👤 <b>Базовый профиль</b>\n\nИмя: {user.first_name}\n"
                     f"Username: @{user.username or 'не указан'}\nПрофиль на сайте: не привязан"
@@ -266,8 +257,7 @@ async def _handle_reply_button(update, context, user, user_id, text):
             if not profile:
                 await loading_msg.edit_text("❌ Ошибка при построении профиля. Попробуйте позже.")
                 return
-            twinks = get_user_twinks(user_id)
-            twinks_count = len(twinks) if twinks else 0
+            twinks_count = await adb.get_twinks_count(user_id)
             twinks_suffix = f"\n\n💎 <b>Твинов привязано:</b> {twinks_count}" if twinks_count > 0 else ""
             await loading_msg.edit_text(format_profile_message(profile) + twinks_suffix,
                                         parse_mode=ParseMode.HTML, link_preview_options=LinkPreviewOptions(is_disabled=True))
@@ -278,8 +268,8 @@ async def _handle_reply_button(update, context, user, user_id, text):
     elif text == BTN_NOTIFICATIONS:
         # ✅ Открываем экран настроек уведомлений с переключателями per-аккаунт
         await update.message.reply_text(
-            notifications_text(user_id),
-            reply_markup=get_notifications_keyboard(user_id),
+            await notifications_text(user_id),
+            reply_markup=await get_notifications_keyboard(user_id),
             parse_mode=ParseMode.HTML
         )
 
@@ -302,7 +292,7 @@ async def _handle_reply_button(update, context, user, user_id, text):
         await handle_card_price_request(update, context)
 
     elif text == BTN_TWINKS:
-        twinks = get_user_twinks(user_id)
+        twinks = await adb.get_user_twinks(user_id)
         if not twinks:
             text_msg = ("💎 <b>Дополнительные аккаунты (твины)</b>\n\nУ вас пока нет привязанных твинов.\n\n"
                         "Твины — это дополнительные аккаунты MangaBuff, которые вы можете привязать к боту.\n"
@@ -310,7 +300,7 @@ async def _handle_reply_button(update, context, user, user_id, text):
         else:
             twinks_list = "\n".join(f"{i+1}. {t.get('site_nickname','Без ника')} - {t.get('profile_url')}" for i, t in enumerate(twinks))
             text_msg = f"💎 <b>Ваши твины ({len(twinks)})</b>\n\n{twinks_list}\n\nВы можете добавить новый или удалить существующий."
-        await update.message.reply_text(text_msg, reply_markup=get_twink_manage_keyboard(user_id),
+        await update.message.reply_text(text_msg, reply_markup=await get_twink_manage_keyboard(user_id),
                                         parse_mode=ParseMode.HTML, link_preview_options=LinkPreviewOptions(is_disabled=True))
 
     elif text == BTN_OPERATOR_COMMANDS:
@@ -362,9 +352,9 @@ async def _handle_linking(update, context, user, user_id, user_message):
         context.user_data['state'] = None
         return
 
-    site_nickname = get_site_nickname(user_message.strip()) or user.username or user.first_name
-    save_user(user_id, user.username, user.first_name, user.last_name,
-              user_message.strip(), profile_id, site_nickname, is_linked=True)
+    site_nickname = await get_nickname_cache().get(user_message.strip()) or user.username or user.first_name
+    await adb.save_user(user_id, user.username, user.first_name, user.last_name,
+                        user_message.strip(), profile_id, site_nickname, is_linked=True)
 
     context.user_data['main_profile_url'] = user_message.strip()
     context.user_data['main_profile_id']  = profile_id
@@ -398,8 +388,8 @@ async def _handle_twink_linking(update, context, user, user_id, user_message):
         return
 
     checking_msg = await update.message.reply_text("🔍 Проверяем профиль...")
-    site_nickname = get_site_nickname(user_message.strip()) or f"User {profile_id}"
-    success = add_twink(user_id, user_message.strip(), profile_id, site_nickname)
+    site_nickname = await get_nickname_cache().get(user_message.strip()) or f"User {profile_id}"
+    success = await adb.add_twink(user_id, user_message.strip(), profile_id, site_nickname)
 
     try:
         await checking_msg.delete()
@@ -409,8 +399,7 @@ async def _handle_twink_linking(update, context, user, user_id, user_message):
     if success:
         # ✅ Увеличиваем счётчик добавленных за сессию твинов
         context.user_data['twinks_added_this_session'] = context.user_data.get('twinks_added_this_session', 0) + 1
-        twinks = get_user_twinks(user_id)
-        twinks_count = len(twinks) if twinks else 0
+        twinks_count = await adb.get_twinks_count(user_id)
         await update.message.reply_text(
             f"✅ <b>Твин успешно привязан!</b>\n\nПрофиль: {user_message}\nНик: {site_nickname}\n\n"
             f"💎 Всего твинов: {twinks_count}\n\nМожете отправить ещё одну ссылку, нажать «Готово» или «Отмена».",
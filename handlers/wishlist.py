@@ -21,9 +21,9 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
 from config.settings import BASE_URL, REQUEST_TIMEOUT
-from database.db import get_card_price, get_user_info
 from utils.helpers import site_session
 from utils.sheets_parser import get_sheets_parser
+from utils.price_index import get_card_prices
 
 logger = logging.getLogger(__name__)
 
@@ -373,9 +373,10 @@ async def handle_my_wishlist_in_obshaga(update: Update, context: ContextTypes.DE
             parse_mode=ParseMode.HTML
         )
         
+        prices = get_card_prices(matches)
         results = []
         for card_id in matches:
-            price = get_card_price(card_id)
+            price = prices.get(card_id)
             price_str = f"{price} ОК" if price is not None else "Цена неизвестна"
             
             results.append({
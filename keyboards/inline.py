@@ -58,7 +58,7 @@ def get_back_button():
 # ✅ УВЕДОМЛЕНИЯ
 # ══════════════════════════════════════════════
 
-def get_notifications_keyboard(user_id: int) -> InlineKeyboardMarkup:
+async def get_notifications_keyboard(user_id: int) -> InlineKeyboardMarkup:
     """
     Клавиатура настроек уведомлений.
     Каждая строка: [название аккаунта (не кликабельно)] [✅ Вкл / 🔕 Выкл]
@@ -66,23 +66,23 @@ def get_notifications_keyboard(user_id: int) -> InlineKeyboardMarkup:
       toggle_notif_main          — основной аккаунт
       toggle_notif_{profile_id}  — твин
     """
-    from database.db import get_notification_settings, get_user_twinks, get_user_info, NOTIF_KEY_MAIN
+    from database import async_db as adb
 
-    settings = get_notification_settings(user_id)
+    settings = await adb.get_notification_settings(user_id)
     keyboard = []
 
     # Основной аккаунт
-    user_info = get_user_info(user_id)
+    user_info = await adb.get_user_info(user_id)
     main_nick = (user_info[4] if user_info and len(user_info) > 4 and user_info[4] else "Основной аккаунт")
-    main_on = settings.get(NOTIF_KEY_MAIN, True)
+    main_on = settings.get(adb.NOTIF_KEY_MAIN, True)
     keyboard.append([
         InlineKeyboardButton(f"👤 {main_nick}", callback_data='notif_noop'),
         InlineKeyboardButton("✅ Вкл" if main_on else "🔕 Выкл",
-                             callback_data=f'toggle_notif_{NOTIF_KEY_MAIN}'),
+                             callback_data=f'toggle_notif_{adb.NOTIF_KEY_MAIN}'),
     ])
 
     # Твины
-    for twink in get_user_twinks(user_id):
+    for twink in await adb.get_user_twinks(user_id):
         pid = str(twink.get('profile_id', ''))
         nick = twink.get('site_nickname') or f"User {pid}"
         on = settings.get(pid, True)
@@ -96,14 +96,14 @@ def get_notifications_keyboard(user_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
-def notifications_text(user_id: int) -> str:
+async def notifications_text(user_id: int) -> str:
     """Текст экрана настроек уведомлений"""
-    from database.db import get_notification_settings, get_user_twinks, get_user_info, NOTIF_KEY_MAIN
+    from database import async_db as adb
 
-    settings = get_notification_settings(user_id)
-    user_info = get_user_info(user_id)
+    settings = await adb.get_notification_settings(user_id)
+    user_info = await adb.get_user_info(user_id)
     main_nick = (user_info[4] if user_info and len(user_info) > 4 and user_info[4] else "Основной аккаунт")
-    main_on = settings.get(NOTIF_KEY_MAIN, True)
+    main_on = settings.get(adb.NOTIF_KEY_MAIN, True)
 
     lines = [
         "🔔 <b>Настройки уведомлений</b>",
@@ -114,7 +114,7 @@ def notifications_text(user_id: int) -> str:
         "<b>Ваши аккаунты:</b>",
         f"{'✅' if main_on else '🔕'} 👤 {main_nick} <i>(основной)</i>",
     ]
-    for twink in get_user_twinks(user_id):
+    for twink in await adb.get_user_twinks(user_id):
         pid = str(twink.get('profile_id', ''))
         nick = twink.get('site_nickname') or f"User {pid}"
         on = settings.get(pid, True)
@@ -144,9 +144,9 @@ def get_twink_done_keyboard():
     ])
 
 
-def get_twink_manage_keyboard(user_id: int):
-    from database.db import get_user_twinks
-    twinks = get_user_twinks(user_id)
+async def get_twink_manage_keyboard(user_id: int):
+    from database import async_db as adb
+    twinks = await adb.get_user_twinks(user_id)
     if not twinks:
         return InlineKeyboardMarkup([[InlineKeyboardButton("➕ Добавить твин", callback_data='add_twink')]])
     keyboard = []
@@ -285,7 +285,7 @@ def get_wishlist_menu_keyboard():
     ])
 
 
-def get_account_selection_keyboard(user_id: int, action: str):
+async def get_account_selection_keyboard(user_id: int, action: str):
     """
     Клавиатура выбора аккаунта для хотелок
     
@@ -293,12 +293,12 @@ def get_account_selection_keyboard(user_id: int, action: str):
         user_id: ID пользователя
         action: 'mine_in_obshaga' или 'obshaga_with_me'
     """
-    from database.db import get_user_info, get_user_twinks
+    from database import async_db as adb
     
     keyboard = []
     
     # Основной аккаунт
-    user_info = get_user_info(user_id)
+    user_info = await adb.get_user_info(user_id)
     if user_info:
         main_nick = user_info[4] if len(user_info) > 4 and user_info[4] else "Основной аккаунт"
         keyboard.append([
@@ -309,7 +309,7 @@ def get_account_selection_keyboard(user_id: int, action: str):
         ])
     
     # Твины
-    twinks = get_user_twinks(user_id)
+    twinks = await adb.get_user_twinks(user_id)
     for twink in twinks:
         nick = twink.get('site_nickname', f"User {twink.get('profile_id')}")
         keyboard.append([
@@ -14,6 +14,7 @@ Club Taro Telegram Bot
 ✅ ДОБАВЛЕНО: Функционал цен на карты (загрузка Excel, запрос цен)
 ✅ ИСПРАВЛЕНО: Обработка сообщений только в приватных чатах (не в группах)
 """
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import (
@@ -22,18 +23,20 @@ from telegram.ext import (
 )
 from telegram.error import TelegramError, NetworkError, TimedOut
 from telegram.constants import ParseMode, ChatType
-from config.settings import BOT_TOKEN
-from database.db import init_db, is_user_linked
+from config.settings import BOT_TOKEN, LOOP_LAG_REPORT_INTERVAL, CARD_MONITOR_ADAPTIVE
+from database.db import init_db, is_user_linked, close_connection
+from database import async_db
 from handlers.commands import (
     start, cancel_command, end_dialog_command,
     dialogs_command, end_all_dialogs_command, blacklist_command, unblock_command,
-    logs_command, stats_command, dialog_history_command
+    logs_command, stats_command, dialog_history_command, backfill_ranks_command
 )
 from handlers.callbacks import button_handler
 from handlers.messages import message_handler
 
 from keyboards.inline import get_reply_keyboard_for_linked_user
 from utils.dialog_manager import DialogManager
+from utils.loop_monitor import LoopLagMonitor, loop_lag_report_job
 
 # Настройка логирования
 logging.basicConfig(
@@ -129,6 +132,56 @@ async def auto_refresh_job(context):
         logger.error(f"❌ Ошибка в автообновлении: {e}", exc_info=True)
 
 
+# ═════════════════════════════════════════════════════════════
+# ЗАПУСК / ОСТАНОВКА ПРИЛОЖЕНИЯ
+# ═════════════════════════════════════════════════════════════
+
+async def post_init(application: Application):
+    """Запускает фоновые корутины после старта event loop"""
+    lag_monitor = LoopLagMonitor()
+    lag_monitor.start()
+    application.bot_data['loop_lag_monitor'] = lag_monitor
+
+    # Шаблоны рангов загружаем до первого тика мониторинга и в потоке:
+    # чтение ranks/ и сборка пакета не должны блокировать event loop
+    card_monitor = application.bot_data.get('card_monitor')
+    if card_monitor and card_monitor.rank_detector:
+        try:
+            detector = card_monitor.rank_detector
+            if await asyncio.to_thread(lambda: detector.is_ready):
+                logger.info(f"✅ Шаблоны рангов загружены: {detector.get_stats()['total_templates']}")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки шаблонов рангов: {e}")
+
+    # История смен карт для адаптивного опроса (до первого тика)
+    scheduler = application.bot_data.get('poll_scheduler')
+    if scheduler:
+        try:
+            scheduler.load_history(await async_db.get_club_card_discovery_times())
+        except Exception as e:
+            logger.error(f"Ошибка загрузки истории смен карт: {e}")
+
+
+async def post_shutdown(application: Application):
+    """Закрывает пул HTTP-соединений, соединение с БД и останавливает замеры"""
+    lag_monitor = application.bot_data.get('loop_lag_monitor')
+    if lag_monitor:
+        lag_monitor.stop()
+
+    card_monitor = application.bot_data.get('card_monitor')
+    if card_monitor:
+        try:
+            await card_monitor.aclose()
+        except Exception as e:
+            logger.error(f"Ошибка закрытия HTTP-клиента монитора: {e}")
+
+    # Очередь запросов к БД: дожидаемся записей и закрываем потоки БД
+    await asyncio.to_thread(async_db.shutdown)
+
+    # Соединение с БД потока бота (WAL сливается в основной файл)
+    close_connection()
+
+
 def main():
     """Запускает бота с обработкой ошибок и автообновлением"""
     print("=" * 60)
@@ -153,6 +206,9 @@ def main():
     try:
         init_db()
         print("✅ База данных готова (с таблицами логов и цен)")
+        from utils.price_index import get_price_index
+        get_price_index().build()
+        print("✅ Индекс цен на карты построен")
     except Exception as e:
         print(f"❌ Ошибка инициализации БД: {e}")
         logger.exception("Критическая ошибка при инициализации БД")
@@ -177,7 +233,13 @@ def main():
     # Создаем приложение
     print("🤖 Создание приложения бота...")
     try:
-        application = Application.builder().token(BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
     except Exception as e:
         print(f"❌ Ошибка создания приложения: {e}")
         logger.exception("Критическая ошибка при создании приложения")
@@ -212,20 +274,41 @@ def main():
         first=10,
         name='auto_refresh'
     )
+
+    # Отчёт о задержках event loop
+    job_queue.run_repeating(
+        loop_lag_report_job,
+        interval=LOOP_LAG_REPORT_INTERVAL,
+        first=LOOP_LAG_REPORT_INTERVAL,
+        name='loop_lag_report'
+    )
     
     # Добавляем задачу мониторинга карт
     if 'card_monitor' in application.bot_data:
         print("🎴 Настройка мониторинга карт (каждые 2 секунды)...")
         
-        from utils.card_monitor import card_monitoring_job
-        
-        job_queue.run_repeating(
-            card_monitoring_job,
-            interval=2,
-            first=5,
-            name='card_monitoring'
-        )
-        print("✅ Мониторинг карт активирован")
+        if CARD_MONITOR_ADAPTIVE:
+            # Интервал подбирается по истории смен карт (загружается
+            # в post_init) и ответам сайта
+            from utils.poll_scheduler import AdaptivePollScheduler, adaptive_monitoring_job
+
+            scheduler = AdaptivePollScheduler()
+            application.bot_data['poll_scheduler'] = scheduler
+            job_queue.run_once(adaptive_monitoring_job, when=5, name='card_monitoring')
+            print("✅ Мониторинг карт активирован (адаптивный интервал)")
+        else:
+            from utils.card_monitor import guarded_card_monitoring_job
+
+            # max_instances=2: пересекающийся тик доходит до обёртки и
+            # схлопывается ею, а не теряется молча внутри APScheduler
+            job_queue.run_repeating(
+                guarded_card_monitoring_job,
+                interval=2,
+                first=5,
+                name='card_monitoring',
+                job_kwargs={'max_instances': 2}
+            )
+            print("✅ Мониторинг карт активирован")
     
     # Регистрируем обработчики команд
     print("📝 Регистрация обработчиков команд и сообщений...")
@@ -249,6 +332,7 @@ def main():
     application.add_handler(CommandHandler("logs", logs_command))
     application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(CommandHandler("history", dialog_history_command))
+    application.add_handler(CommandHandler("backfill_ranks", backfill_ranks_command))
     
     # Обработчики сообщений и callback
     application.add_handler(CallbackQueryHandler(button_handler))
@@ -0,0 +1,72 @@
+"""
+Асинхронный HTTP-клиент для сайта MangaBuff
+
+Работает на httpx (уже есть в зависимостях через python-telegram-bot),
+держит пул keep-alive соединений и использует те же куки и заголовки,
+что и helpers.site_session — повторная авторизация не нужна.
+"""
+import logging
+from typing import Optional, Dict
+
+import httpx
+import requests
+
+from config.settings import (
+    REQUEST_TIMEOUT, HTTP_POOL_MAX_CONNECTIONS, HTTP_POOL_MAX_KEEPALIVE
+)
+
+logger = logging.getLogger(__name__)
+
+# Заголовки requests, которые httpx выставляет сам (br/zstd он может не уметь)
+_SKIP_HEADERS = {'accept-encoding', 'connection'}
+
+
+class AsyncSiteClient:
+    """Пул асинхронных соединений с куками сессии requests"""
+
+    def __init__(self, session: requests.Session):
+        self._fallback_session = session
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cookies_source: Optional[requests.Session] = None
+
+    def _current_session(self) -> requests.Session:
+        """Актуальная сессия сайта (после перелогина helpers создаёт новую)"""
+        from utils import helpers
+        return helpers.site_session or self._fallback_session
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        session = self._current_session()
+
+        if self._client is None:
+            headers = {
+                k: v for k, v in session.headers.items()
+                if k.lower() not in _SKIP_HEADERS
+            }
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                timeout=REQUEST_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                ),
+            )
+
+        # Общий CookieJar: куки, выставленные сайтом, видны обоим клиентам
+        if session is not self._cookies_source:
+            self._client.cookies = httpx.Cookies(session.cookies)
+            self._cookies_source = session
+            logger.debug("AsyncSiteClient: куки синхронизированы с site_session")
+
+        return self._client
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """GET-запрос через пул соединений"""
+        return await self._ensure_client().get(url, headers=headers)
+
+    async def aclose(self):
+        """Закрывает пул соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._cookies_source = None
@@ -0,0 +1,129 @@
+"""
+Кеш метаданных карт клуба
+
+Поверх таблицы club_cards: для уже встречавшейся карты монитор
+не перезапрашивает то, что не меняется. Название и ранг хранятся
+бессрочно (если были определены), количества владельцев/желающих —
+CARD_COUNTS_TTL секунд от момента загрузки (counts_updated_at).
+club_cards читается через database.async_db — не в event loop.
+"""
+import logging
+import time
+from typing import Optional, Dict
+
+from config.settings import CARD_COUNTS_TTL
+from database import async_db as adb
+
+logger = logging.getLogger(__name__)
+
+# Время жизни полей (сек); None — бессрочно
+FIELD_TTLS: Dict[str, Optional[float]] = {
+    'card_name': None,
+    'card_rank': None,
+    'wants_count': CARD_COUNTS_TTL,
+    'owners_count': CARD_COUNTS_TTL,
+}
+
+# Поля, для которых отсчёт идёт от counts_updated_at
+COUNT_FIELDS = ('wants_count', 'owners_count')
+
+# Значения-заглушки: такие поля считаем незаполненными
+PLACEHOLDERS = {
+    'card_name': "Неизвестная карта",
+    'card_rank': "?",
+}
+
+
+class CardMetaCache:
+    """Память + club_cards; отдаёт только ещё действительные поля"""
+
+    def __init__(self, ttls: Optional[Dict[str, Optional[float]]] = None):
+        self.ttls = ttls or FIELD_TTLS
+        self._cards: Dict[str, Dict] = {}
+        self.hits = 0      # полей взято из кеша
+        self.misses = 0    # полей пришлось загрузить
+
+    async def _load(self, card_id: str) -> Optional[Dict]:
+        entry = self._cards.get(card_id)
+        if entry is not None:
+            return entry
+        try:
+            row = await adb.get_club_card(card_id)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кеша карты {card_id}: {e}")
+            row = None
+        if row is not None:
+            entry = {key: row.get(key) for key in (*self.ttls, 'counts_updated_at')}
+            self._cards[card_id] = entry
+        return entry
+
+    def _is_valid(self, field: str, value, updated_at: Optional[float], now: float) -> bool:
+        if value is None or value == PLACEHOLDERS.get(field):
+            return False
+        ttl = self.ttls.get(field)
+        if ttl is None:
+            return True
+        return updated_at is not None and now - updated_at < ttl
+
+    async def fresh_fields(self, card_id: str) -> Dict:
+        """
+        Действительные закешированные поля карты.
+
+        Returns:
+            dict: подмножество FIELD_TTLS (+ counts_updated_at, если
+                  количества свежие); пустой dict, если карты нет
+        """
+        entry = await self._load(card_id)
+        if not entry:
+            self.misses += len(self.ttls)
+            return {}
+
+        now = time.time()
+        fresh = {}
+        for field in self.ttls:
+            updated_at = entry.get('counts_updated_at') if field in COUNT_FIELDS else None
+            if self._is_valid(field, entry.get(field), updated_at, now):
+                fresh[field] = entry[field]
+
+        self.hits += len(fresh)
+        self.misses += len(self.ttls) - len(fresh)
+        if any(field in fresh for field in COUNT_FIELDS):
+            fresh['counts_updated_at'] = entry['counts_updated_at']
+        return fresh
+
+    async def last_value(self, card_id: str, field: str):
+        """Последнее сохранённое значение поля без учёта TTL (None — не было)"""
+        entry = await self._load(card_id)
+        if not entry:
+            return None
+        value = entry.get(field)
+        return None if value == PLACEHOLDERS.get(field) else value
+
+    def remember(self, data: Dict):
+        """Запоминает данные карты после полного парсинга (в БД их пишет save_club_card)"""
+        card_id = data.get('card_id')
+        if not card_id:
+            return
+        self._cards[card_id] = {
+            key: data.get(key) for key in (*self.ttls, 'counts_updated_at')
+        }
+
+    def format_stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits * 100 / total if total else 0.0
+        return (
+            f"полей из кеша {self.hits}, загружено {self.misses} "
+            f"({hit_rate:.1f}% из кеша), карт в памяти {len(self._cards)}"
+        )
+
+
+# Глобальный экземпляр кеша
+_cache_instance: Optional[CardMetaCache] = None
+
+
+def get_card_cache() -> CardMetaCache:
+    """Возвращает глобальный кеш метаданных карт"""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = CardMetaCache()
+    return _cache_instance
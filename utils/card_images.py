@@ -0,0 +1,86 @@
+"""
+Кеш картинок карт клуба
+
+Картинка карты скачивается один раз: те же байты идут в RankDetector
+и загружаются в Telegram как InputFile (до появления file_id, см.
+utils.card_media). Хранится несколько последних картинок (LRU),
+одновременные запросы одного URL делят одну загрузку.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Callable, Awaitable
+
+from config.settings import CARD_IMAGE_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+Downloader = Callable[[str], Awaitable[Optional[bytes]]]
+
+
+class CardImageCache:
+    """URL картинки → байты (LRU в памяти)"""
+
+    def __init__(self, max_size: int = CARD_IMAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._images: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.downloads = 0
+
+    def peek(self, url: Optional[str]) -> Optional[bytes]:
+        """Байты картинки, если она уже скачана (без загрузки)"""
+        if not url:
+            return None
+        data = self._images.get(url)
+        if data is not None:
+            self._images.move_to_end(url)
+        return data
+
+    def put(self, url: str, data: bytes):
+        self._images[url] = data
+        self._images.move_to_end(url)
+        while len(self._images) > self.max_size:
+            self._images.popitem(last=False)
+
+    async def fetch(self, url: str, downloader: Downloader) -> Optional[bytes]:
+        """Байты картинки: из кеша или через downloader(url)"""
+        data = self.peek(url)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            self.hits += 1
+            return await inflight
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        data = None
+        try:
+            data = await downloader(url)
+            self.downloads += 1
+            if data:
+                self.put(url, data)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки картинки карты {url}: {e}")
+        finally:
+            self._inflight.pop(url, None)
+            future.set_result(data)
+        return data
+
+    def format_stats(self) -> str:
+        return f"скачано {self.downloads}, из кеша {self.hits}, в памяти {len(self._images)}"
+
+
+# Глобальный экземпляр кеша
+_cache_instance: Optional[CardImageCache] = None
+
+
+def get_card_images() -> CardImageCache:
+    """Возвращает глобальный кеш картинок карт"""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = CardImageCache()
+    return _cache_instance
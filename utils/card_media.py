@@ -0,0 +1,124 @@
+"""
+Картинки карт клуба для Telegram
+
+Первая отправка карты загружает картинку (байтами из utils.card_images,
+если она уже скачана монитором, иначе по URL), а file_id из ответа
+Telegram сохраняется в таблицу card_file_ids. Все следующие отправки
+этой карты (в группу, владельцам, после перезапуска) используют file_id —
+Telegram не скачивает картинку с mangabuff заново. Таблица читается
+и пишется через database.async_db — не в event loop.
+"""
+import logging
+import os
+from typing import Optional, Dict
+from urllib.parse import urlparse
+
+from telegram import InputFile
+from telegram.error import BadRequest
+
+from database import async_db as adb
+from utils.card_images import get_card_images
+
+logger = logging.getLogger(__name__)
+
+# Ошибки Telegram, означающие, что сам file_id больше не годится
+# (остальные BadRequest — про получателя или подпись, file_id не трогаем)
+FILE_ID_ERRORS = (
+    'wrong file identifier',
+    'wrong remote file identifier',
+    'file reference expired',
+)
+
+
+def _is_file_id_error(error: BadRequest) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in FILE_ID_ERRORS)
+
+
+class CardMediaStore:
+    """card_id → Telegram file_id (память + БД)"""
+
+    def __init__(self):
+        self._file_ids: Dict[str, Optional[str]] = {}
+        self.uploads = 0   # отправок с загрузкой картинки (байты или URL)
+        self.reuses = 0    # отправок по сохранённому file_id
+
+    async def file_id(self, card_id: Optional[str]) -> Optional[str]:
+        if not card_id:
+            return None
+        if card_id not in self._file_ids:
+            try:
+                self._file_ids[card_id] = await adb.get_card_file_id(card_id)
+            except Exception as e:
+                logger.error(f"Ошибка чтения file_id карты {card_id}: {e}")
+                return None
+        return self._file_ids[card_id]
+
+    async def remember(self, card_id: Optional[str], message) -> Optional[str]:
+        """Сохраняет file_id самой большой версии фото из отправленного сообщения"""
+        photos = getattr(message, 'photo', None)
+        if not card_id or not photos:
+            return None
+        file_id = photos[-1].file_id
+        if self._file_ids.get(card_id) != file_id:
+            self._file_ids[card_id] = file_id
+            try:
+                await adb.save_card_file_id(card_id, file_id)
+            except Exception as e:
+                logger.error(f"Ошибка сохранения file_id карты {card_id}: {e}")
+            logger.debug(f"🖼️ file_id карты {card_id} сохранён")
+        return file_id
+
+    async def forget(self, card_id: str):
+        self._file_ids[card_id] = None
+        try:
+            await adb.delete_card_file_id(card_id)
+        except Exception as e:
+            logger.error(f"Ошибка удаления file_id карты {card_id}: {e}")
+
+    async def send_photo(self, bot, card_id: Optional[str], image_url: str, **kwargs):
+        """
+        bot.send_photo с картинкой карты.
+
+        Если file_id уже есть — отправляет по нему; если Telegram отклонил
+        именно file_id, забывает его и загружает картинку заново: скачанными
+        байтами, если они есть в кеше, иначе по URL. Прочие BadRequest
+        (чат не найден, подпись и т.п.) пробрасываются без изменений.
+        """
+        file_id = await self.file_id(card_id)
+        if file_id:
+            try:
+                msg = await bot.send_photo(photo=file_id, **kwargs)
+                self.reuses += 1
+                return msg
+            except BadRequest as e:
+                if not _is_file_id_error(e):
+                    raise
+                logger.warning(f"⚠️ file_id карты {card_id} отклонён ({e}), загружаем картинку заново")
+                await self.forget(card_id)
+
+        image_bytes = get_card_images().peek(image_url)
+        if image_bytes:
+            ext = os.path.splitext(urlparse(image_url).path)[1] or '.jpg'
+            photo = InputFile(image_bytes, filename=f"card_{card_id or 'image'}{ext}")
+        else:
+            photo = image_url
+        msg = await bot.send_photo(photo=photo, **kwargs)
+        self.uploads += 1
+        await self.remember(card_id, msg)
+        return msg
+
+    def format_stats(self) -> str:
+        return f"загрузок картинки {self.uploads}, по file_id {self.reuses}"
+
+
+# Глобальный экземпляр хранилища
+_media_instance: Optional[CardMediaStore] = None
+
+
+def get_card_media() -> CardMediaStore:
+    """Возвращает глобальное хранилище file_id картинок карт"""
+    global _media_instance
+    if _media_instance is None:
+        _media_instance = CardMediaStore()
+    return _media_instance
@@ -6,22 +6,70 @@
   • Добавлено больше логирования для отладки
   • TELEGRAM_GROUP_ID конвертируется в int
 """
+import asyncio
+import hashlib
 import logging
+import time
 import re
 import json
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple, List, Callable, Awaitable
 
 import requests
 from bs4 import BeautifulSoup
 from telegram.constants import ParseMode
-
-from config.settings import BASE_URL, REQUEST_TIMEOUT
+from telegram.error import BadRequest, RetryAfter
+
+from config.settings import (
+    BASE_URL, REQUEST_TIMEOUT, CARD_MONITOR_HTTP_MODE, CARD_ENRICH_CONCURRENCY,
+    CARD_NOTIFY_PROGRESSIVE, CARD_CAPTION_EDIT_INTERVAL, CARD_POLL_BASE_INTERVAL
+)
+from database import async_db as adb
+from utils.async_http import AsyncSiteClient
+from utils.card_cache import get_card_cache, COUNT_FIELDS
+from utils.card_images import get_card_images
+from utils.rank_cache import get_rank_cache
+from utils.card_media import get_card_media
+from utils.notification_dispatcher import retry_after_seconds
+from utils.nickname_cache import get_nickname_cache
+from utils.ownership_index import get_ownership_index
+from utils.single_flight import SingleFlightJob
 
 logger = logging.getLogger(__name__)
 
 BOOST_URL = f"{BASE_URL}/clubs/klub-taro-2/boost"
 
+# Окно страницы boost, которое хешируется для обнаружения изменений:
+# от первого блока club-boost до конца последнего элемента club-boost__*
+# (csrf-токены и прочий шум в <head>/<footer> сюда не попадают)
+BOOST_WINDOW_START = b'club-boost'
+BOOST_WINDOW_LAST = b'club-boost__'
+# Изменчивые значения внутри окна, не влияющие на данные карты
+BOOST_VOLATILE_RE = re.compile(rb'(name="_token"[^>]*?value=")[^"]*')
+BOOST_CARD_ID_RE = re.compile(rb'/cards/(\d+)/users')
+
+# Как часто писать в лог статистику опроса (в тиках)
+POLL_STATS_LOG_EVERY = 300
+
+# Заглушка в подписи для ещё не загруженных полей
+CAPTION_PENDING = "⏳"
+
+
+# ═════════════════════════════════════════════════════════════
+# СНИМОК СТРАНИЦЫ BOOST
+# ═════════════════════════════════════════════════════════════
+
+@dataclass
+class BoostSnapshot:
+    """Всё, что видно на странице boost за одну загрузку и один парсинг"""
+    card_id: str
+    card_image_url: Optional[str]
+    card_progress: str
+    daily_donated: str
+    club_owners: List[Dict] = field(default_factory=list)  # [{'id', 'url'}]
+    fetched_at: datetime = field(default_factory=datetime.now)
+
 
 # ═════════════════════════════════════════════════════════════
 # КЛАСС МОНИТОРА (без изменений)
@@ -30,19 +78,51 @@ BOOST_URL = f"{BASE_URL}/clubs/klub-taro-2/boost"
 class CardMonitor:
     """Мониторинг карт клуба на MangaBuff"""
 
-    def __init__(self, session: requests.Session):
+    def __init__(self, session: requests.Session, http_mode: str = CARD_MONITOR_HTTP_MODE):
         self.session = session
         self.last_card_id: Optional[str] = None
         self.initialized: bool = False
 
-        # Детектор ранга — инициализируем сразу
+        # HTTP-движок: в режиме 'async' запросы не блокируют event loop
+        self.http_mode = http_mode
+        self.http: Optional[AsyncSiteClient] = (
+            AsyncSiteClient(session) if http_mode == 'async' else None
+        )
+        logger.info(f"CardMonitor: HTTP режим '{http_mode}'")
+
+        # Ограничение одновременных запросов при параллельном обогащении
+        self._http_slots = asyncio.Semaphore(CARD_ENRICH_CONCURRENCY)
+
+        # Обнаружение изменений страницы boost
+        self._boost_etag: Optional[str] = None
+        self._boost_last_modified: Optional[str] = None
+        self._boost_digest: Optional[bytes] = None
+        self._boost_html: Optional[str] = None
+        self._snapshot: Optional[BoostSnapshot] = None
+        # Результат последнего запроса boost (для планировщика опроса):
+        # None — ответа не было (сетевая ошибка)
+        self.last_status: Optional[int] = None
+        self.last_retry_after: Optional[float] = None
+        self.poll_stats: Dict[str, int] = {
+            'ticks': 0,          # запросов страницы boost
+            'not_modified': 0,   # ответ 304 (условный запрос)
+            'hash_hits': 0,      # тело не изменилось по хешу окна
+            'parsed': 0,         # DOM-парсингов
+            'bytes': 0,          # принято байт тела
+        }
+
+        # Распознано рангов с малым отрывом от второго (RankResult.confident)
+        self.low_confidence_ranks = 0
+
+        # Детектор ранга — шаблоны загружаются в post_init (main.py)
         try:
             from utils.rank_detector import RankDetector
             self.rank_detector = RankDetector()
-            if self.rank_detector.is_ready:
+            template_files = self.rank_detector.template_files()
+            if template_files:
                 logger.info(
-                    f"✅ RankDetector готов. Доступные ранги: "
-                    f"{', '.join(self.rank_detector.available_ranks)}"
+                    f"✅ RankDetector: {len(template_files)} шаблонов в ranks/, "
+                    f"загрузка при старте бота"
                 )
             else:
                 logger.warning(
@@ -54,140 +134,434 @@ class CardMonitor:
             logger.error(f"Ошибка инициализации RankDetector: {e}")
             self.rank_detector = None
 
+    def claim_card(self, card_id: str) -> bool:
+        """
+        Делает карту текущей.
+
+        Вызывается до первого await в обработке карты, поэтому одна и та же
+        смена не будет обработана дважды, даже если тики пересекутся.
+
+        Returns:
+            False, если эта карта уже текущая (обрабатывать нечего)
+        """
+        if self.initialized and card_id == self.last_card_id:
+            return False
+        self.initialized = True
+        self.last_card_id = card_id
+        return True
+
+    # ──────────────────────────────────────────────────────────
+    # HTTP
+    # ──────────────────────────────────────────────────────────
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """
+        GET-запрос к сайту.
+
+        В режиме 'async' — через пул httpx без блокировки event loop,
+        в режиме 'sync' — старый блокирующий requests.Session.get.
+        Оба ответа имеют status_code / text / content / headers.
+        Число одновременных запросов ограничено CARD_ENRICH_CONCURRENCY.
+        """
+        async with self._http_slots:
+            if self.http is not None:
+                return await self.http.get(url, headers=headers)
+            return self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    async def aclose(self):
+        """Закрывает пул соединений"""
+        if self.http is not None:
+            await self.http.aclose()
+
+    # ──────────────────────────────────────────────────────────
+    # ОБНАРУЖЕНИЕ ИЗМЕНЕНИЙ СТРАНИЦЫ BOOST
+    # ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _boost_window_digest(body: bytes) -> bytes:
+        """
+        Хеш значимой части страницы boost.
+
+        В ключ входит и ID карты, найденный регуляркой по сырым байтам,
+        поэтому смена карты не потеряется, даже если разметка окна изменится.
+        """
+        start = body.find(BOOST_WINDOW_START)
+        last = body.rfind(BOOST_WINDOW_LAST)
+        if start == -1 or last == -1:
+            window = body
+        else:
+            end = body.find(b'</', last)
+            window = body[start:end if end != -1 else len(body)]
+        window = BOOST_VOLATILE_RE.sub(rb'\1', window)
+
+        m = BOOST_CARD_ID_RE.search(body)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(m.group(1) if m else b'-')
+        h.update(window)
+        return h.digest()
+
+    async def _fetch_boost(self) -> Optional[Tuple[str, bool]]:
+        """
+        Загружает страницу boost с условными заголовками.
+
+        Returns:
+            (html, changed) — changed=False, если сервер ответил 304
+            или хеш окна совпал с предыдущим (html тогда — прошлый).
+            None при ошибке загрузки.
+        """
+        headers = {}
+        if self._boost_etag:
+            headers['If-None-Match'] = self._boost_etag
+        if self._boost_last_modified:
+            headers['If-Modified-Since'] = self._boost_last_modified
+
+        self.last_status = None
+        self.last_retry_after = None
+        r = await self._get(BOOST_URL, headers=headers or None)
+        self.poll_stats['ticks'] += 1
+        self.last_status = r.status_code
+        retry_after = r.headers.get('Retry-After')
+        if retry_after and retry_after.strip().isdigit():
+            self.last_retry_after = float(retry_after)
+
+        if r.status_code == 304 and self._boost_html is not None:
+            self.poll_stats['not_modified'] += 1
+            return self._boost_html, False
+
+        if r.status_code != 200:
+            logger.warning(f"Ошибка загрузки boost ({r.status_code})")
+            return None
+
+        self._boost_etag = r.headers.get('ETag')
+        self._boost_last_modified = r.headers.get('Last-Modified')
+
+        body = r.content
+        self.poll_stats['bytes'] += len(body)
+
+        digest = self._boost_window_digest(body)
+        if digest == self._boost_digest and self._boost_html is not None:
+            self.poll_stats['hash_hits'] += 1
+            return self._boost_html, False
+
+        self._boost_digest = digest
+        self._boost_html = r.text
+        return self._boost_html, True
+
+    def format_poll_stats(self) -> str:
+        """Статистика опроса страницы boost для логов"""
+        st = self.poll_stats
+        ticks = st['ticks'] or 1
+        skipped = st['not_modified'] + st['hash_hits']
+        return (
+            f"запросов {st['ticks']}, пропущено без парсинга {skipped} "
+            f"({skipped * 100 / ticks:.1f}%: 304={st['not_modified']}, хеш={st['hash_hits']}), "
+            f"DOM-парсингов {st['parsed']}, "
+            f"в среднем {st['bytes'] / ticks / 1024:.1f} КБ/запрос"
+        )
+
     # ... (все остальные методы без изменений)
     
-    def get_current_card_id(self) -> Optional[str]:
-        """Загружает страницу boost и возвращает только ID карты"""
+    @staticmethod
+    def _parse_snapshot(html: str) -> Optional['BoostSnapshot']:
+        """Разбирает страницу boost: всё, что есть на ней без доп. запросов"""
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # 1. ID карты
+        link = soup.find('a', href=re.compile(r'/cards/\d+/users'))
+        card_id = None
+        if link:
+            m = re.search(r'/cards/(\d+)/', link.get('href', ''))
+            if m:
+                card_id = m.group(1)
+
+        if not card_id:
+            logger.warning("ID карты не найден на странице boost")
+            return None
+
+        # 2. Картинка карты
+        img_tag = soup.find('img', src=re.compile(r'/img/cards/'))
+        card_image_url = (BASE_URL + img_tag['src']) if img_tag else None
+
+        # 3. Замен карты
+        card_progress = '?/?'
+        change_div = soup.find('div', class_='club-boost__change')
+        if change_div:
+            inner = change_div.find('div')
+            if inner:
+                raw = inner.get_text(separator='', strip=True)
+                card_progress = re.sub(r'\s+', '', raw)
+
+        # 4. Вложено сегодня
+        daily_donated = '?/?'
+        rules_ul = soup.find('ul', class_='club-boost__rules')
+        if rules_ul:
+            for li in rules_ul.find_all('li'):
+                m = re.search(r'пожертвовать до\s+(\d+/\d+)\s+карт', li.get_text())
+                if m:
+                    daily_donated = m.group(1)
+                    break
+
+        # 5. Владельцы из клуба (ники подгружаются при обогащении)
+        club_owners = []
+        owners_section = soup.find('div', class_='club-boost__owners')
+        if owners_section:
+            owners_list = owners_section.find('div', class_='club-boost__owners-list')
+            if owners_list:
+                for user_div in owners_list.find_all('div', class_='club-boost__user'):
+                    a = user_div.find('a', class_='club-boost__avatar')
+                    if a:
+                        href = a.get('href', '')
+                        uid_m = re.search(r'/users/(\d+)', href)
+                        if uid_m:
+                            club_owners.append({
+                                'id': uid_m.group(1),
+                                'url': f"{BASE_URL}{href}",
+                            })
+
+        return BoostSnapshot(
+            card_id=card_id,
+            card_image_url=card_image_url,
+            card_progress=card_progress,
+            daily_donated=daily_donated,
+            club_owners=club_owners,
+            fetched_at=datetime.now(),
+        )
+
+    async def fetch_snapshot(self) -> Optional['BoostSnapshot']:
+        """
+        Быстрая проверка: одна загрузка и (если страница изменилась)
+        один парсинг boost. Снимок затем передаётся в parse_boost_page.
+        """
         try:
-            r = self.session.get(BOOST_URL, timeout=REQUEST_TIMEOUT)
-            if r.status_code != 200:
-                logger.warning(f"Ошибка загрузки boost ({r.status_code})")
+            fetched = await self._fetch_boost()
+            if fetched is None:
                 return None
 
-            soup = BeautifulSoup(r.text, 'html.parser')
-            link = soup.find('a', href=re.compile(r'/cards/\d+/users'))
-            if link:
-                m = re.search(r'/cards/(\d+)/', link.get('href', ''))
-                if m:
-                    return m.group(1)
+            html, changed = fetched
+            if not changed and self._snapshot is not None:
+                return self._snapshot
 
-            logger.warning("ID карты не найден на странице boost")
-            return None
+            self.poll_stats['parsed'] += 1
+            self._snapshot = self._parse_snapshot(html)
+            return self._snapshot
 
         except Exception as e:
             logger.error(f"Ошибка быстрой проверки ID карты: {e}")
             return None
 
-    def parse_boost_page(self) -> Optional[Dict]:
-        """Полный парсинг страницы boost"""
+    async def get_current_card_id(self) -> Optional[str]:
+        """Загружает страницу boost и возвращает только ID карты"""
+        snapshot = await self.fetch_snapshot()
+        return snapshot.card_id if snapshot else None
+
+    @staticmethod
+    def snapshot_data(snapshot: 'BoostSnapshot') -> Dict:
+        """Частичные данные карты — только то, что есть в снимке boost"""
+        return {
+            'card_id':        snapshot.card_id,
+            'card_image_url': snapshot.card_image_url,
+            'card_progress':  snapshot.card_progress,
+            'daily_donated':  snapshot.daily_donated,
+            'club_owners':    [dict(o) for o in snapshot.club_owners],
+            'timestamp':      snapshot.fetched_at,
+        }
+
+    async def parse_boost_page(
+        self,
+        snapshot: Optional['BoostSnapshot'] = None,
+        on_update: Optional[Callable[[Dict], Awaitable]] = None,
+    ) -> Optional[Dict]:
+        """
+        Полные данные карты.
+
+        Строится поверх снимка boost; если снимок не передан,
+        страница загружается заново. Доп. запросы (ранг, название,
+        количества, ники) выполняются параллельно, время каждого шага
+        в миллисекундах кладётся в result['timings'].
+
+        В режиме 'sync' запросы блокирующие, и шаги фактически идут
+        последовательно.
+
+        on_update(data) вызывается после каждого шага с частично
+        заполненными данными (для прогрессивного уведомления).
+
+        Для уже встречавшейся карты название, ранг и ещё свежие
+        количества берутся из кеша (utils.card_cache) без запросов.
+        """
         try:
-            r = self.session.get(BOOST_URL, timeout=REQUEST_TIMEOUT)
-            if r.status_code != 200:
-                logger.warning(f"Ошибка загрузки boost: {r.status_code}")
+            if snapshot is None:
+                snapshot = await self.fetch_snapshot()
+            if snapshot is None:
+                logger.warning("Не удалось получить снимок страницы boost")
                 return None
 
-            soup = BeautifulSoup(r.text, 'html.parser')
+            card_id = snapshot.card_id
+            data = self.snapshot_data(snapshot)
+            timings: Dict[str, float] = {}
+            started = time.perf_counter()
+
+            cached = await get_card_cache().fresh_fields(card_id)
+            data.update(cached)
+            if cached and on_update:
+                await on_update(data)
+
+            # Количества, которые не удалось обновить (ошибка запроса)
+            stale_counts: set = set()
+
+            # Шаги: (имя, ключ в data, фабрика корутины)
+            steps = [
+                ('rank', 'card_rank', lambda: self._get_rank(snapshot.card_image_url)),
+                ('name', 'card_name', lambda: self._get_card_name(card_id)),
+                ('wants_count', 'wants_count', lambda: self._get_count_or_last(
+                    card_id, 'wants_count', stale_counts,
+                    f"{BASE_URL}/cards/{card_id}/offers/want", 'profile__friends-item', per_page=60
+                )),
+                ('owners_count', 'owners_count', lambda: self._get_count_or_last(
+                    card_id, 'owners_count', stale_counts,
+                    f"{BASE_URL}/cards/{card_id}/users", 'profile__friends-item', per_page=36
+                )),
+                ('nicknames', 'club_owners', lambda: self._get_owner_nicknames(snapshot.club_owners)),
+            ]
+            pending = [(name, key, factory) for name, key, factory in steps if key not in cached]
+
+            await asyncio.gather(*(
+                self._enrich_step(data, timings, name, key, factory(), on_update)
+                for name, key, factory in pending
+            ))
+
+            if any(key in COUNT_FIELDS for _, key, _ in pending):
+                # Не обновлённые количества не продлевают свежесть —
+                # при следующей встрече карты они загрузятся снова
+                data['counts_updated_at'] = (
+                    await get_card_cache().last_value(card_id, 'counts_updated_at') if stale_counts else time.time()
+                )
 
-            # 1. ID карты
-            link = soup.find('a', href=re.compile(r'/cards/\d+/users'))
-            card_id = None
-            if link:
-                m = re.search(r'/cards/(\d+)/', link.get('href', ''))
-                if m:
-                    card_id = m.group(1)
+            timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+            from_cache = [name for name, key, _ in steps if key in cached]
+            logger.info(
+                f"⏱️ Обогащение карты {card_id}: "
+                + ", ".join(f"{name}={ms:.0f} мс" for name, ms in timings.items())
+                + (f"; из кеша: {', '.join(from_cache)}" if from_cache else "")
+            )
 
-            if not card_id:
-                logger.warning("Не удалось найти ID карты при полном парсинге")
-                return None
+            data['timestamp'] = datetime.now()
+            data['timings'] = timings
+            return data
 
-            # 2. Картинка карты
-            img_tag = soup.find('img', src=re.compile(r'/img/cards/'))
-            card_image_url = (BASE_URL + img_tag['src']) if img_tag else None
+        except Exception as e:
+            logger.error(f"Ошибка полного парсинга boost: {e}", exc_info=True)
+            return None
 
-            # 3. Ранг карты
-            card_rank = "?"
-            if card_image_url and self.rank_detector and self.rank_detector.is_ready:
-                card_rank = self.rank_detector.detect_from_url(
-                    card_image_url, session=self.session
-                )
+    @staticmethod
+    async def _timed(timings: Dict[str, float], step: str, coro):
+        """Выполняет шаг обогащения и записывает его длительность (мс)"""
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[step] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _enrich_step(self, data: Dict, timings: Dict[str, float], name: str,
+                           key: str, coro, on_update: Optional[Callable[[Dict], Awaitable]]):
+        """Шаг обогащения: кладёт результат в data[key] и сообщает о нём"""
+        data[key] = await self._timed(timings, name, coro)
+        if on_update is not None:
+            try:
+                await on_update(data)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика обновления ({name}): {e}")
+
+    async def _get_rank(self, image_url: Optional[str]) -> str:
+        """Ранг карты (или '?', если детектор недоступен)"""
+        if self.rank_detector:
+            self.rank_detector.reload_if_changed()
+        if not image_url or not self.rank_detector or not self.rank_detector.is_ready:
+            return "?"
+        return await self._detect_rank(image_url)
+
+    async def _get_owner_nicknames(self, owners: List[Dict]) -> List[Dict]:
+        """Параллельно подгружает ники владельцев карты из клуба (через кеш)"""
+        cache = get_nickname_cache()
+        nicknames = await asyncio.gather(
+            *(cache.get(owner['url'], fetcher=self._get_nickname) for owner in owners)
+        )
+        return [
+            {
+                'id': owner['id'],
+                'url': owner['url'],
+                'nickname': nickname or f"User {owner['id']}",
+            }
+            for owner, nickname in zip(owners, nicknames)
+        ]
+
+    async def fetch_card_image(self, image_url: Optional[str]) -> Optional[bytes]:
+        """
+        Байты картинки карты. Скачиваются один раз и общие для
+        RankDetector и загрузки в Telegram (utils.card_images).
+        """
+        if not image_url:
+            return None
+        return await get_card_images().fetch(image_url, self._download_image)
 
-            # 4. Замен карты
-            card_progress = '?/?'
-            change_div = soup.find('div', class_='club-boost__change')
-            if change_div:
-                inner = change_div.find('div')
-                if inner:
-                    raw = inner.get_text(separator='', strip=True)
-                    card_progress = re.sub(r'\s+', '', raw)
-
-            # 5. Вложено сегодня
-            daily_donated = '?/?'
-            rules_ul = soup.find('ul', class_='club-boost__rules')
-            if rules_ul:
-                for li in rules_ul.find_all('li'):
-                    m = re.search(r'пожертвовать до\s+(\d+/\d+)\s+карт', li.get_text())
-                    if m:
-                        daily_donated = m.group(1)
-                        break
-
-            # 6. Название карты
-            card_name = self._get_card_name(card_id)
-
-            # 7-8. Количества
-            wants_count = self._get_count(
-                f"{BASE_URL}/cards/{card_id}/offers/want", 'profile__friends-item', per_page=60
-            )
-            owners_count = self._get_count(
-                f"{BASE_URL}/cards/{card_id}/users", 'profile__friends-item', per_page=36
-            )
+    async def _download_image(self, image_url: str) -> Optional[bytes]:
+        r = await self._get(image_url)
+        if r.status_code != 200:
+            logger.warning(f"Ошибка загрузки изображения карты: {r.status_code}")
+            return None
+        return r.content
 
-            # 9. Владельцы из клуба
-            club_owners = []
-            owners_section = soup.find('div', class_='club-boost__owners')
-            if owners_section:
-                owners_list = owners_section.find('div', class_='club-boost__owners-list')
-                if owners_list:
-                    for user_div in owners_list.find_all('div', class_='club-boost__user'):
-                        a = user_div.find('a', class_='club-boost__avatar')
-                        if a:
-                            href = a.get('href', '')
-                            uid_m = re.search(r'/users/(\d+)', href)
-                            if uid_m:
-                                profile_id = uid_m.group(1)
-                                profile_url = f"{BASE_URL}{href}"
-                                
-                                from utils.helpers import get_site_nickname
-                                nickname = get_site_nickname(profile_url)
-                                
-                                club_owners.append({
-                                    'id': profile_id,
-                                    'url': profile_url,
-                                    'nickname': nickname or f"User {profile_id}"
-                                })
-
-            return {
-                'card_id':        card_id,
-                'card_name':      card_name,
-                'card_rank':      card_rank,
-                'card_image_url': card_image_url,
-                'card_progress':  card_progress,
-                'daily_donated':  daily_donated,
-                'wants_count':    wants_count,
-                'owners_count':   owners_count,
-                'club_owners':    club_owners,
-                'timestamp':      datetime.now(),
-            }
+    async def _detect_rank(self, image_url: str) -> str:
+        """
+        Определяет ранг по картинке карты.
 
+        Сначала кеш рангов по URL (без загрузки картинки), затем по хешу
+        скачанной картинки, и только потом сравнение с шаблонами.
+        Неуверенный результат (малый отрыв от второго ранга) попадает
+        в лог — вероятно, для этого дизайна рамки нужен новый шаблон.
+        """
+        try:
+            ranks = get_rank_cache(self.rank_detector)
+            cached = await ranks.by_url(image_url)
+            if cached:
+                return cached.rank
+
+            image_bytes = await self.fetch_card_image(image_url)
+            if not image_bytes:
+                return "?"
+
+            cached = await ranks.by_content(image_bytes, image_url)
+            if cached:
+                return cached.rank
+
+            result = self.rank_detector.detect_details_from_bytes(image_bytes)
+            if not result:
+                return "?"
+            await ranks.store(result, image_bytes, image_url)
+            if result.rank != "?" and not result.confident:
+                self.low_confidence_ranks += 1
+                logger.warning(f"⚠️ Неуверенный ранг: {result.format()}, картинка {image_url}")
+            return result.rank
         except Exception as e:
-            logger.error(f"Ошибка полного парсинга boost: {e}", exc_info=True)
+            logger.error(f"Ошибка определения ранга ({image_url}): {e}")
+            return "?"
+
+    async def _get_nickname(self, profile_url: str) -> Optional[str]:
+        """Ник владельца карты со страницы профиля"""
+        from utils.helpers import parse_site_nickname
+        try:
+            r = await self._get(profile_url)
+            if r.status_code != 200:
+                logger.warning(f"Профиль недоступен при получении ника: {r.status_code}")
+                return None
+            return parse_site_nickname(r.text)
+        except Exception as e:
+            logger.error(f"Ошибка получения ника ({profile_url}): {e}")
             return None
 
-    def _get_card_name(self, card_id: str) -> str:
+    async def _get_card_name(self, card_id: str) -> str:
         """Получает название карты"""
         try:
-            r = self.session.get(
-                f"{BASE_URL}/cards/{card_id}/offers/want", timeout=REQUEST_TIMEOUT
-            )
+            r = await self._get(f"{BASE_URL}/cards/{card_id}/offers/want")
             if r.status_code == 200:
                 soup = BeautifulSoup(r.text, 'html.parser')
                 title = soup.find('h2', class_='secondary-title')
@@ -199,12 +573,27 @@ class CardMonitor:
             logger.error(f"Ошибка получения названия карты {card_id}: {e}")
         return "Неизвестная карта"
 
-    def _get_count(self, url: str, item_class: str, per_page: int = 60) -> int:
-        """Считает элементы по всем страницам"""
+    async def _get_count_or_last(self, card_id: str, field: str, stale: set,
+                                 url: str, item_class: str, per_page: int = 60) -> Optional[int]:
+        """
+        _get_count; при ошибке — прежнее значение из кеша карт (или None,
+        если карта встречается впервые). Поле добавляется в stale.
+        """
+        count = await self._get_count(url, item_class, per_page)
+        if count is None:
+            stale.add(field)
+            count = await get_card_cache().last_value(card_id, field)
+            if count is not None:
+                logger.warning(f"⚠️ {field} карты {card_id} не обновлён, показываем прежнее значение: {count}")
+        return count
+
+    async def _get_count(self, url: str, item_class: str, per_page: int = 60) -> Optional[int]:
+        """Считает элементы по всем страницам; None — ошибка запроса"""
         try:
-            r = self.session.get(url, timeout=REQUEST_TIMEOUT)
+            r = await self._get(url)
             if r.status_code != 200:
-                return 0
+                logger.warning(f"Ошибка подсчёта элементов ({url}): HTTP {r.status_code}")
+                return None
 
             soup = BeautifulSoup(r.text, 'html.parser')
             pages = self._get_page_count(soup)
@@ -212,16 +601,17 @@ class CardMonitor:
             if pages == 1:
                 return len(soup.find_all('a', class_=item_class))
 
-            last_r = self.session.get(f"{url}?page={pages}", timeout=REQUEST_TIMEOUT)
+            last_r = await self._get(f"{url}?page={pages}")
             if last_r.status_code != 200:
-                return (pages - 1) * per_page
+                logger.warning(f"Ошибка подсчёта элементов ({url}?page={pages}): HTTP {last_r.status_code}")
+                return None
 
             last_soup = BeautifulSoup(last_r.text, 'html.parser')
             return (pages - 1) * per_page + len(last_soup.find_all('a', class_=item_class))
 
         except Exception as e:
             logger.error(f"Ошибка подсчёта элементов ({url}): {e}")
-            return 0
+            return None
 
     @staticmethod
     def _get_page_count(soup: BeautifulSoup) -> int:
@@ -248,7 +638,12 @@ class CardMonitor:
             else "🎴 <b>Текущая карта клуба</b>"
         )
 
-        rank = data.get('card_rank', '?')
+        rank = data.get('card_rank', CAPTION_PENDING)
+        # None — количество не удалось загрузить
+        owners_count, wants_count = (
+            "?" if count is None else count
+            for count in (data.get('owners_count', CAPTION_PENDING), data.get('wants_count', CAPTION_PENDING))
+        )
 
         if data.get('club_owners'):
             owners_lines = "\n".join(
@@ -269,9 +664,10 @@ class CardMonitor:
 
         return (
             f"{header}\n"
-            f"<b>{data['card_name']}</b>\n"
+            f"<b>{data.get('card_name', CAPTION_PENDING)}</b>\n"
             f"ID: {data['card_id']} | Ранг: {rank}\n\n"
-            f"👥 Владельцев: {data['owners_count']} | Желающих: {data['wants_count']}\n"
+            f"👥 Владельцев: {owners_count} | "
+            f"Желающих: {wants_count}\n"
             f"📅 Вложено сегодня: {data['daily_donated']}\n"
             f"🎯 Замен: {data['card_progress']}\n"
             f"{club_block}\n\n"
@@ -287,7 +683,10 @@ class CardMonitor:
         data: Dict,
         is_changed: bool = False,
     ):
-        """Отправляет ОДНО сообщение: фото карты + подпись"""
+        """
+        Отправляет ОДНО сообщение: фото карты + подпись.
+        Возвращает отправленное сообщение (или None при ошибке).
+        """
         caption = self.format_caption(data, is_changed)
 
         kwargs = dict(parse_mode=ParseMode.HTML)
@@ -300,9 +699,9 @@ class CardMonitor:
         try:
             if data.get('card_image_url'):
                 logger.debug(f"Отправка фото: {data['card_image_url']}")
-                msg = await bot.send_photo(
+                msg = await get_card_media().send_photo(
+                    bot, data.get('card_id'), data['card_image_url'],
                     chat_id=chat_id,
-                    photo=data['card_image_url'],
                     caption=caption,
                     **kwargs,
                 )
@@ -330,6 +729,96 @@ class CardMonitor:
                 logger.info(f"✅ Fallback успешен (msg_id={msg.message_id})")
             except Exception as e2:
                 logger.error(f"❌ Fallback тоже failed: {e2}", exc_info=True)
+                return None
+
+        return msg
+
+
+# ═════════════════════════════════════════════════════════════
+# ПРОГРЕССИВНОЕ УВЕДОМЛЕНИЕ В ГРУППУ
+# ═════════════════════════════════════════════════════════════
+
+class ProgressiveCaption:
+    """
+    Второй этап прогрессивного уведомления.
+
+    Правит подпись уже отправленного сообщения по мере поступления
+    данных карты. Правки схлопываются: не чаще одной за min_interval,
+    всегда с самыми свежими данными.
+    """
+
+    def __init__(self, bot, message, is_changed: bool,
+                 min_interval: float = CARD_CAPTION_EDIT_INTERVAL):
+        self.bot = bot
+        self.message = message
+        self.is_changed = is_changed
+        self.min_interval = min_interval
+        self.edits = 0
+        self._last_caption: Optional[str] = None
+        self._last_edit = time.monotonic()
+        self._pending: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def update(self, data: Dict):
+        """Запоминает свежие данные и планирует правку"""
+        self._pending = dict(data)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def finish(self, data: Optional[Dict] = None):
+        """Дожидается последней правки (с финальными данными, если они есть)"""
+        if data is not None:
+            await self.update(data)
+        if self._task is not None:
+            await self._task
+
+    async def _flush(self):
+        while self._pending is not None:
+            wait = self._last_edit + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            data, self._pending = self._pending, None
+            await self._edit(data)
+
+    async def _edit(self, data: Dict):
+        caption = CardMonitor.format_caption(data, self.is_changed)
+        if caption == self._last_caption:
+            return
+
+        try:
+            if self.message.photo:
+                await self.bot.edit_message_caption(
+                    chat_id=self.message.chat_id,
+                    message_id=self.message.message_id,
+                    caption=caption,
+                    parse_mode=ParseMode.HTML,
+                )
+            else:
+                await self.bot.edit_message_text(
+                    chat_id=self.message.chat_id,
+                    message_id=self.message.message_id,
+                    text=caption,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                )
+            self.edits += 1
+            self._last_caption = caption
+        except RetryAfter as e:
+            # Flood control: повторяем после паузы, если за это время не пришли данные новее
+            delay = retry_after_seconds(e)
+            logger.warning(f"⏳ Правка подписи отложена на {delay:.0f} с (msg_id={self.message.message_id})")
+            if self._pending is None:
+                self._pending = data
+            self._last_edit = time.monotonic() + delay
+            return
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                self._last_caption = caption
+            else:
+                logger.error(f"❌ Ошибка правки подписи (msg_id={self.message.message_id}): {e}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка правки подписи (msg_id={self.message.message_id}): {e}")
+        self._last_edit = time.monotonic()
 
 
 # ═════════════════════════════════════════════════════════════
@@ -345,12 +834,17 @@ async def notify_card_owners(context, card_data):
     """
     Уведомляет пользователей бота, у которых есть нужная карта,
     с учётом их настроек уведомлений per-аккаунт.
+
+    Владельцы ищутся по индексу profile_id → аккаунты (utils.ownership_index),
+    поэтому стоимость рассылки зависит от числа владельцев карты,
+    а не от числа пользователей бота. Сообщения уходят параллельно
+    через NotificationDispatcher с учётом лимитов Telegram.
     """
-    import json
     import logging
-    from database.db import get_all_users, NOTIF_KEY_MAIN
+    from database.db import NOTIF_KEY_MAIN
     from config.settings import BASE_URL
     from telegram.constants import ParseMode
+    from utils.notification_dispatcher import get_notification_dispatcher
 
     logger = logging.getLogger(__name__)
     BOOST_URL = f"{BASE_URL}/clubs/klub-taro-2/boost"
@@ -363,90 +857,159 @@ async def notify_card_owners(context, card_data):
 
     logger.info(f"🔍 Проверяем {len(club_owner_ids)} владельцев карты среди пользователей бота")
 
-    bot_users = get_all_users()
-    logger.debug(f"📊 Всего пользователей бота: {len(bot_users)}")
-
-    notified_count = 0
-
-    for user in bot_users:
-        user_id = user['user_id']
-        main_profile_id = user.get('profile_id')
-        twinks_json = user.get('twinks')
-        # ✅ Настройки уведомлений (уже десериализованы в get_all_users)
-        notif_settings = user.get('notification_settings', {})
+    owners = await get_ownership_index().owners_of(club_owner_ids)
+    logger.debug(f"📊 Пользователей бота среди владельцев: {len(owners)}")
 
-        has_card = False
-        account_nickname = None
-        notif_key = None  # Ключ для проверки настройки уведомлений
+    media = get_card_media()
+    messages = []
+    recipients = []
 
-        # Проверяем основной аккаунт
-        if main_profile_id and main_profile_id in club_owner_ids:
-            has_card = True
-            account_nickname = user.get('site_nickname') or f"User {main_profile_id}"
-            notif_key = NOTIF_KEY_MAIN
-            logger.info(f"✅ Карта найдена у пользователя {user_id} (основной: {account_nickname})")
-
-        # Проверяем твинов
-        if not has_card and twinks_json:
-            try:
-                twinks = json.loads(twinks_json)
-                for twink in twinks:
-                    if twink.get('profile_id') in club_owner_ids:
-                        has_card = True
-                        account_nickname = twink.get('site_nickname') or f"User {twink.get('profile_id')}"
-                        notif_key = str(twink.get('profile_id'))
-                        logger.info(f"✅ Карта найдена у пользователя {user_id} (твин: {account_nickname})")
-                        break
-            except Exception as e:
-                logger.error(f"❌ Ошибка парсинга твинов для пользователя {user_id}: {e}")
-
-        if not has_card:
-            continue
+    for account in owners:
+        user_id = account.user_id
+        account_nickname = account.nickname
+        kind = 'основной' if account.notif_key == NOTIF_KEY_MAIN else 'твин'
+        logger.info(f"✅ Карта найдена у пользователя {user_id} ({kind}: {account_nickname})")
 
         # ✅ Проверяем, включены ли уведомления для этого аккаунта
-        notif_enabled = notif_settings.get(notif_key, True) if notif_key else True
-        if not notif_enabled:
-            logger.info(f"🔕 Уведомления выключены для пользователя {user_id}, аккаунт '{notif_key}' — пропускаем")
+        if not account.enabled:
+            logger.info(f"🔕 Уведомления выключены для пользователя {user_id}, аккаунт '{account.notif_key}' — пропускаем")
             continue
 
-        # Отправляем личное уведомление
-        try:
-            caption = (
-                f"🎴 <b>У вас есть нужная карта клуба!</b>\n\n"
-                f"<b>{card_data['card_name']}</b>\n"
-                f"ID: {card_data['card_id']} | Ранг: {card_data.get('card_rank', '?')}\n\n"
-                f"📍 Аккаунт: <b>{account_nickname}</b>\n"
-                f"🎯 Замен: {card_data['card_progress']}\n"
-                f"📅 Вложено сегодня: {card_data['daily_donated']}\n\n"
-                f"<a href='{BOOST_URL}'>🚀 Внести карту в клуб</a>\n\n"
-                f"<i>Управление уведомлениями: кнопка 🔔 Уведомления</i>"
-            )
+        caption = (
+            f"🎴 <b>У вас есть нужная карта клуба!</b>\n\n"
+            f"<b>{card_data['card_name']}</b>\n"
+            f"ID: {card_data['card_id']} | Ранг: {card_data.get('card_rank', '?')}\n\n"
+            f"📍 Аккаунт: <b>{account_nickname}</b>\n"
+            f"🎯 Замен: {card_data['card_progress']}\n"
+            f"📅 Вложено сегодня: {card_data['daily_donated']}\n\n"
+            f"<a href='{BOOST_URL}'>🚀 Внести карту в клуб</a>\n\n"
+            f"<i>Управление уведомлениями: кнопка 🔔 Уведомления</i>"
+        )
 
-            if card_data.get('card_image_url'):
-                await context.bot.send_photo(
-                    chat_id=user_id, photo=card_data['card_image_url'],
-                    caption=caption, parse_mode=ParseMode.HTML)
-            else:
-                await context.bot.send_message(
+        if card_data.get('card_image_url'):
+            def send(user_id=user_id, caption=caption):
+                return media.send_photo(
+                    context.bot, card_data['card_id'], card_data['card_image_url'],
+                    chat_id=user_id, caption=caption, parse_mode=ParseMode.HTML)
+        else:
+            def send(user_id=user_id, caption=caption):
+                return context.bot.send_message(
                     chat_id=user_id, text=caption,
                     parse_mode=ParseMode.HTML, disable_web_page_preview=True)
 
-            notified_count += 1
-            logger.info(f"✅ Уведомление отправлено пользователю {user_id} ({account_nickname})")
-
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки уведомления пользователю {user_id}: {e}", exc_info=True)
+        messages.append((user_id, send))
+        recipients.append(account)
 
-    if notified_count > 0:
-        logger.info(f"🎯 Отправлено {notified_count} личных уведомлений о карте {card_data['card_id']}")
-    else:
+    if not messages:
         logger.debug("📭 Пользователей бота с этой картой (с включёнными уведомлениями) не найдено")
+        return
 
+    monitor = context.bot_data.get('card_monitor')
+    if card_data.get('card_image_url') and not await media.file_id(card_data['card_id']) and monitor:
+        # Загружаем в Telegram уже скачанные байты, а не просим его качать по URL
+        await monitor.fetch_card_image(card_data['card_image_url'])
+
+    dispatcher = get_notification_dispatcher()
+    batch_name = f"уведомления о карте {card_data['card_id']}"
+    results = []
+    sent = 0
+    if card_data.get('card_image_url') and not await media.file_id(card_data['card_id']):
+        # Картинки ещё нет в Telegram: первое сообщение загружает её,
+        # остальные уходят уже по сохранённому file_id
+        first_stats, first_results = await dispatcher.send_batch(messages[:1], name=batch_name)
+        results += first_results
+        sent += first_stats.sent
+        messages = messages[1:]
+    stats, rest_results = await dispatcher.send_batch(messages, name=batch_name)
+    results += rest_results
+    sent += stats.sent
+
+    for account, result in zip(recipients, results):
+        if result is not None:
+            logger.info(f"✅ Уведомление отправлено пользователю {account.user_id} ({account.nickname})")
+
+    if sent > 0:
+        logger.info(f"🎯 Отправлено {sent} личных уведомлений о карте {card_data['card_id']} ({media.format_stats()})")
 
 # ═════════════════════════════════════════════════════════════
 # ✅ ИСПРАВЛЕННАЯ ФОНОВАЯ ЗАДАЧА
 # ═════════════════════════════════════════════════════════════
 
+async def _enrich_and_post(
+    context,
+    monitor: CardMonitor,
+    snapshot: BoostSnapshot,
+    group_id: int,
+    topic_id: Optional[int],
+    is_changed: bool,
+    post_to_group: bool,
+) -> Optional[Dict]:
+    """
+    Полный парсинг карты, сохранение в БД и публикация в группу.
+
+    В прогрессивном режиме (CARD_NOTIFY_PROGRESSIVE) сообщение с ID,
+    картинкой и ссылкой уходит сразу по снимку boost, а подпись
+    дописывается по мере загрузки остальных данных.
+    """
+    if post_to_group and not topic_id:
+        logger.warning("⚠️ CARD_TOPIC_ID не задан, пропускаем отправку в группу")
+        post_to_group = False
+
+    # Картинка нужна для загрузки в Telegram (пока нет file_id) и для
+    # определения ранга — скачивание начинается сразу, но этап 1 его не
+    # ждёт: если байтов ещё нет, Telegram получит картинку по URL
+    image_task: Optional[asyncio.Task] = None
+    if post_to_group and not await get_card_media().file_id(snapshot.card_id):
+        image_task = asyncio.create_task(monitor.fetch_card_image(snapshot.card_image_url))
+
+    caption_updater: Optional[ProgressiveCaption] = None
+    if post_to_group and CARD_NOTIFY_PROGRESSIVE:
+        logger.info(f"📤 Этап 1: публикация карты {snapshot.card_id} в группу {group_id}, топик {topic_id}")
+        msg = await monitor.send_notification(
+            context.bot, group_id, topic_id,
+            monitor.snapshot_data(snapshot), is_changed=is_changed
+        )
+        if msg:
+            caption_updater = ProgressiveCaption(context.bot, msg, is_changed)
+
+    logger.info("📊 Запуск полного парсинга...")
+    data = await monitor.parse_boost_page(
+        snapshot,
+        on_update=caption_updater.update if caption_updater else None,
+    )
+    if image_task:
+        # Обычно уже готово — ранг считался по тем же байтам
+        await image_task
+
+    if not data:
+        if caption_updater:
+            await caption_updater.finish()
+        return None
+
+    logger.info(
+        f"✅ Данные получены: {data.get('card_name')} "
+        f"(ранг {data.get('card_rank')})"
+    )
+
+    # Сохраняем в БД
+    await adb.save_club_card(data)
+    get_card_cache().remember(data)
+    context.bot_data['last_card_data'] = data
+    logger.info("💾 Карта сохранена в БД")
+
+    if caption_updater:
+        await caption_updater.finish(data)
+        logger.info(f"✏️ Этап 2: подпись дополнена ({caption_updater.edits} правок)")
+    elif post_to_group:
+        logger.info(f"📤 Отправка уведомления в группу {group_id}, топик {topic_id}")
+        await monitor.send_notification(
+            context.bot, group_id, topic_id,
+            data, is_changed=is_changed
+        )
+
+    return data
+
+
 async def card_monitoring_job(context):
     """
     Выполняется каждые 2 секунды
@@ -464,7 +1027,6 @@ async def card_monitoring_job(context):
         monitor: CardMonitor = context.bot_data['card_monitor']
 
         from config.settings import TELEGRAM_GROUP_ID
-        from database.db import save_club_card, is_club_card_saved
 
         CARD_TOPIC_ID = context.bot_data.get('card_topic_id')
         
@@ -477,58 +1039,51 @@ async def card_monitoring_job(context):
 
         # ── Шаг 1: быстрая проверка ID ──────────────────────────
         logger.debug("🔍 Быстрая проверка ID карты...")
-        current_id = monitor.get_current_card_id()
+        snapshot = await monitor.fetch_snapshot()
         
-        if not current_id:
+        if not snapshot:
             logger.warning("⚠️ Не удалось получить ID карты")
             return
 
+        current_id = snapshot.card_id
+
         logger.debug(f"📋 Текущая карта: {current_id}")
 
+        if monitor.poll_stats['ticks'] % POLL_STATS_LOG_EVERY == 0:
+            logger.info(f"📈 Опрос boost: {monitor.format_poll_stats()}")
+            logger.info(f"📈 Кеш ников: {get_nickname_cache().format_stats()}")
+            logger.info(f"📈 Кеш карт: {get_card_cache().format_stats()}")
+            logger.info(f"📈 Индекс владельцев: {get_ownership_index().format_stats()}")
+            if monitor.rank_detector and monitor.rank_detector.is_ready:
+                logger.info(
+                    f"📈 Кеш рангов: {get_rank_cache(monitor.rank_detector).format_stats()}, "
+                    f"неуверенных распознаваний {monitor.low_confidence_ranks}"
+                )
+
         # ── Первый запуск ────────────────────────────────────────
         if not monitor.initialized:
             logger.info("=" * 60)
             logger.info(f"🆕 ПЕРВЫЙ ЗАПУСК: Обработка карты {current_id}")
             logger.info("=" * 60)
             
-            monitor.initialized = True
-            monitor.last_card_id = current_id
+            monitor.claim_card(current_id)
 
             # ✅ ИСПРАВЛЕНИЕ: Проверяем наличие ПЕРЕД сохранением
-            was_in_db = is_club_card_saved(current_id)
+            was_in_db = await adb.is_club_card_saved(current_id)
             logger.info(f"💾 Карта в БД: {'Да' if was_in_db else 'Нет'}")
 
-            # Полный парсинг
-            logger.info("📊 Запуск полного парсинга...")
-            data = monitor.parse_boost_page()
+            # ✅ ИСПРАВЛЕНИЕ: Отправляем в группу ЕСЛИ карты НЕ БЫЛО в БД
+            if was_in_db:
+                logger.info("⏭️ Карта уже была в БД, пропускаем уведомление в группу (избегаем дублей)")
 
+            data = await _enrich_and_post(
+                context, monitor, snapshot, GROUP_ID, CARD_TOPIC_ID,
+                is_changed=False, post_to_group=not was_in_db,
+            )
             if not data:
                 logger.warning("⚠️ Не удалось получить данные карты при первом запуске")
                 return
 
-            logger.info(
-                f"✅ Данные получены: {data.get('card_name')} "
-                f"(ранг {data.get('card_rank')})"
-            )
-
-            # Сохраняем в БД
-            save_club_card(data)
-            context.bot_data['last_card_data'] = data
-            logger.info("💾 Карта сохранена в БД")
-
-            # ✅ ИСПРАВЛЕНИЕ: Отправляем ЕСЛИ карты НЕ БЫЛО в БД
-            if not was_in_db:
-                if CARD_TOPIC_ID:
-                    logger.info(f"📤 Отправка уведомления в группу {GROUP_ID}, топик {CARD_TOPIC_ID}")
-                    await monitor.send_notification(
-                        context.bot, GROUP_ID, CARD_TOPIC_ID,
-                        data, is_changed=False
-                    )
-                else:
-                    logger.warning("⚠️ CARD_TOPIC_ID не задан, пропускаем отправку в группу")
-            else:
-                logger.info("⏭️ Карта уже была в БД, пропускаем уведомление в группу (избегаем дублей)")
-
             # Уведомляем пользователей
             logger.info("👥 Проверка владельцев среди пользователей бота...")
             await notify_card_owners(context, data)
@@ -539,45 +1094,24 @@ async def card_monitoring_job(context):
             return
 
         # ── Карта не изменилась ──────────────────────────────────
-        if current_id == monitor.last_card_id:
+        previous_id = monitor.last_card_id
+        if not monitor.claim_card(current_id):
             logger.debug(f"⏭️ Карта не изменилась ({current_id}), пропускаем")
             return
 
         # ── Карта сменилась! ─────────────────────────────────────
         logger.info("=" * 60)
-        logger.info(f"🔄 СМЕНА КАРТЫ: {monitor.last_card_id} → {current_id}")
+        logger.info(f"🔄 СМЕНА КАРТЫ: {previous_id} → {current_id}")
         logger.info("=" * 60)
-        
-        monitor.last_card_id = current_id
 
-        # Полный парсинг
-        logger.info("📊 Запуск полного парсинга новой карты...")
-        data = monitor.parse_boost_page()
-        
+        data = await _enrich_and_post(
+            context, monitor, snapshot, GROUP_ID, CARD_TOPIC_ID,
+            is_changed=True, post_to_group=True,
+        )
         if not data:
             logger.warning("⚠️ Не удалось получить данные о новой карте")
             return
 
-        logger.info(
-            f"✅ Данные получены: {data.get('card_name')} "
-            f"(ранг {data.get('card_rank')})"
-        )
-
-        # Сохраняем
-        save_club_card(data)
-        context.bot_data['last_card_data'] = data
-        logger.info("💾 Карта сохранена в БД")
-
-        # Отправляем в группу
-        if CARD_TOPIC_ID:
-            logger.info(f"📤 Отправка уведомления о смене в группу {GROUP_ID}, топик {CARD_TOPIC_ID}")
-            await monitor.send_notification(
-                context.bot, GROUP_ID, CARD_TOPIC_ID,
-                data, is_changed=True
-            )
-        else:
-            logger.warning("⚠️ CARD_TOPIC_ID не задан, пропускаем отправку в группу")
-
         # Уведомляем пользователей
         logger.info("👥 Проверка владельцев среди пользователей бота...")
         await notify_card_owners(context, data)
@@ -590,4 +1124,11 @@ async def card_monitoring_job(context):
         logger.error("=" * 60)
         logger.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА в мониторинге карт: {e}")
         logger.error("=" * 60)
-        logger.exception(e)
\ No newline at end of file
+        logger.exception(e)
+
+
+# Тики мониторинга не пересекаются: пришедшие во время обработки
+# схлопываются в один повторный запуск сразу после неё
+guarded_card_monitoring_job = SingleFlightJob(
+    card_monitoring_job, name='card_monitoring', interval=CARD_POLL_BASE_INTERVAL
+)
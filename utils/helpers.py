@@ -121,6 +121,25 @@ def login_to_site() -> bool:
         return False
 
 
+def parse_site_nickname(html: str) -> Optional[str]:
+    """
+    Извлекает ник из HTML страницы профиля:
+    <div class="profile__name" data-name="your Kasandra" ...>your Kasandra</div>
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    
+    # Ищем div с классом profile__name
+    name_div = soup.find("div", class_="profile__name")
+    if not name_div:
+        return None
+    
+    # Берем текст из атрибута data-name или из самого div
+    nickname = name_div.get("data-name", "").strip()
+    if not nickname:
+        nickname = name_div.get_text(strip=True)
+    return nickname or None
+
+
 def get_site_nickname(profile_url: str) -> Optional[str]:
     """
     ✅ НОВАЯ ФУНКЦИЯ: Получает ник пользователя с сайта
@@ -149,20 +168,10 @@ def get_site_nickname(profile_url: str) -> Optional[str]:
             logger.warning(f"Профиль недоступен при получении ника: {response.status_code}")
             return None
         
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Ищем div с классом profile__name
-        name_div = soup.find("div", class_="profile__name")
-        
-        if name_div:
-            # Берем текст из div или из атрибута data-name
-            nickname = name_div.get("data-name", "").strip()
-            if not nickname:
-                nickname = name_div.get_text(strip=True)
-            
-            if nickname:
-                logger.info(f"Получен ник с сайта: {nickname} (профиль: {profile_url})")
-                return nickname
+        nickname = parse_site_nickname(response.text)
+        if nickname:
+            logger.info(f"Получен ник с сайта: {nickname} (профиль: {profile_url})")
+            return nickname
         
         logger.warning(f"Не удалось найти ник на странице {profile_url}")
         return None
@@ -0,0 +1,109 @@
+"""
+Замер задержек (stall) event loop
+
+Фоновая корутина засыпает на фиксированный интервал и измеряет,
+насколько позже она проснулась. Любой блокирующий вызов внутри
+обработчиков (requests, sqlite, numpy) виден как рост задержки.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, Dict
+
+from config.settings import LOOP_LAG_PROBE_INTERVAL
+from database.async_db import get_db_executor
+
+logger = logging.getLogger(__name__)
+
+# Задержка больше этого порога считается зависанием (сек)
+STALL_THRESHOLD = 0.05
+
+
+class LoopLagMonitor:
+    """Проба задержек event loop"""
+
+    def __init__(self, interval: float = LOOP_LAG_PROBE_INTERVAL, max_samples: int = 10000):
+        self.interval = interval
+        self._samples: deque = deque(maxlen=max_samples)
+        self._task: Optional[asyncio.Task] = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._samples.clear()
+        self.max_lag = 0.0
+        self.total_stall = 0.0
+        self.stall_count = 0
+        self._window_started: Optional[float] = None
+
+    def start(self):
+        """Запускает пробу в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"⏱️ Замер задержек event loop запущен (шаг {self.interval * 1000:.0f} мс)")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._window_started = loop.time()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > STALL_THRESHOLD:
+                self.stall_count += 1
+                self.total_stall += lag
+
+    def snapshot(self, reset: bool = True) -> Dict:
+        """Статистика за окно наблюдения (в миллисекундах)"""
+        samples = sorted(self._samples)
+        if samples:
+            p50 = samples[len(samples) // 2]
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        else:
+            p50 = p99 = 0.0
+
+        window = 0.0
+        if self._window_started is not None:
+            window = asyncio.get_running_loop().time() - self._window_started
+
+        stats = {
+            'samples': len(samples),
+            'window_s': window,
+            'p50_ms': p50 * 1000,
+            'p99_ms': p99 * 1000,
+            'max_ms': self.max_lag * 1000,
+            'stall_count': self.stall_count,
+            'total_stall_s': self.total_stall,
+        }
+        if reset:
+            self._reset_window()
+            self._window_started = asyncio.get_running_loop().time()
+        return stats
+
+    @staticmethod
+    def format_stats(stats: Dict) -> str:
+        return (
+            f"окно {stats['window_s']:.0f} с, проб {stats['samples']}: "
+            f"p50={stats['p50_ms']:.1f} мс, p99={stats['p99_ms']:.1f} мс, "
+            f"max={stats['max_ms']:.1f} мс, зависаний >{STALL_THRESHOLD * 1000:.0f} мс: "
+            f"{stats['stall_count']} (всего {stats['total_stall_s']:.2f} с)"
+        )
+
+
+async def loop_lag_report_job(context):
+    """Периодически пишет в лог статистику задержек event loop"""
+    lag_monitor: Optional[LoopLagMonitor] = context.bot_data.get('loop_lag_monitor')
+    if lag_monitor is None:
+        return
+
+    monitor = context.bot_data.get('card_monitor')
+    mode = getattr(monitor, 'http_mode', '—')
+    stats = lag_monitor.snapshot(reset=True)
+    logger.info(f"⏱️ Event loop [HTTP монитора: {mode}] — {LoopLagMonitor.format_stats(stats)}")
+    logger.info(f"🗄️ Очередь БД: {get_db_executor().format_stats(reset=True)}")
@@ -0,0 +1,171 @@
+"""
+Кеш ников пользователей MangaBuff
+
+Двухуровневый: LRU в памяти поверх таблицы site_nicknames в SQLite
+(чтение и запись через database.async_db — не в event loop).
+Устаревшая запись (старше NICKNAME_CACHE_TTL) отдаётся сразу,
+а свежий ник подгружается в фоне. Одновременные промахи по одному
+профилю делят одну загрузку.
+
+Используется монитором карт и привязкой аккаунтов/твинов.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Set, Tuple, Callable, Awaitable
+
+from config.settings import NICKNAME_CACHE_TTL, NICKNAME_CACHE_SIZE
+from database import async_db as adb
+
+logger = logging.getLogger(__name__)
+
+Fetcher = Callable[[str], Awaitable[Optional[str]]]
+
+
+async def _default_fetcher(profile_url: str) -> Optional[str]:
+    """Загрузка ника через helpers.get_site_nickname (в отдельном потоке)"""
+    from utils.helpers import get_site_nickname
+    return await asyncio.to_thread(get_site_nickname, profile_url)
+
+
+class NicknameCache:
+    """LRU + SQLite кеш ников с фоновым обновлением"""
+
+    def __init__(self, ttl: float = NICKNAME_CACHE_TTL, max_size: int = NICKNAME_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lru: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Фоновые обновления: event loop держит задачи только по слабой ссылке
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0          # свежая запись (память или БД)
+        self.stale_hits = 0    # устаревшая запись + фоновое обновление
+        self.misses = 0        # записи нет, ждём загрузку
+        self.refreshes = 0     # фоновых обновлений запущено
+
+    @staticmethod
+    def profile_id_from_url(profile_url: str) -> Optional[str]:
+        m = re.search(r'/users/(\d+)', profile_url)
+        return m.group(1) if m else None
+
+    # ──────────────────────────────────────────────────────────
+    # ХРАНЕНИЕ
+    # ──────────────────────────────────────────────────────────
+
+    async def _lookup(self, profile_id: str) -> Optional[Tuple[str, float]]:
+        entry = self._lru.get(profile_id)
+        if entry is not None:
+            self._lru.move_to_end(profile_id)
+            return entry
+
+        try:
+            entry = await adb.get_cached_site_nickname(profile_id)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кеша ников: {e}")
+            entry = None
+        if entry is not None:
+            self._remember(profile_id, entry)
+        return entry
+
+    def _remember(self, profile_id: str, entry: Tuple[str, float]):
+        self._lru[profile_id] = entry
+        self._lru.move_to_end(profile_id)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def put(self, profile_id: str, nickname: str):
+        """Сохраняет ник в память и в БД"""
+        entry = (nickname, time.time())
+        self._remember(profile_id, entry)
+        try:
+            await adb.save_cached_site_nickname(profile_id, nickname, entry[1])
+        except Exception as e:
+            logger.error(f"Ошибка записи кеша ников: {e}")
+
+    # ──────────────────────────────────────────────────────────
+    # ПУБЛИЧНОЕ API
+    # ──────────────────────────────────────────────────────────
+
+    async def get(self, profile_url: str, fetcher: Optional[Fetcher] = None) -> Optional[str]:
+        """
+        Ник по ссылке на профиль.
+
+        Args:
+            profile_url: https://mangabuff.ru/users/XXXXXX
+            fetcher: корутина загрузки ника по ссылке
+                     (по умолчанию helpers.get_site_nickname в потоке)
+        """
+        fetcher = fetcher or _default_fetcher
+        profile_id = self.profile_id_from_url(profile_url)
+        if not profile_id:
+            return await fetcher(profile_url)
+
+        entry = await self._lookup(profile_id)
+        if entry is not None:
+            nickname, fetched_at = entry
+            if time.time() - fetched_at < self.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                if profile_id not in self._inflight:
+                    self.refreshes += 1
+                    task = asyncio.create_task(self._load(profile_id, profile_url, fetcher))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            return nickname
+
+        self.misses += 1
+        return await self._load(profile_id, profile_url, fetcher)
+
+    async def _load(self, profile_id: str, profile_url: str, fetcher: Fetcher) -> Optional[str]:
+        """Загружает ник; параллельные запросы одного профиля ждут одну загрузку"""
+        inflight = self._inflight.get(profile_id)
+        if inflight is not None:
+            return await inflight
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[profile_id] = future
+        nickname = None
+        try:
+            nickname = await fetcher(profile_url)
+            if nickname:
+                await self.put(profile_id, nickname)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки ника {profile_url}: {e}")
+        finally:
+            self._inflight.pop(profile_id, None)
+            future.set_result(nickname)
+        return nickname
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'in_memory': len(self._lru),
+        }
+
+    def format_stats(self) -> str:
+        st = self.stats()
+        total = st['hits'] + st['stale_hits'] + st['misses']
+        hit_rate = (st['hits'] + st['stale_hits']) * 100 / total if total else 0.0
+        return (
+            f"попаданий {st['hits']}, устаревших {st['stale_hits']}, промахов {st['misses']} "
+            f"({hit_rate:.1f}% из кеша), фоновых обновлений {st['refreshes']}, "
+            f"в памяти {st['in_memory']}"
+        )
+
+
+# Глобальный экземпляр кеша
+_cache_instance: Optional[NicknameCache] = None
+
+
+def get_nickname_cache() -> NicknameCache:
+    """Возвращает глобальный кеш ников"""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = NicknameCache()
+    return _cache_instance
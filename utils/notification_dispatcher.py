@@ -0,0 +1,241 @@
+"""
+Рассылка личных уведомлений с ограничением скорости
+
+Сообщения отправляются параллельно, но не быстрее лимитов Telegram:
+  • общий token bucket — NOTIFY_GLOBAL_RATE сообщений в секунду;
+  • в один чат — не чаще раза в NOTIFY_PER_CHAT_INTERVAL секунд.
+
+RetryAfter (flood control) приостанавливает всю рассылку на указанное
+время. Сетевая ошибка повторяется с экспоненциальной паузой, только
+если запрос точно не ушёл в Telegram; таймаут после отправки считается
+«доставка неизвестна» и не повторяется, чтобы не слать дубликаты.
+Время рассылки определяется лимитом, а не задержкой каждого запроса.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable, Any
+
+import httpx
+from telegram.error import RetryAfter, TimedOut, NetworkError, Forbidden, BadRequest
+
+from config.settings import (
+    NOTIFY_GLOBAL_RATE, NOTIFY_PER_CHAT_INTERVAL, NOTIFY_CONCURRENCY, NOTIFY_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед первым повтором после сетевой ошибки (сек), далее ×2
+NETWORK_RETRY_DELAY = 1.0
+
+SendFactory = Callable[[], Awaitable[Any]]
+
+# Ошибки httpx, при которых запрос не дошёл до Telegram: нет соединения
+# или свободного места в пуле. Остальные (чтение ответа, обрыв) могли
+# случиться уже после того, как Telegram принял сообщение.
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after — int или timedelta в зависимости от настроек PTB"""
+    value = error.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+def request_not_sent(error: NetworkError) -> bool:
+    """
+    True, если NetworkError/TimedOut возникла до отправки запроса.
+
+    PTB оборачивает ошибку httpx (она в __cause__). NetworkError без
+    причины от httpx — ответ Telegram с ошибкой, сообщение не принято.
+    """
+    cause = error.__cause__
+    if isinstance(cause, _NOT_SENT_ERRORS):
+        return True
+    return not isinstance(error, TimedOut) and not isinstance(cause, httpx.HTTPError)
+
+
+class TokenBucket:
+    """Token bucket для asyncio: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BatchStats:
+    """Итоги одной рассылки"""
+    name: str
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    unknown: int = 0       # таймаут после отправки: доставка не подтверждена
+    retries: int = 0
+    flood_waits: int = 0
+    flood_wait_s: float = 0.0
+    elapsed_s: float = 0.0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.elapsed_s if self.elapsed_s else 0.0
+
+    def format(self) -> str:
+        return (
+            f"{self.name}: отправлено {self.sent}/{self.total}, ошибок {self.failed}, "
+            f"не подтверждено {self.unknown}, "
+            f"повторов {self.retries}, flood control {self.flood_waits} раз "
+            f"({self.flood_wait_s:.1f} с); {self.elapsed_s:.2f} с, {self.throughput:.1f} сообщ/с"
+        )
+
+
+class NotificationDispatcher:
+    """Параллельная рассылка под лимитами Telegram"""
+
+    def __init__(
+        self,
+        global_rate: float = NOTIFY_GLOBAL_RATE,
+        per_chat_interval: float = NOTIFY_PER_CHAT_INTERVAL,
+        concurrency: int = NOTIFY_CONCURRENCY,
+        max_retries: int = NOTIFY_MAX_RETRIES,
+    ):
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chat_next: Dict[int, float] = {}
+
+    async def _wait_chat(self, chat_id: int):
+        """Соблюдает интервал между сообщениями в один чат"""
+        now = time.monotonic()
+        ready_at = self._chat_next.get(chat_id, now)
+        self._chat_next[chat_id] = max(ready_at, now) + self.per_chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    def _prune_chats(self):
+        now = time.monotonic()
+        for chat_id in [c for c, t in self._chat_next.items() if t < now]:
+            del self._chat_next[chat_id]
+
+    async def _deliver(self, chat_id: int, send: SendFactory, stats: BatchStats) -> Optional[Any]:
+        network_delay = NETWORK_RETRY_DELAY
+        for attempt in range(self.max_retries + 1):
+            await self._wait_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                async with self._slots:
+                    result = await send()
+                stats.sent += 1
+                return result
+
+            except RetryAfter as e:
+                wait = retry_after_seconds(e)
+                stats.flood_waits += 1
+                stats.flood_wait_s += wait
+                # Flood control действует на весь бот — приостанавливаем всех
+                self.bucket.pause(wait)
+                logger.warning(f"⏳ Flood control при отправке в {chat_id}: пауза {wait:.0f} с")
+
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован / чат не найден — повтор не поможет
+                stats.failed += 1
+                stats.errors.append((chat_id, str(e)))
+                logger.warning(f"⚠️ Уведомление пользователю {chat_id} не доставлено: {e}")
+                return None
+
+            except NetworkError as e:  # включая TimedOut
+                if not request_not_sent(e):
+                    # Telegram мог уже принять сообщение — повтор дал бы дубликат
+                    stats.unknown += 1
+                    stats.errors.append((chat_id, str(e)))
+                    logger.warning(f"⚠️ Доставка уведомления пользователю {chat_id} не подтверждена: {e}")
+                    return None
+                logger.warning(f"⚠️ Сетевая ошибка при отправке в {chat_id}: {e}, повтор через {network_delay:.0f} с")
+                await asyncio.sleep(network_delay)
+                network_delay *= 2
+
+            except Exception as e:
+                stats.failed += 1
+                stats.errors.append((chat_id, str(e)))
+                logger.error(f"❌ Ошибка отправки уведомления пользователю {chat_id}: {e}", exc_info=True)
+                return None
+
+            if attempt < self.max_retries:
+                stats.retries += 1
+
+        stats.failed += 1
+        stats.errors.append((chat_id, "превышено число повторов"))
+        logger.error(f"❌ Уведомление пользователю {chat_id} не доставлено после {self.max_retries} повторов")
+        return None
+
+    async def send_batch(
+        self,
+        messages: List[Tuple[int, SendFactory]],
+        name: str = "рассылка",
+    ) -> Tuple[BatchStats, List[Optional[Any]]]:
+        """
+        Отправляет пакет сообщений.
+
+        Args:
+            messages: [(chat_id, фабрика корутины отправки)] — фабрика
+                      вызывается заново при каждой попытке
+            name: подпись пакета для лога
+
+        Returns:
+            (статистика, результаты в порядке messages; None — не доставлено)
+        """
+        stats = BatchStats(name=name, total=len(messages))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            self._deliver(chat_id, send, stats) for chat_id, send in messages
+        ))
+        stats.elapsed_s = time.perf_counter() - started
+        self._prune_chats()
+
+        if messages:
+            logger.info(f"📬 {stats.format()}")
+        return stats, list(results)
+
+
+# Глобальный экземпляр диспетчера
+_dispatcher_instance: Optional[NotificationDispatcher] = None
+
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """Возвращает глобальный диспетчер личных уведомлений"""
+    global _dispatcher_instance
+    if _dispatcher_instance is None:
+        _dispatcher_instance = NotificationDispatcher()
+    return _dispatcher_instance
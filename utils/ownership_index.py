@@ -0,0 +1,127 @@
+"""
+Индекс владельцев аккаунтов MangaBuff
+
+profile_id на сайте → аккаунты пользователей бота (основной или твин)
+вместе с ключом и состоянием настройки уведомлений. Владельцы профиля
+читаются по индексу accounts.profile_id (get_profile_owners) при первом
+обращении и остаются в памяти, в том числе пустой ответ — карты клуба
+проходят через одних и тех же участников. Любое изменение аккаунтов
+в database.db (save_user, add_twink, remove_twink, toggle_notification)
+сбрасывает кеш. Рассылка о карте клуба проходит только по владельцам
+карты, без чтения всех пользователей из БД.
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Iterable
+
+from database import async_db as adb
+from database.db import add_account_listener, NOTIF_KEY_MAIN
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OwnedAccount:
+    """Аккаунт сайта, привязанный к пользователю бота"""
+    user_id: int
+    profile_id: str
+    notif_key: str      # 'main' или profile_id твина
+    nickname: str
+    enabled: bool       # уведомления для аккаунта включены
+    order: int          # 0 — основной, далее твины в порядке добавления
+
+
+class OwnershipIndex:
+    """profile_id → список OwnedAccount"""
+
+    def __init__(self):
+        self._by_profile: Dict[str, List[OwnedAccount]] = {}
+        self._lock = threading.Lock()
+        # Растёт при каждом сбросе: загрузка, начатая до сброса, не кешируется
+        self._generation = 0
+        self.hits = 0
+        self.lookups = 0
+
+    # ──────────────────────────────────────────────────────────
+    # ЗАГРУЗКА
+    # ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _account(row: Dict) -> OwnedAccount:
+        """Аккаунт из строки формата get_profile_owners"""
+        profile_id = str(row['profile_id'])
+        return OwnedAccount(
+            user_id=row['user_id'],
+            profile_id=profile_id,
+            notif_key=NOTIF_KEY_MAIN if row['is_main'] else profile_id,
+            nickname=row['nickname'] or f"User {profile_id}",
+            enabled=row['notify'],
+            order=row['order'],
+        )
+
+    async def _load(self, profile_id: str) -> List[OwnedAccount]:
+        generation = self._generation
+        accounts = [self._account(row) for row in await adb.get_profile_owners(profile_id)]
+        self.lookups += 1
+        with self._lock:
+            if generation == self._generation:
+                self._by_profile[profile_id] = accounts
+        return accounts
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает кеш после изменения аккаунтов пользователя (вызывается из database.db)"""
+        with self._lock:
+            self._by_profile.clear()
+            self._generation += 1
+        logger.debug(f"🗂️ Индекс владельцев сброшен: изменились аккаунты пользователя {user_id}")
+
+    # ──────────────────────────────────────────────────────────
+    # ЗАПРОСЫ
+    # ──────────────────────────────────────────────────────────
+
+    async def owners_of(self, profile_ids: Iterable[str]) -> List[OwnedAccount]:
+        """
+        Пользователи бота, которым принадлежит хотя бы один из аккаунтов.
+
+        На пользователя возвращается один аккаунт: основной, если он
+        среди владельцев, иначе первый по порядку добавления твин.
+        Настройка уведомлений не учитывается — поле enabled.
+        """
+        profile_ids = {str(profile_id) for profile_id in profile_ids}
+        with self._lock:
+            found = {pid: self._by_profile[pid] for pid in profile_ids if pid in self._by_profile}
+        self.hits += len(found)
+
+        missing = [pid for pid in profile_ids if pid not in found]
+        if missing:
+            loaded = await asyncio.gather(*(self._load(pid) for pid in missing))
+            found.update(zip(missing, loaded))
+
+        best: Dict[int, OwnedAccount] = {}
+        for accounts in found.values():
+            for account in accounts:
+                current = best.get(account.user_id)
+                if current is None or account.order < current.order:
+                    best[account.user_id] = account
+        return list(best.values())
+
+    def format_stats(self) -> str:
+        return f"профилей из памяти {self.hits}, запросов к БД {self.lookups}, в памяти {len(self)}"
+
+    def __len__(self) -> int:
+        return len(self._by_profile)
+
+
+# Глобальный экземпляр индекса
+_index_instance: Optional[OwnershipIndex] = None
+
+
+def get_ownership_index() -> OwnershipIndex:
+    """Возвращает глобальный индекс владельцев (подписан на изменения в БД)"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = OwnershipIndex()
+        add_account_listener(_index_instance.invalidate)
+    return _index_instance
@@ -0,0 +1,319 @@
+"""
+Адаптивный планировщик опроса страницы boost
+
+Вместо фиксированного интервала в 2 секунды:
+  • по истории club_cards.discovered_at строится гистограмма
+    времени смены карт (по минутам суток, UTC);
+  • рядом с «горячими» минутами опрос идёт с минимальным интервалом;
+  • в тихие периоды интервал растёт экспоненциально (до максимума),
+    но следующий запрос не перепрыгивает начало горячего окна;
+  • после ошибок, 429 и 5xx — экспоненциальная пауза с учётом Retry-After;
+  • ко всем интервалам добавляется случайный разброс (jitter).
+
+Задача мониторинга перепланирует себя через run_once.
+"""
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, Iterable, List
+
+from config.settings import (
+    CARD_POLL_MIN_INTERVAL, CARD_POLL_BASE_INTERVAL, CARD_POLL_MAX_INTERVAL,
+    CARD_POLL_HOT_WINDOW, CARD_POLL_JITTER
+)
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+# Меньше событий в истории — распределение не используем
+MIN_HISTORY = 20
+
+# Во сколько раз плотность смен выше/ниже равномерной, чтобы окно
+# считалось горячим/тихим
+HOT_RATIO = 2.0
+QUIET_RATIO = 0.5
+
+# Множитель интервала за каждый тихий тик и потолок степени для ошибок
+QUIET_BACKOFF = 1.5
+MAX_ERROR_EXPONENT = 6
+
+# Период отчёта в лог (сек)
+REPORT_INTERVAL = 300
+
+OUTCOME_CHANGED = 'changed'
+OUTCOME_UNCHANGED = 'unchanged'
+OUTCOME_ERROR = 'error'
+
+
+class AdaptivePollScheduler:
+    """Выбор паузы до следующего опроса boost"""
+
+    def __init__(
+        self,
+        base_interval: float = CARD_POLL_BASE_INTERVAL,
+        min_interval: float = CARD_POLL_MIN_INTERVAL,
+        max_interval: float = CARD_POLL_MAX_INTERVAL,
+        hot_window: int = CARD_POLL_HOT_WINDOW,
+        jitter: float = CARD_POLL_JITTER,
+        rng: Optional[random.Random] = None,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hot_window = hot_window
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+
+        self._histogram: List[int] = [0] * MINUTES_PER_DAY
+        self._density: List[float] = [1.0] * MINUTES_PER_DAY
+        self.history_size = 0
+
+        self.quiet_streak = 0
+        self.error_streak = 0
+        self._last_poll: Optional[float] = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.changes = 0
+        self._delays: deque = deque(maxlen=1000)
+        self._detection_gaps: deque = deque(maxlen=100)
+
+    # ──────────────────────────────────────────────────────────
+    # РАСПРЕДЕЛЕНИЕ СМЕН
+    # ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _minute_of_day(when: datetime) -> int:
+        if when.tzinfo is not None:
+            when = when.astimezone(timezone.utc)
+        return when.hour * 60 + when.minute
+
+    def load_history(self, timestamps: Iterable[str]):
+        """Строит гистограмму по строкам discovered_at (UTC)"""
+        self._histogram = [0] * MINUTES_PER_DAY
+        self.history_size = 0
+        for raw in timestamps:
+            try:
+                when = datetime.fromisoformat(str(raw))
+            except ValueError:
+                continue
+            self._histogram[self._minute_of_day(when)] += 1
+            self.history_size += 1
+        self._rebuild_density()
+        logger.info(
+            f"📅 Планировщик опроса: история {self.history_size} смен карт, "
+            f"горячих минут {sum(1 for d in self._density if d >= HOT_RATIO)}"
+        )
+
+    def record_change(self, when: Optional[datetime] = None):
+        """Добавляет обнаруженную смену карты в гистограмму"""
+        when = when or datetime.now(timezone.utc)
+        self._histogram[self._minute_of_day(when)] += 1
+        self.history_size += 1
+        self._rebuild_density()
+
+    def _rebuild_density(self):
+        """
+        Плотность смен в окне ±hot_window минут относительно равномерной
+        (1.0 — как в среднем по суткам).
+        """
+        if self.history_size < MIN_HISTORY:
+            self._density = [1.0] * MINUTES_PER_DAY
+            return
+
+        width = 2 * self.hot_window + 1
+        expected = self.history_size * width / MINUTES_PER_DAY
+        # Скользящая сумма по кругу суток
+        window_sum = sum(
+            self._histogram[m % MINUTES_PER_DAY]
+            for m in range(-self.hot_window, self.hot_window + 1)
+        )
+        density = []
+        for minute in range(MINUTES_PER_DAY):
+            density.append(window_sum / expected)
+            window_sum += self._histogram[(minute + self.hot_window + 1) % MINUTES_PER_DAY]
+            window_sum -= self._histogram[(minute - self.hot_window) % MINUTES_PER_DAY]
+        self._density = density
+
+    def hotness(self, now: Optional[datetime] = None) -> float:
+        now = now or datetime.now(timezone.utc)
+        return self._density[self._minute_of_day(now)]
+
+    def _seconds_until_hot(self, now: datetime) -> Optional[float]:
+        """Через сколько секунд начнётся ближайшая горячая минута (в пределах max_interval)"""
+        minute = self._minute_of_day(now)
+        into_minute = now.second + now.microsecond / 1e6
+        for ahead in range(1, int(self.max_interval // 60) + 2):
+            if self._density[(minute + ahead) % MINUTES_PER_DAY] >= HOT_RATIO:
+                return ahead * 60 - into_minute
+        return None
+
+    # ──────────────────────────────────────────────────────────
+    # ВЫБОР ИНТЕРВАЛА
+    # ──────────────────────────────────────────────────────────
+
+    def next_delay(
+        self,
+        outcome: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        polled_at: Optional[float] = None,
+        now: Optional[datetime] = None,
+    ) -> float:
+        """
+        Пауза до следующего опроса.
+
+        Args:
+            outcome: OUTCOME_CHANGED / OUTCOME_UNCHANGED / OUTCOME_ERROR
+            status: HTTP-статус последнего запроса (None — нет ответа)
+            retry_after: значение Retry-After из ответа, сек
+            polled_at: time.monotonic() начала опроса
+        """
+        now = now or datetime.now(timezone.utc)
+        mono = polled_at if polled_at is not None else time.monotonic()
+        self.requests += 1
+
+        if outcome == OUTCOME_ERROR:
+            self.errors += 1
+            if status == 429:
+                self.rate_limited += 1
+            elif status is not None and status >= 500:
+                self.server_errors += 1
+            self.error_streak += 1
+            self.quiet_streak = 0
+            exponent = min(self.error_streak, MAX_ERROR_EXPONENT)
+            delay = min(self.base_interval * 2 ** exponent, self.max_interval)
+        else:
+            self.error_streak = 0
+            if outcome == OUTCOME_CHANGED:
+                self.changes += 1
+                if self._last_poll is not None:
+                    self._detection_gaps.append(mono - self._last_poll)
+
+            density = self.hotness(now)
+            if density >= HOT_RATIO:
+                self.quiet_streak = 0
+                delay = self.min_interval
+            elif density <= QUIET_RATIO:
+                self.quiet_streak += 1
+                delay = min(self.base_interval * QUIET_BACKOFF ** self.quiet_streak, self.max_interval)
+                until_hot = self._seconds_until_hot(now)
+                if until_hot is not None:
+                    delay = min(delay, max(until_hot, self.min_interval))
+            else:
+                self.quiet_streak = 0
+                delay = self.base_interval
+
+        delay *= self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+        delay = max(delay, self.min_interval * (1 - self.jitter))
+        if outcome == OUTCOME_ERROR and retry_after:
+            # Retry-After сервера — нижняя граница, jitter её не уменьшает
+            delay = max(delay, retry_after)
+
+        self._last_poll = mono
+        self._delays.append(delay)
+        return delay
+
+    # ──────────────────────────────────────────────────────────
+    # СТАТИСТИКА
+    # ──────────────────────────────────────────────────────────
+
+    def report_due(self) -> bool:
+        return time.monotonic() - self._window_started >= REPORT_INTERVAL
+
+    def stats(self, reset: bool = False) -> Dict:
+        window = max(time.monotonic() - self._window_started, 1e-9)
+        delays = sorted(self._delays)
+        gaps = list(self._detection_gaps)
+        stats = {
+            'window_s': window,
+            'requests': self.requests,
+            'rate_per_min': self.requests * 60 / window,
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+            'server_errors': self.server_errors,
+            'changes': self.changes,
+            'delay_p50': delays[len(delays) // 2] if delays else 0.0,
+            'delay_max': delays[-1] if delays else 0.0,
+            # Смена произошла где-то между двумя опросами: в среднем
+            # задержка обнаружения — половина промежутка, максимум — весь
+            'latency_avg': sum(gaps) / len(gaps) / 2 if gaps else 0.0,
+            'latency_max': max(gaps) if gaps else 0.0,
+            'hotness': self.hotness(),
+        }
+        if reset:
+            self._reset_window()
+        return stats
+
+    @staticmethod
+    def format_stats(stats: Dict) -> str:
+        return (
+            f"окно {stats['window_s']:.0f} с: {stats['requests']} запросов "
+            f"({stats['rate_per_min']:.1f}/мин), интервал p50={stats['delay_p50']:.1f} с, "
+            f"max={stats['delay_max']:.1f} с; ошибок {stats['errors']} "
+            f"(429: {stats['rate_limited']}, 5xx: {stats['server_errors']}); "
+            f"смен {stats['changes']}, задержка обнаружения ~{stats['latency_avg']:.1f} с "
+            f"(≤{stats['latency_max']:.1f} с); плотность сейчас ×{stats['hotness']:.2f}"
+        )
+
+
+def classify_poll(monitor, card_before: Optional[str], was_initialized: bool) -> str:
+    """Итог тика мониторинга по состоянию CardMonitor"""
+    status = monitor.last_status
+    if status is None or status not in (200, 304):
+        return OUTCOME_ERROR
+    if was_initialized and monitor.last_card_id != card_before:
+        return OUTCOME_CHANGED
+    return OUTCOME_UNCHANGED
+
+
+async def adaptive_monitoring_job(context):
+    """
+    Тик мониторинга карт с адаптивным интервалом.
+
+    Выполняет card_monitoring_job (через single-flight обёртку)
+    и планирует себя снова через
+    run_once с паузой от AdaptivePollScheduler.
+    """
+    from utils.card_monitor import guarded_card_monitoring_job
+
+    scheduler: AdaptivePollScheduler = context.bot_data['poll_scheduler']
+    monitor = context.bot_data.get('card_monitor')
+    card_before = getattr(monitor, 'last_card_id', None)
+    was_initialized = getattr(monitor, 'initialized', False)
+
+    delay = scheduler.base_interval
+    polled_at = time.monotonic()
+    try:
+        await guarded_card_monitoring_job(context)
+    finally:
+        try:
+            if monitor is not None:
+                outcome = classify_poll(monitor, card_before, was_initialized)
+                if outcome == OUTCOME_CHANGED:
+                    scheduler.record_change()
+                delay = scheduler.next_delay(
+                    outcome, status=monitor.last_status, retry_after=monitor.last_retry_after,
+                    polled_at=polled_at,
+                )
+                if outcome == OUTCOME_ERROR:
+                    logger.warning(
+                        f"⏳ Опрос boost: ошибка ({monitor.last_status}), "
+                        f"следующий через {delay:.1f} с"
+                    )
+
+            if scheduler.report_due():
+                logger.info(
+                    f"📈 Планировщик опроса: "
+                    f"{AdaptivePollScheduler.format_stats(scheduler.stats(reset=True))}"
+                )
+        finally:
+            context.job_queue.run_once(adaptive_monitoring_job, when=delay, name='card_monitoring')
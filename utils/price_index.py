@@ -0,0 +1,148 @@
+"""
+Индекс цен на карты в памяти
+
+card_prices целиком в двух отсортированных массивах numpy (card_id int64
+→ цена float64, 16 байт на карту). Цена одной карты — бинарный поиск,
+цены для всего списка карт (хотелки) — один np.searchsorted, без
+запросов к БД.
+
+Индекс строится при старте и обновляется по подписке на изменения цен
+в database.db — в том же потоке, что записал цены (поток-писатель
+database.async_db), сразу после commit:
+  • replace_card_prices, clear_all_card_prices — полная перестройка;
+  • save_card_price — цена одной карты кладётся в словарь поверх массивов,
+    который вливается в них, когда вырастает до OVERLAY_MAX карт.
+Запросы никогда не строят индекс и не ждут блокировок: пока идёт
+перестройка, отдаются прежние массивы.
+"""
+import logging
+import threading
+import time
+from typing import Optional, Dict, Iterable, Tuple
+
+import numpy as np
+
+from database.db import get_card_price_pairs, add_prices_listener
+
+logger = logging.getLogger(__name__)
+
+# Точечных изменений цен поверх массивов, после которых они сливаются
+OVERLAY_MAX = 1024
+
+
+def _empty_table() -> Tuple[np.ndarray, np.ndarray, Dict[int, float]]:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), {}
+
+
+class PriceIndex:
+    """card_id → цена по отсортированным массивам"""
+
+    def __init__(self):
+        # (ids, prices, overlay) заменяется целиком — читатели видят
+        # согласованный набор; overlay — {card_id: цена} после последнего слияния
+        self._table: Tuple[np.ndarray, np.ndarray, Dict[int, float]] = _empty_table()
+        # Только для построений между собой; запросы его не берут
+        self._build_lock = threading.Lock()
+        self.built = False
+
+    # ──────────────────────────────────────────────────────────
+    # ПОСТРОЕНИЕ
+    # ──────────────────────────────────────────────────────────
+
+    def build(self):
+        """Загружает все цены из БД (блокирующий вызов — не из event loop)"""
+        with self._build_lock:
+            started = time.perf_counter()
+            pairs = [(int(card_id), price) for card_id, price in get_card_price_pairs() if card_id.isdigit()]
+            ids = np.fromiter((card_id for card_id, _ in pairs), dtype=np.int64, count=len(pairs))
+            prices = np.fromiter((price for _, price in pairs), dtype=np.float64, count=len(pairs))
+            order = np.argsort(ids, kind='stable')
+            self._table = (ids[order], prices[order], {})
+            self.built = True
+        logger.info(
+            f"💰 Индекс цен: {len(ids)} карт, {(ids.nbytes + prices.nbytes) / 1024:.0f} КБ, "
+            f"{(time.perf_counter() - started) * 1000:.1f} мс"
+        )
+
+    def update(self, changed: Dict[str, float]):
+        """Точечное изменение цен {card_id: цена} без чтения БД"""
+        with self._build_lock:
+            ids, prices, overlay = self._table
+            # Словарь меняется на месте: запросы читают из него по ключу
+            overlay.update((int(card_id), float(price)) for card_id, price in changed.items()
+                           if str(card_id).isdigit())
+            if len(overlay) >= OVERLAY_MAX:
+                self._table = self._merge(ids, prices, overlay)
+
+    @staticmethod
+    def _merge(ids: np.ndarray, prices: np.ndarray, overlay: Dict[int, float]):
+        """Вливает overlay в отсортированные массивы (цены из overlay важнее)"""
+        all_ids = np.concatenate([np.fromiter(overlay.keys(), dtype=np.int64, count=len(overlay)), ids])
+        all_prices = np.concatenate([np.fromiter(overlay.values(), dtype=np.float64, count=len(overlay)), prices])
+        # return_index — первое вхождение, то есть значение из overlay
+        merged_ids, first = np.unique(all_ids, return_index=True)
+        return merged_ids, all_prices[first], {}
+
+    def on_prices_changed(self, changed: Optional[Dict[str, float]]):
+        """Подписчик database.db: None — цены заменены целиком"""
+        if changed is None:
+            self.build()
+        else:
+            self.update(changed)
+
+    # ──────────────────────────────────────────────────────────
+    # ЗАПРОСЫ
+    # ──────────────────────────────────────────────────────────
+
+    def get_card_price(self, card_id: str) -> Optional[float]:
+        """Цена карты или None"""
+        return self.get_card_prices((card_id,)).get(str(card_id))
+
+    def get_card_prices(self, card_ids: Iterable[str]) -> Dict[str, float]:
+        """
+        Цены карт из списка: {card_id: цена}.
+
+        Карт без цены (и с нечисловым id) в ответе нет.
+        """
+        ids, prices, overlay = self._table
+        keys = [key for key in map(str, card_ids) if key.isdigit()]
+        if not keys:
+            return {}
+
+        result = {}
+        if len(ids):
+            query = np.fromiter(map(int, keys), dtype=np.int64, count=len(keys))
+            pos = np.minimum(np.searchsorted(ids, query), len(ids) - 1)
+            found = ids[pos] == query
+            result = {key: float(price) for key, price, ok in zip(keys, prices[pos], found) if ok}
+        if overlay:
+            for key in keys:
+                price = overlay.get(int(key))
+                if price is not None:
+                    result[key] = price
+        return result
+
+    def __len__(self) -> int:
+        ids, _, overlay = self._table
+        if not overlay:
+            return len(ids)
+        keys = np.array(list(overlay), dtype=np.int64)
+        return len(ids) + int(np.count_nonzero(~np.isin(keys, ids)))
+
+
+# Глобальный экземпляр индекса
+_index_instance: Optional[PriceIndex] = None
+
+
+def get_price_index() -> PriceIndex:
+    """Возвращает глобальный индекс цен (подписан на изменения в БД)"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = PriceIndex()
+        add_prices_listener(_index_instance.on_prices_changed)
+    return _index_instance
+
+
+def get_card_prices(card_ids: Iterable[str]) -> Dict[str, float]:
+    """Цены карт из списка по глобальному индексу: {card_id: цена}"""
+    return get_price_index().get_card_prices(card_ids)
@@ -0,0 +1,155 @@
+"""
+Досчёт рангов старых карт клуба
+
+Карты в club_cards с рангом '?' (добавлены до появления шаблонов или
+не прошли порог MSE) обходятся постранично по id:
+  • результат из кеша рангов (utils.rank_cache) берётся без загрузки;
+  • картинки скачиваются параллельно, не больше RANK_BACKFILL_CONCURRENCY сразу;
+  • сравнение с шаблонами — RankDetector.detect_many в пуле процессов,
+    event loop бота не блокируется;
+  • найденные ранги записываются одной транзакцией на пакет;
+  • чтение и запись club_cards — через database.async_db, не в event loop.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Callable, Awaitable, List, Tuple
+
+from config.settings import RANK_BACKFILL_BATCH, RANK_BACKFILL_CONCURRENCY, RANK_BACKFILL_WORKERS
+from database import async_db as adb
+from utils.rank_cache import get_rank_cache
+from utils.rank_detector import RankResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillStats:
+    """Итоги (и промежуточное состояние) досчёта"""
+    total: int = 0
+    processed: int = 0
+    ranked: int = 0       # получили ранг
+    unresolved: int = 0   # шаблон по-прежнему не подходит
+    low_confidence: int = 0   # ранг найден, но с малым отрывом от второго
+    failed: int = 0       # картинка не скачалась или не декодировалась
+    from_cache: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.processed / self.elapsed_s if self.elapsed_s else 0.0
+
+    def format(self) -> str:
+        return (
+            f"обработано {self.processed}/{self.total}: ранг найден {self.ranked} "
+            f"(неуверенно {self.low_confidence}), без ранга {self.unresolved}, ошибок {self.failed}, из кеша {self.from_cache}; "
+            f"{self.elapsed_s:.1f} с, {self.rate:.1f} карт/с"
+        )
+
+
+ProgressCallback = Callable[[BackfillStats], Awaitable[None]]
+
+
+async def backfill_ranks(
+    monitor,
+    progress: Optional[ProgressCallback] = None,
+    batch_size: int = RANK_BACKFILL_BATCH,
+    concurrency: int = RANK_BACKFILL_CONCURRENCY,
+    workers: int = RANK_BACKFILL_WORKERS,
+) -> BackfillStats:
+    """
+    Досчитывает ранги карт без ранга.
+
+    Args:
+        monitor: CardMonitor — его HTTP-клиент и RankDetector
+        progress: вызывается после каждого пакета
+    """
+    detector = monitor.rank_detector
+    stats = BackfillStats(total=await adb.count_unranked_club_cards())
+    if not detector or not detector.is_ready or not stats.total:
+        return stats
+
+    ranks = get_rank_cache(detector)
+    slots = asyncio.Semaphore(concurrency)
+    pool = detector.make_pool(workers) if workers > 1 else None
+    started = time.perf_counter()
+
+    async def download(url: str) -> Optional[bytes]:
+        async with slots:
+            try:
+                return await monitor._download_image(url)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось скачать картинку {url}: {e}")
+                return None
+
+    logger.info(f"🔁 Досчёт рангов: {stats.total} карт без ранга")
+    try:
+        after_id = 0
+        while True:
+            rows = await adb.get_unranked_club_cards(after_id, batch_size)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+
+            found: List[Tuple[str, RankResult]] = []
+
+            pending = []
+            for _, card_id, url in rows:
+                cached = await ranks.by_url(url)
+                if cached:
+                    stats.from_cache += 1
+                    found.append((card_id, cached))
+                else:
+                    pending.append((card_id, url))
+
+            images = await asyncio.gather(*(download(url) for _, url in pending))
+
+            to_detect = []
+            for (card_id, url), raw in zip(pending, images):
+                if not raw:
+                    stats.failed += 1
+                    continue
+                cached = await ranks.by_content(raw, url)
+                if cached:
+                    stats.from_cache += 1
+                    found.append((card_id, cached))
+                else:
+                    to_detect.append((card_id, url, raw))
+
+            if to_detect:
+                results = await asyncio.to_thread(
+                    detector.detect_many, [raw for _, _, raw in to_detect], executor=pool
+                )
+                detected = []
+                for (card_id, url, raw), result in zip(to_detect, results):
+                    if result is None:
+                        stats.failed += 1
+                        continue
+                    detected.append((result, raw, url))
+                    found.append((card_id, result))
+                await ranks.store_many(detected)
+
+            resolved = [(card_id, result.rank) for card_id, result in found if result.rank != '?']
+            await adb.update_club_card_ranks(resolved)
+
+            stats.processed += len(rows)
+            stats.ranked += len(resolved)
+            stats.low_confidence += sum(
+                1 for _, result in found if result.rank != '?' and not result.confident
+            )
+            stats.unresolved += len(found) - len(resolved)
+            stats.elapsed_s = time.perf_counter() - started
+            logger.info(f"🔁 Досчёт рангов: {stats.format()}")
+            if progress:
+                try:
+                    await progress(stats)
+                except Exception as e:
+                    logger.error(f"Ошибка отчёта о прогрессе досчёта: {e}")
+    finally:
+        if pool:
+            await asyncio.to_thread(pool.shutdown)
+
+    stats.elapsed_s = time.perf_counter() - started
+    logger.info(f"✅ Досчёт рангов завершён: {stats.format()}")
+    return stats
@@ -0,0 +1,149 @@
+"""
+Кеш распознавания рангов карт
+
+Одни и те же картинки карт возвращаются на страницу буста, поэтому
+результат RankDetector (ранг, лучший MSE, вариант шаблона, отрыв от
+второго ранга) сохраняется
+в таблицу rank_cache:
+  • по URL картинки — повторная карта не требует ни загрузки, ни декодирования;
+  • по хешу содержимого (blake2b) — если та же картинка пришла с другим URL.
+
+Каждая запись помечена отпечатком шаблонов (RankDetector.templates_signature):
+при изменении ranks/ или параметров сравнения старые записи не используются
+и удаляются при первом обращении к кешу. Таблица читается и пишется через
+database.async_db — не в event loop.
+"""
+import hashlib
+import logging
+import math
+import asyncio
+import time
+from typing import Optional, Dict, Tuple, List
+
+from database import async_db as adb
+from utils.rank_detector import RankResult
+
+logger = logging.getLogger(__name__)
+
+
+def _url_key(image_url: str) -> str:
+    return f"url:{image_url}"
+
+
+def _digest_key(image_bytes: bytes) -> str:
+    return f"sha:{hashlib.blake2b(image_bytes, digest_size=16).hexdigest()}"
+
+
+class RankCache:
+    """URL / хеш картинки → RankResult (память + БД)"""
+
+    def __init__(self, templates_signature: str):
+        self.signature = templates_signature
+        self._entries: Dict[str, Optional[Tuple[str, float, int, Optional[float]]]] = {}
+        self.url_hits = 0
+        self.digest_hits = 0
+        self.misses = 0
+        # Удаление записей других шаблонов — один раз, при первом обращении
+        self._purge: Optional[asyncio.Task] = None
+
+    async def _purge_stale(self):
+        try:
+            purged = await adb.purge_rank_cache(self.signature)
+            if purged:
+                logger.info(f"🧹 Шаблоны рангов изменились: удалено {purged} устаревших результатов")
+        except Exception as e:
+            logger.error(f"Ошибка очистки кеша рангов: {e}")
+
+    async def _ensure_purged(self):
+        if self._purge is None:
+            self._purge = asyncio.ensure_future(self._purge_stale())
+        await self._purge
+
+    async def _get(self, key: str) -> Optional[RankResult]:
+        if key not in self._entries:
+            await self._ensure_purged()
+            try:
+                self._entries[key] = await adb.get_rank_cache_entry(key, self.signature)
+            except Exception as e:
+                logger.error(f"Ошибка чтения кеша рангов: {e}")
+                return None
+        entry = self._entries[key]
+        if entry is None:
+            return None
+        rank, mse, variant, margin = entry
+        # candidate = rank: для '?' лучший ранг не сохраняется
+        return RankResult(
+            rank=rank, mse=mse, variant=variant, candidate=rank,
+            margin=math.inf if margin is None else margin,
+        )
+
+    async def by_url(self, image_url: Optional[str]) -> Optional[RankResult]:
+        """Результат по URL картинки (без загрузки)"""
+        if not image_url:
+            return None
+        result = await self._get(_url_key(image_url))
+        if result:
+            self.url_hits += 1
+        return result
+
+    async def by_content(self, image_bytes: bytes, image_url: Optional[str] = None) -> Optional[RankResult]:
+        """
+        Результат по хешу содержимого; при попадании запоминает и URL,
+        чтобы в следующий раз обойтись без загрузки.
+        """
+        result = await self._get(_digest_key(image_bytes))
+        if result:
+            self.digest_hits += 1
+            if image_url:
+                await self._save([(_url_key(image_url), result)])
+        else:
+            self.misses += 1
+        return result
+
+    async def store(self, result: RankResult, image_bytes: bytes, image_url: Optional[str] = None):
+        """Сохраняет результат распознавания под хешем и URL картинки"""
+        await self.store_many([(result, image_bytes, image_url)])
+
+    async def store_many(self, results: List[Tuple[RankResult, bytes, Optional[str]]]):
+        """Сохраняет пакет [(результат, байты, URL)] одной транзакцией"""
+        keyed = []
+        for result, image_bytes, image_url in results:
+            keyed.append((_digest_key(image_bytes), result))
+            if image_url:
+                keyed.append((_url_key(image_url), result))
+        await self._save(keyed)
+
+    async def _save(self, keyed: List[Tuple[str, RankResult]]):
+        rows = []
+        for key, result in keyed:
+            entry = (
+                result.rank, float(result.mse), int(result.variant),
+                None if math.isinf(result.margin) else float(result.margin),
+            )
+            self._entries[key] = entry
+            rows.append((key, *entry))
+        if not rows:
+            return
+        await self._ensure_purged()
+        try:
+            await adb.save_rank_cache_entries(rows, self.signature, time.time())
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кеша рангов: {e}")
+
+    def format_stats(self) -> str:
+        return (
+            f"по URL {self.url_hits}, по содержимому {self.digest_hits}, "
+            f"распознано заново {self.misses}"
+        )
+
+
+# Глобальный экземпляр кеша
+_cache_instance: Optional[RankCache] = None
+
+
+def get_rank_cache(detector) -> RankCache:
+    """Возвращает кеш рангов для текущего набора шаблонов детектора"""
+    global _cache_instance
+    if _cache_instance is None or _cache_instance.signature != detector.templates_signature:
+        _cache_instance = RankCache(detector.templates_signature)
+    return _cache_instance
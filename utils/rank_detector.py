@@ -1,10 +1,24 @@
 """
 детектор ранга карты
+
+Сравнение от грубого к точному (_evaluate) включается только при
+COARSE_MIN_TEMPLATES шаблонах и больше. С текущим набором ranks/
+(по одной рамке на ранг) оно не используется — все шаблоны
+сравниваются сразу; грубый этап проверяет benchmarks/bench_rank_match.py.
 """
+import hashlib
+import json
 import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
 from io import BytesIO
 from pathlib import Path
-from typing import Optional, Dict, Tuple, List
+from typing import Optional, Dict, Tuple, List, Sequence
 
 import numpy as np
 import requests
@@ -43,6 +57,62 @@ ZONE_WEIGHTS = {
 # Порог для определения ранга
 MSE_THRESHOLD: float = 5000.0
 
+# Декодировать только зоны сравнения (JPEG — в draft-режиме с уменьшением),
+# а не всю карту целиком; False — прежний путь через полное изображение
+ROI_DECODE: bool = True
+
+# Грубое сравнение: зоны усредняются блоками COARSE_FACTOR×COARSE_FACTOR.
+# MSE усреднённых блоков не больше MSE исходных пикселей, поэтому грубая
+# оценка — нижняя граница, и шаблоны, у которых она уже хуже лучшего
+# точного результата, сравнивать в полном разрешении не нужно
+COARSE_FACTOR: int = 4
+
+# При меньшем числе шаблонов грубый этап не окупается — сравниваем все сразу
+# (bench_rank_match: при 3 шаблонах грубый этап в ~3 раза медленнее,
+# при 12 — в ~2 раза, при 24 — наравне, дальше выигрывает)
+COARSE_MIN_TEMPLATES: int = 16
+
+# Отрыв от второго по MSE ранга, ниже которого результат считается
+# неуверенным (RankResult.confident)
+CONFIDENCE_MARGIN: float = 500.0
+
+# Скомпилированные зоны всех frame-*.png (в .gitignore): пересобирается,
+# когда меняется набор файлов; версия — при изменении формата пакета.
+# Несжатый .npz читается целиком (np.load не отображает члены .npz
+# в память) — десятки КБ, и зоны всё равно сразу переводятся в float
+TEMPLATE_BUNDLE: str = '.templates.npz'
+TEMPLATE_BUNDLE_VERSION: int = 1
+
+# Как часто проверять ranks/ на новые или изменённые шаблоны (сек); 0 — не проверять
+TEMPLATE_RELOAD_INTERVAL: float = 30.0
+
+
+# ══════════════════════════════════════════════════════════════
+# РЕЗУЛЬТАТ РАСПОЗНАВАНИЯ
+# ══════════════════════════════════════════════════════════════
+
+@dataclass
+class RankResult:
+    """Результат сравнения карты с шаблонами"""
+    rank: str                     # '?' — лучший MSE выше MSE_THRESHOLD
+    mse: float                    # взвешенный MSE лучшего шаблона
+    variant: int                  # номер варианта лучшего шаблона
+    candidate: str = '?'          # лучший ранг, даже если порог не пройден
+    zones: Dict[str, float] = field(default_factory=dict)  # MSE лучшего шаблона по зонам
+    runner_up: Optional[str] = None
+    margin: float = math.inf      # насколько второй ранг хуже (оценка снизу)
+    refined: int = 0              # шаблонов сравнено в полном разрешении
+
+    @property
+    def confident(self) -> bool:
+        return self.rank != '?' and self.margin >= CONFIDENCE_MARGIN
+
+    def format(self) -> str:
+        text = f"{self.candidate} (MSE={self.mse:.1f}, вариант {self.variant}"
+        if self.runner_up:
+            text += f", отрыв от {self.runner_up} {self.margin:.0f}"
+        return text + ")"
+
 
 # ══════════════════════════════════════════════════════════════
 # ДЕТЕКТОР РАНГА
@@ -60,15 +130,67 @@ class RankDetectorImproved:
         self.ranks_dir = ranks_dir
         # {"E": [template1, template2], "D": [template1], ...}
         # где каждый template = {'badge': array, 'top_frame': array}
-        self.templates: Dict[str, List[Dict[str, np.ndarray]]] = {}
-        self._load_templates()
+        self._templates: Dict[str, List[Dict[str, np.ndarray]]] = {}
+
+        # Упакованные шаблоны: зона → float32 [n_templates, h, w, 3];
+        # строка i — ранг _packed_ranks[i], вариант _packed_variants[i]
+        self._packed: Dict[str, np.ndarray] = {}
+        self._packed_ranks: List[str] = []
+        self._packed_variants: List[int] = []
+        self._rank_starts: np.ndarray = np.zeros(0, dtype=np.intp)
+
+        # Грубые шаблоны: зона → float32 [n_templates, h/k, w/k, 3]
+        self._coarse: Dict[str, np.ndarray] = {}
+
+        # Отпечаток набора шаблонов и параметров сравнения: меняется —
+        # сохранённые результаты распознавания (utils.rank_cache) недействительны
+        self._signature_hex: str = ''
+
+        # Шаблоны загружаются при первом обращении (_ensure_loaded);
+        # _manifest — [(имя, размер, mtime_ns)] загруженных файлов
+        self._loaded = False
+        self._manifest: List[Tuple[str, int, int]] = []
+        self._checked_at = 0.0
+
+    @property
+    def templates(self) -> Dict[str, List[Dict[str, np.ndarray]]]:
+        self._ensure_loaded()
+        return self._templates
+
+    @property
+    def templates_signature(self) -> str:
+        self._ensure_loaded()
+        return self._signature_hex
 
     # ──────────────────────────────────────────────────────────
     # ЗАГРУЗКА ШАБЛОНОВ
     # ──────────────────────────────────────────────────────────
 
+    def template_files(self) -> List[Path]:
+        """Файлы шаблонов в ranks/ (без загрузки)"""
+        if not self.ranks_dir.exists():
+            return []
+        return sorted(self.ranks_dir.glob('frame-*.png'))
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self._load_templates()
+
+    @staticmethod
+    def _stat_manifest(files: List[Path]) -> List[Tuple[str, int, int]]:
+        manifest = []
+        for fpath in files:
+            st = fpath.stat()
+            manifest.append((fpath.name, st.st_size, st.st_mtime_ns))
+        return manifest
+
     def _load_templates(self):
-        """Загружает все шаблоны из папки ranks/"""
+        """
+        Загружает все шаблоны из папки ranks/: из скомпилированного пакета
+        TEMPLATE_BUNDLE, если файлы не менялись, иначе декодирует PNG
+        и пересобирает пакет.
+        """
         if not self.ranks_dir.exists():
             logger.warning(
                 f"⚠️  Папка шаблонов не найдена: {self.ranks_dir}\n"
@@ -76,28 +198,42 @@ class RankDetectorImproved:
             )
             return
 
-        png_files = sorted(self.ranks_dir.glob('frame-*.png'))
+        png_files = self.template_files()
         
         if not png_files:
             logger.warning("⚠️  В папке ranks/ нет файлов frame-*.png")
             return
 
-        for fpath in png_files:
-            # frame-e.png → "E"
-            # frame-e-v2.png → "E" (игнорируем -v2)
-            # frame-ss.png → "SS"
-            name = fpath.stem.replace('frame-', '')
-            rank = name.split('-')[0].upper()  # "e-v2" → "E"
-            
-            self._register(rank, str(fpath))
+        started = time.perf_counter()
+        self._manifest = self._stat_manifest(png_files)
+        source = "из пакета"
+
+        if not self._load_bundle(png_files):
+            source = "из PNG"
+            for fpath in png_files:
+                # frame-e.png → "E"
+                # frame-e-v2.png → "E" (игнорируем -v2)
+                # frame-ss.png → "SS"
+                name = fpath.stem.replace('frame-', '')
+                rank = name.split('-')[0].upper()  # "e-v2" → "E"
+
+                self._register(rank, str(fpath))
+
+            digests = [(fpath.name, self._file_digest(fpath)) for fpath in png_files]
+            self._signature_hex = self._signature(digests)
+            self._save_bundle(digests)
 
-        if self.templates:
-            total = sum(len(v) for v in self.templates.values())
+        self._pack_templates()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if self._templates:
+            total = sum(len(v) for v in self._templates.values())
             ranks_str = ', '.join(
-                f"{r}({len(v)})" for r, v in sorted(self.templates.items())
+                f"{r}({len(v)})" for r, v in sorted(self._templates.items())
             )
             logger.info(
-                f"✅ Загружено {total} шаблонов для рангов: {ranks_str}"
+                f"✅ Загружено {total} шаблонов для рангов: {ranks_str} "
+                f"({source}, {elapsed_ms:.1f} мс)"
             )
         else:
             logger.warning("⚠️  Шаблоны рангов не загружены")
@@ -114,12 +250,12 @@ class RankDetectorImproved:
                 for zone_name, coords in ZONES.items()
             }
 
-            if rank not in self.templates:
-                self.templates[rank] = []
+            if rank not in self._templates:
+                self._templates[rank] = []
 
-            self.templates[rank].append(template)
+            self._templates[rank].append(template)
             
-            variant_num = len(self.templates[rank])
+            variant_num = len(self._templates[rank])
             logger.debug(
                 f"Шаблон ранга {rank} вариант #{variant_num} загружен: {filepath}"
             )
@@ -127,6 +263,206 @@ class RankDetectorImproved:
         except Exception as e:
             logger.error(f"Ошибка загрузки шаблона {filepath}: {e}")
 
+    @staticmethod
+    def _file_digest(fpath: Path) -> str:
+        return hashlib.blake2b(fpath.read_bytes(), digest_size=12).hexdigest()
+
+    @staticmethod
+    def _signature(digests: List[Tuple[str, str]]) -> str:
+        """Хеш содержимого шаблонов и параметров, влияющих на результат"""
+        h = hashlib.blake2b(digest_size=12)
+        h.update(repr((ZONES, ZONE_WEIGHTS, TARGET_SIZE, MSE_THRESHOLD, ROI_DECODE)).encode())
+        for name, digest in digests:
+            h.update(f"{name}:{digest};".encode())
+        return h.hexdigest()
+
+    # ──────────────────────────────────────────────────────────
+    # СКОМПИЛИРОВАННЫЙ ПАКЕТ ШАБЛОНОВ
+    # ──────────────────────────────────────────────────────────
+
+    @property
+    def bundle_path(self) -> Path:
+        return self.ranks_dir / TEMPLATE_BUNDLE
+
+    @staticmethod
+    def _bundle_params() -> str:
+        return repr((ZONES, TARGET_SIZE, TEMPLATE_BUNDLE_VERSION))
+
+    def _load_bundle(self, png_files: List[Path]) -> bool:
+        """
+        Зоны шаблонов из пакета. Пакет подходит, если совпадают имена файлов
+        и (размер, mtime) — без чтения PNG; при другом mtime сверяются хеши
+        содержимого (файл скопирован/тронут, но не изменён).
+
+        Пакет читается целиком, без отображения в память.
+        """
+        path = self.bundle_path
+        if not path.exists():
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as bundle:
+                meta = json.loads(str(bundle['meta']))
+                if meta['params'] != self._bundle_params():
+                    return False
+
+                files = meta['files']   # [[имя, размер, mtime_ns, хеш]]
+                if [f[0] for f in files] != [p.name for p in png_files]:
+                    return False
+                stale = [
+                    (fpath, f) for fpath, f, m in zip(png_files, files, self._manifest)
+                    if (f[1], f[2]) != (m[1], m[2])
+                ]
+                if any(self._file_digest(fpath) != f[3] for fpath, f in stale):
+                    return False
+
+                ranks = [str(r) for r in bundle['ranks']]
+                zones = {zone: bundle[f'zone_{zone}'] for zone in ZONES}
+
+            for i, rank in enumerate(ranks):
+                self._templates.setdefault(rank, []).append({
+                    zone: zones[zone][i].astype(float) for zone in ZONES
+                })
+
+            digests = [(f[0], f[3]) for f in files]
+            self._signature_hex = self._signature(digests)
+            if stale:
+                # Содержимое то же — обновляем mtime в пакете, чтобы не хешировать снова
+                self._save_bundle(digests)
+            return True
+
+        except Exception as e:
+            logger.warning(f"⚠️  Пакет шаблонов {path.name} не прочитан ({e}), пересобираем")
+            self._templates = {}
+            return False
+
+    def _save_bundle(self, digests: List[Tuple[str, str]]):
+        """Сохраняет зоны шаблонов (uint8, без сжатия) в TEMPLATE_BUNDLE"""
+        ranks, per_zone = [], {zone: [] for zone in ZONES}
+        for rank, variants in self._templates.items():
+            for template in variants:
+                ranks.append(rank)
+                for zone in ZONES:
+                    per_zone[zone].append(template[zone].astype(np.uint8))
+        if not ranks:
+            return
+
+        meta = {
+            'params': self._bundle_params(),
+            'files': [
+                [name, size, mtime_ns, digest]
+                for (name, size, mtime_ns), (_, digest) in zip(self._manifest, digests)
+            ],
+        }
+        # Свой временный файл у каждого процесса/потока: параллельные
+        # сохранения не пишут в один файл, os.replace атомарен
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                dir=self.bundle_path.parent, prefix=self.bundle_path.name, suffix='.tmp', delete=False
+            ) as f:
+                tmp_path = f.name
+                np.savez(
+                    f,
+                    meta=np.array(json.dumps(meta)),
+                    ranks=np.array(ranks),
+                    **{f'zone_{zone}': np.stack(arrays) for zone, arrays in per_zone.items()},
+                )
+            os.replace(tmp_path, self.bundle_path)
+            logger.debug(f"Пакет шаблонов сохранён: {self.bundle_path}")
+        except OSError as e:
+            logger.warning(f"⚠️  Не удалось сохранить пакет шаблонов: {e}")
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    # ──────────────────────────────────────────────────────────
+    # ГОРЯЧАЯ ПЕРЕЗАГРУЗКА
+    # ──────────────────────────────────────────────────────────
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """
+        Перезагружает шаблоны, если в ranks/ добавились, удалились или
+        изменились frame-*.png. Проверка не чаще раза в
+        TEMPLATE_RELOAD_INTERVAL секунд (force — сразу).
+
+        Returns:
+            True — шаблоны перезагружены
+        """
+        if not self._loaded:
+            return False
+        now = time.monotonic()
+        if not force and (not TEMPLATE_RELOAD_INTERVAL or now - self._checked_at < TEMPLATE_RELOAD_INTERVAL):
+            return False
+        self._checked_at = now
+
+        try:
+            if self._stat_manifest(self.template_files()) == self._manifest:
+                return False
+        except OSError:
+            return False    # файл удалили между glob и stat — проверим в следующий раз
+
+        # Загружаем в отдельный экземпляр и подменяем состояние целиком:
+        # распознавание не увидит наполовину загруженный набор
+        fresh = RankDetectorImproved(self.ranks_dir)
+        fresh._ensure_loaded()
+        old_signature = self._signature_hex
+        self._templates = fresh._templates
+        self._packed = fresh._packed
+        self._packed_ranks = fresh._packed_ranks
+        self._packed_variants = fresh._packed_variants
+        self._rank_starts = fresh._rank_starts
+        self._coarse = fresh._coarse
+        self._signature_hex = fresh._signature_hex
+        self._manifest = fresh._manifest
+
+        if self._signature_hex != old_signature:
+            logger.info(f"🔄 Шаблоны рангов обновлены: {', '.join(self.available_ranks) or 'нет'}")
+        return True
+
+    def _pack_templates(self):
+        """
+        Складывает все варианты всех рангов в один непрерывный float32-тензор
+        на зону. Строки одного ранга идут подряд (нужно для reduceat).
+        """
+        self._packed_ranks = []
+        self._packed_variants = []
+        starts = []
+        per_zone: Dict[str, List[np.ndarray]] = {zone: [] for zone in ZONES}
+
+        for rank, variants in self._templates.items():
+            starts.append(len(self._packed_ranks))
+            for variant_idx, template in enumerate(variants):
+                self._packed_ranks.append(rank)
+                self._packed_variants.append(variant_idx + 1)
+                for zone in ZONES:
+                    per_zone[zone].append(template[zone])
+
+        self._rank_starts = np.array(starts, dtype=np.intp)
+        self._packed = {
+            zone: np.ascontiguousarray(np.stack(arrays), dtype=np.float32)
+            for zone, arrays in per_zone.items() if arrays
+        }
+        self._coarse = {zone: self._downsample(arr) for zone, arr in self._packed.items()}
+
+    @staticmethod
+    def _downsample(arr: np.ndarray) -> np.ndarray:
+        """Среднее по блокам COARSE_FACTOR×COARSE_FACTOR: [..., h, w, 3] → [..., h/k, w/k, 3]"""
+        k = COARSE_FACTOR
+        h, w = arr.shape[-3] // k, arr.shape[-2] // k
+        blocks = arr[..., :h * k, :w * k, :].astype(np.float32, copy=False)
+        blocks = blocks.reshape(*arr.shape[:-3], h, k, w, k, arr.shape[-1])
+        return blocks.mean(axis=(-4, -2), dtype=np.float32)
+
+    @staticmethod
+    def _coarse_weight(zone: str) -> float:
+        """Вес грубого MSE зоны: доля пикселей, попавших в целые блоки"""
+        x1, y1, x2, y2 = ZONES[zone]
+        k = COARSE_FACTOR
+        covered = ((x2 - x1) // k * k) * ((y2 - y1) // k * k)
+        return ZONE_WEIGHTS[zone] * covered / ((x2 - x1) * (y2 - y1))
+
     # ──────────────────────────────────────────────────────────
     # ПУБЛИЧНОЕ API
     # ──────────────────────────────────────────────────────────
@@ -164,6 +500,19 @@ class RankDetectorImproved:
             return "?"
         return self._detect_from_bytes(image_bytes)
 
+    def detect_details_from_bytes(self, image_bytes: bytes) -> Optional[RankResult]:
+        """
+        Ранг с подробностями (MSE, вариант, отрыв от второго ранга).
+        None — шаблонов нет или изображение не удалось обработать.
+        """
+        if not self.templates:
+            return None
+        try:
+            return self._evaluate(self._decode_zones(image_bytes))
+        except Exception as e:
+            logger.error(f"Ошибка обработки изображения: {e}")
+            return None
+
     # ──────────────────────────────────────────────────────────
     # ОСНОВНАЯ ЛОГИКА РАСПОЗНАВАНИЯ
     # ──────────────────────────────────────────────────────────
@@ -171,66 +520,184 @@ class RankDetectorImproved:
     def _detect_from_bytes(self, raw: bytes) -> str:
         """Обработка байтов изображения"""
         try:
-            img = Image.open(BytesIO(raw)).convert('RGB').resize(TARGET_SIZE)
-            return self._run(np.array(img))
+            return self._run(self._decode_zones(raw))
         except Exception as e:
             logger.error(f"Ошибка обработки изображения: {e}")
             return "?"
 
-    def _run(self, card_arr: np.ndarray) -> str:
+    def _decode_zones(self, raw: bytes) -> Dict[str, np.ndarray]:
+        """Зоны сравнения карты (uint8, в координатах TARGET_SIZE)"""
+        if ROI_DECODE:
+            return self._decode_zones_roi(raw)
+        return self._decode_zones_full(raw)
+
+    def _decode_zones_full(self, raw: bytes) -> Dict[str, np.ndarray]:
+        """Полное декодирование: вся карта → RGB → TARGET_SIZE → вырезка зон"""
+        img = Image.open(BytesIO(raw)).convert('RGB').resize(TARGET_SIZE)
+        card_arr = np.array(img)
+        return {zone: self._crop(card_arr, coords) for zone, coords in ZONES.items()}
+
+    def _decode_zones_roi(self, raw: bytes) -> Dict[str, np.ndarray]:
         """
-        Главный метод распознавания.
-        
-        Сравнивает карту со всеми шаблонами всех рангов
-        и выбирает наилучшее совпадение.
+        Декодирование только нужных областей.
+
+        Координаты ZONES переводятся в разрешение исходника; JPEG
+        декодируется в draft-режиме (масштаб 1/2..1/8, но не меньше
+        TARGET_SIZE). Каждая зона вырезается с запасом под ядро
+        ресемплинга, переводится в RGB и масштабируется отдельно —
+        результат совпадает с полным путём с точностью до округления.
         """
-        card_arr = card_arr.astype(float)
-        
-        # Вырезаем все зоны из карты
-        card_zones = {
-            zone_name: self._crop(card_arr, coords)
-            for zone_name, coords in ZONES.items()
-        }
+        img = Image.open(BytesIO(raw))
+        if img.format == 'JPEG':
+            img.draft('RGB', TARGET_SIZE)
+
+        width, height = img.size
+        sx = width / TARGET_SIZE[0]
+        sy = height / TARGET_SIZE[1]
+        # Bicubic при уменьшении читает ±2 пикселя выходного масштаба
+        margin = math.ceil(2 * max(sx, sy, 1.0)) + 1
+
+        zones = {}
+        for zone_name, (x1, y1, x2, y2) in ZONES.items():
+            box = (x1 * sx, y1 * sy, x2 * sx, y2 * sy)
+            left = max(0, int(box[0]) - margin)
+            top = max(0, int(box[1]) - margin)
+            right = min(width, math.ceil(box[2]) + margin)
+            bottom = min(height, math.ceil(box[3]) + margin)
+
+            region = img.crop((left, top, right, bottom)).convert('RGB')
+            region = region.resize(
+                (x2 - x1, y2 - y1),
+                box=(box[0] - left, box[1] - top, box[2] - left, box[3] - top),
+            )
+            zones[zone_name] = np.array(region)
+        return zones
+
+    def _score(
+        self,
+        card_zones: Dict[str, np.ndarray],
+        rows: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        MSE карты против шаблонов разом (всех или только строк rows).
+
+        Returns:
+            (взвешенный MSE [n], {зона: MSE [n]})
+        """
+        n = len(self._packed_ranks) if rows is None else len(rows)
+        weighted = np.zeros(n, dtype=np.float64)
+        zone_mse: Dict[str, np.ndarray] = {}
+        for zone_name in ZONES:
+            card_zone = card_zones[zone_name].astype(np.float32)
+            templates = self._packed[zone_name] if rows is None else self._packed[zone_name][rows]
+            diff = templates - card_zone  # broadcast → [n, h, w, 3]
+            np.square(diff, out=diff)
+            mse = diff.reshape(len(diff), -1).mean(axis=1, dtype=np.float64)
+            zone_mse[zone_name] = mse
+            weighted += mse * ZONE_WEIGHTS[zone_name]
+        return weighted, zone_mse
+
+    def _lower_bounds(self, card_zones: Dict[str, np.ndarray]) -> np.ndarray:
+        """Грубая оценка взвешенного MSE снизу для всех шаблонов [n_templates]"""
+        bounds = np.zeros(len(self._packed_ranks), dtype=np.float64)
+        for zone_name, coarse in self._coarse.items():
+            diff = coarse - self._downsample(card_zones[zone_name])
+            np.square(diff, out=diff)
+            mse = diff.reshape(len(diff), -1).mean(axis=1, dtype=np.float64)
+            bounds += mse * self._coarse_weight(zone_name)
+        return bounds
+
+    def _rank_table(self, card_zones: Dict[str, np.ndarray]) -> Tuple[Dict[str, float], Dict[str, Dict]]:
+        """
+        Лучший вариант каждого ранга (полное сравнение со всеми шаблонами).
+
+        Returns:
+            ({ранг: MSE}, {ранг: {'mse', 'zones', 'variant'}})
+        """
+        weighted, zone_mse = self._score(card_zones)
+
+        # Минимум внутри каждой группы строк одного ранга
+        rank_min = np.minimum.reduceat(weighted, self._rank_starts)
+        ends = list(self._rank_starts[1:]) + [len(weighted)]
 
-        # Для каждого ранга находим минимальный MSE среди всех вариантов
         rank_scores: Dict[str, float] = {}
-        rank_details: Dict[str, Dict] = {}  # для отладки
+        rank_details: Dict[str, Dict] = {}
+        for i, (start, end) in enumerate(zip(self._rank_starts, ends)):
+            row = int(start + np.argmin(weighted[start:end]))
+            rank = self._packed_ranks[row]
+            rank_scores[rank] = float(rank_min[i])
+            rank_details[rank] = {
+                'mse': float(rank_min[i]),
+                'zones': {zone: float(values[row]) for zone, values in zone_mse.items()},
+                'variant': self._packed_variants[row],
+            }
+        return rank_scores, rank_details
 
-        for rank, templates_list in self.templates.items():
-            # Считаем MSE для каждого варианта этого ранга
-            variant_scores = []
-            
-            for variant_idx, template in enumerate(templates_list):
-                # MSE по каждой зоне
-                zone_mse = {}
-                for zone_name in ZONES.keys():
-                    diff = card_zones[zone_name] - template[zone_name]
-                    zone_mse[zone_name] = float(np.mean(diff ** 2))
-                
-                # Взвешенное среднее MSE
-                weighted_mse = sum(
-                    zone_mse[zone] * ZONE_WEIGHTS[zone]
-                    for zone in ZONES.keys()
-                )
-                
-                variant_scores.append({
-                    'mse': weighted_mse,
-                    'zones': zone_mse,
-                    'variant': variant_idx + 1
-                })
-            
-            # Берём лучший вариант для этого ранга
-            best_variant = min(variant_scores, key=lambda x: x['mse'])
-            rank_scores[rank] = best_variant['mse']
-            rank_details[rank] = best_variant
+    def _run(self, card_zones: Dict[str, np.ndarray]) -> str:
+        """
+        Главный метод распознавания.
+        
+        Сравнивает зоны карты с шаблонами (см. _evaluate)
+        и выбирает наилучшее совпадение.
+        """
+        return self._evaluate(card_zones).rank
 
-        # Выбираем ранг с минимальным MSE
-        best_rank = min(rank_scores, key=rank_scores.__getitem__)
-        best_mse = rank_scores[best_rank]
-        best_details = rank_details[best_rank]
+    def _evaluate(self, card_zones: Dict[str, np.ndarray]) -> RankResult:
+        """
+        Сравнение от грубого к точному.
+
+        1. Грубый MSE (зоны, усреднённые блоками) для всех шаблонов —
+           нижняя граница точного MSE.
+        2. Точный MSE шаблона с лучшей грубой оценкой.
+        3. Точный MSE только тех шаблонов, чья граница не хуже его:
+           у остальных точный MSE заведомо больше. В явных случаях
+           это один-два шаблона.
+
+        Лучший шаблон тот же, что при полном сравнении; для второго ранга,
+        если его шаблоны отсеяны, отрыв оценивается по границе (снизу).
+        Шаблонов меньше COARSE_MIN_TEMPLATES — сразу полное сравнение.
+        """
+        total = len(self._packed_ranks)
+        if total < COARSE_MIN_TEMPLATES:
+            bounds = np.zeros(total, dtype=np.float64)
+            rows = np.arange(total)
+        else:
+            bounds = self._lower_bounds(card_zones)
+            first = np.argmin(bounds)
+            first_mse, _ = self._score(card_zones, np.array([first]))
+            # Запас на округление float32 в грубой оценке
+            rows = np.flatnonzero(bounds <= first_mse[0] * (1 + 1e-6))
+        weighted, zone_mse = self._score(card_zones, None if len(rows) == total else rows)
+
+        best = int(np.argmin(weighted))
+        best_row = int(rows[best])
+        best_rank = self._packed_ranks[best_row]
+        best_mse = float(weighted[best])
+
+        # Лучшая оценка каждого ранга: точный MSE или граница для отсеянных
+        estimates = bounds.copy()
+        estimates[rows] = weighted
+        rank_min = np.minimum.reduceat(estimates, self._rank_starts)
+        rank_scores = {
+            self._packed_ranks[start]: float(value)
+            for start, value in zip(self._rank_starts, rank_min)
+        }
+        others = {r: v for r, v in rank_scores.items() if r != best_rank}
+        runner_up = min(others, key=others.__getitem__) if others else None
+
+        result = RankResult(
+            rank=best_rank,
+            mse=best_mse,
+            variant=self._packed_variants[best_row],
+            candidate=best_rank,
+            zones={zone: float(values[best]) for zone, values in zone_mse.items()},
+            runner_up=runner_up,
+            margin=others[runner_up] - best_mse if runner_up else math.inf,
+            refined=len(rows),
+        )
 
         # Логируем результаты
-        self._log_results(rank_scores, rank_details, best_rank, best_mse)
+        self._log_results(rank_scores, set(self._packed_ranks[r] for r in rows), result)
 
         # Проверяем порог
         if best_mse > MSE_THRESHOLD:
@@ -239,40 +706,79 @@ class RankDetectorImproved:
                 f"   Кандидат: {best_rank}\n"
                 f"   Возможно, нужен шаблон для этого ранга"
             )
-            return "?"
+            result.rank = "?"
+            return result
 
-        logger.info(
-            f"✅ Ранг определён: {best_rank} "
-            f"(MSE={best_mse:.1f}, вариант {best_details['variant']})"
-        )
-        return best_rank
+        logger.info(f"✅ Ранг определён: {result.format()}")
+        return result
 
-    def _log_results(
-        self,
-        rank_scores: Dict[str, float],
-        rank_details: Dict[str, Dict],
-        best_rank: str,
-        best_mse: float
-    ):
+    def _log_results(self, rank_scores: Dict[str, float], refined_ranks: set, result: RankResult):
         """Подробное логирование результатов сравнения"""
         
-        # Краткая сводка по всем рангам
+        # Краткая сводка по всем рангам; «≥» — ранг отсеян по грубой оценке
         summary = "  ".join(
-            f"{r}={mse:.0f}" for r, mse in sorted(rank_scores.items())
+            f"{r}{'=' if r in refined_ranks else '≥'}{mse:.0f}"
+            for r, mse in sorted(rank_scores.items())
+        )
+        logger.debug(
+            f"MSE по рангам: {summary} "
+            f"(точно сравнено {result.refined} из {len(self._packed_ranks)} шаблонов)"
         )
-        logger.debug(f"MSE по рангам: {summary}")
 
         # Детали по лучшему рангу
-        details = rank_details[best_rank]
         zones_info = ", ".join(
             f"{zone}={mse:.0f}"
-            for zone, mse in details['zones'].items()
+            for zone, mse in result.zones.items()
         )
         logger.debug(
-            f"Детали {best_rank}: вариант {details['variant']}, "
+            f"Детали {result.candidate}: вариант {result.variant}, "
             f"зоны: {zones_info}"
         )
 
+    # ──────────────────────────────────────────────────────────
+    # ПАКЕТНОЕ РАСПОЗНАВАНИЕ
+    # ──────────────────────────────────────────────────────────
+
+    def make_pool(self, workers: int) -> ProcessPoolExecutor:
+        """
+        Пул процессов для detect_many: в каждом процессе свой детектор
+        с теми же шаблонами. spawn, а не fork — у бота уже есть потоки.
+        """
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_pool_worker,
+            initargs=(str(self.ranks_dir),),
+        )
+
+    def detect_many(
+        self,
+        images: Sequence[bytes],
+        workers: int = 1,
+        executor: Optional[Executor] = None,
+    ) -> List[Optional[RankResult]]:
+        """
+        Распознаёт пакет картинок.
+
+        Args:
+            images: байты картинок
+            workers: 1 — в текущем процессе, больше — во временном пуле
+            executor: готовый пул из make_pool (для нескольких пакетов подряд)
+
+        Returns:
+            detect_details_from_bytes для каждой картинки, в том же порядке
+        """
+        if not images or not self.templates:
+            return [None] * len(images)
+        if executor is None and workers <= 1:
+            return [self.detect_details_from_bytes(raw) for raw in images]
+
+        chunksize = max(1, len(images) // (4 * max(workers, 1)))
+        if executor is not None:
+            return list(executor.map(_detect_in_pool_worker, images, chunksize=chunksize))
+        with self.make_pool(workers) as pool:
+            return list(pool.map(_detect_in_pool_worker, images, chunksize=chunksize))
+
     # ──────────────────────────────────────────────────────────
     # ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ
     # ──────────────────────────────────────────────────────────
@@ -333,45 +839,34 @@ class RankDetectorImproved:
         }
         """
         raw = self._download(image_url, session)
-        if not raw:
+        if not raw or not self.templates:
             return {}
 
         try:
-            img = Image.open(BytesIO(raw)).convert('RGB').resize(TARGET_SIZE)
-            card_arr = np.array(img).astype(float)
-
-            card_zones = {
-                zone_name: self._crop(card_arr, coords)
-                for zone_name, coords in ZONES.items()
-            }
-
-            results = {}
-            for rank, templates_list in self.templates.items():
-                variant_results = []
-                
-                for template in templates_list:
-                    zone_mse = {
-                        zone: float(np.mean((card_zones[zone] - template[zone]) ** 2))
-                        for zone in ZONES.keys()
-                    }
-                    weighted = sum(
-                        zone_mse[z] * ZONE_WEIGHTS[z] for z in ZONES.keys()
-                    )
-                    variant_results.append({
-                        'mse': weighted,
-                        'zones': zone_mse
-                    })
-                
-                best = min(variant_results, key=lambda x: x['mse'])
-                results[rank] = best
-
-            return results
+            _, rank_details = self._rank_table(self._decode_zones(raw))
+            return rank_details
 
         except Exception as e:
             logger.error(f"debug_compare error: {e}")
             return {}
 
 
+# ══════════════════════════════════════════════════════════════
+# ПРОЦЕССЫ ПУЛА detect_many
+# ══════════════════════════════════════════════════════════════
+
+_pool_detector: Optional[RankDetectorImproved] = None
+
+
+def _init_pool_worker(ranks_dir: str):
+    global _pool_detector
+    _pool_detector = RankDetectorImproved(Path(ranks_dir))
+
+
+def _detect_in_pool_worker(raw: bytes) -> Optional[RankResult]:
+    return _pool_detector.detect_details_from_bytes(raw)
+
+
 # ══════════════════════════════════════════════════════════════
 # ОБРАТНАЯ СОВМЕСТИМОСТЬ
 # ══════════════════════════════════════════════════════════════
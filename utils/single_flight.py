@@ -0,0 +1,131 @@
+"""
+Однопоточное выполнение периодической задачи
+
+Обёртка над колбэком JobQueue: пока предыдущий тик выполняется,
+новые не запускаются параллельно. В режиме 'coalesce' все тики,
+пришедшие во время выполнения, схлопываются в один повторный запуск
+сразу после текущего; в режиме 'skip' они просто пропускаются.
+
+Ведётся статистика длительности тиков (p50/p99/max) и числа
+переполнений — тиков дольше интервала задачи.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Awaitable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Тик дольше interval * OVERRUN_WARN_FACTOR пишется в лог предупреждением
+OVERRUN_WARN_FACTOR = 3
+
+# Период отчёта в лог (сек)
+REPORT_INTERVAL = 300
+
+
+class SingleFlightJob:
+    """Колбэк JobQueue, который никогда не выполняется параллельно сам с собой"""
+
+    def __init__(
+        self,
+        callback: Callable[..., Awaitable],
+        name: str,
+        interval: float,
+        mode: str = 'coalesce',
+        max_samples: int = 2000,
+    ):
+        if mode not in ('coalesce', 'skip'):
+            raise ValueError(f"Неизвестный режим SingleFlightJob: {mode}")
+        self.callback = callback
+        self.name = name
+        self.interval = interval
+        self.mode = mode
+        self._lock = asyncio.Lock()
+        self._pending = False
+        self._durations: deque = deque(maxlen=max_samples)
+        self._reset_window()
+
+    def _reset_window(self):
+        self._durations.clear()
+        self._window_started = time.monotonic()
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def __call__(self, context):
+        if self._lock.locked():
+            if self.mode == 'coalesce':
+                self._pending = True
+                self.coalesced += 1
+                logger.debug(f"⏭️ {self.name}: тик во время выполнения, повтор после текущего")
+            else:
+                self.skipped += 1
+                logger.debug(f"⏭️ {self.name}: тик пропущен, предыдущий ещё выполняется")
+            return
+
+        async with self._lock:
+            while True:
+                self._pending = False
+                await self._run(context)
+                if not self._pending:
+                    break
+
+        if time.monotonic() - self._window_started >= REPORT_INTERVAL:
+            logger.info(f"📈 Тики {self.name}: {self.format_stats(self.stats(reset=True))}")
+
+    async def _run(self, context):
+        started = time.perf_counter()
+        try:
+            await self.callback(context)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Ошибка в задаче {self.name}: {e}", exc_info=True)
+        finally:
+            duration = time.perf_counter() - started
+            self._durations.append(duration)
+            self.runs += 1
+            if duration > self.interval:
+                self.overruns += 1
+                log = logger.warning if duration > self.interval * OVERRUN_WARN_FACTOR else logger.debug
+                log(f"⏱️ {self.name}: тик {duration:.2f} с дольше интервала {self.interval:.1f} с")
+
+    def stats(self, reset: bool = False) -> Dict:
+        """Статистика за окно наблюдения (длительности в миллисекундах)"""
+        durations = sorted(self._durations)
+        if durations:
+            p50 = durations[len(durations) // 2]
+            p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+            worst = durations[-1]
+        else:
+            p50 = p99 = worst = 0.0
+
+        stats = {
+            'window_s': time.monotonic() - self._window_started,
+            'runs': self.runs,
+            'p50_ms': p50 * 1000,
+            'p99_ms': p99 * 1000,
+            'max_ms': worst * 1000,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+        }
+        if reset:
+            self._reset_window()
+        return stats
+
+    def format_stats(self, stats: Dict) -> str:
+        return (
+            f"окно {stats['window_s']:.0f} с, тиков {stats['runs']}: "
+            f"p50={stats['p50_ms']:.0f} мс, p99={stats['p99_ms']:.0f} мс, "
+            f"max={stats['max_ms']:.0f} мс; дольше {self.interval:.1f} с: {stats['overruns']}, "
+            f"схлопнуто {stats['coalesced']}, пропущено {stats['skipped']}, "
+            f"ошибок {stats['failures']}"
+        )